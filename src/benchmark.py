@@ -0,0 +1,263 @@
+"""Throughput, latency and peak-memory benchmarks for the pipeline stages.
+
+Stages (each run at every size, default 10^4, 10^6 and 10^7 rows):
+
+    generate        cohort generation (GWI_LIFELIKE spec), one chunk per batch
+    features        Metabolic_Index + Ox_Energy_Interaction on each batch
+    prior_training  streaming-Newton fit of the symptom prior (one batch = the whole fit)
+    prior_scoring   Symptom_Prior_Probability from the exported prior
+    classification  NumPy forest kernel on the final five features
+
+Per stage and size the suite records rows/sec (rows over the median wall
+time of a full run), p50/p99 latency of one batch call and the
+``tracemalloc`` peak above the prepared inputs. Peak memory comes from a
+separate traced run, because tracing slows every allocation.
+
+Results are written as JSON. A stage that is slower, has a higher p99 or a
+larger peak than its baseline by more than ``--threshold`` fails the run
+(exit code 1), and so does a missing baseline file or baseline entry: only
+``--update-baseline`` records one.
+
+Usage:
+    python benchmark.py                                   # compare against benchmark_baseline.json
+    python benchmark.py --sizes 1e4 1e6 --stages generate features
+    python benchmark.py --update-baseline                 # record a new baseline on this machine
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import nullcontext
+
+import numpy as np
+
+from cohort import GWI_LIFELIKE, _generate_indexed_chunk, chunk_bounds, generate_cohort, resolve_entropy
+from features import add_engineered_features
+from inference_kernel import export_model, load_predictor
+from prior_training import SYMPTOM_COLS, TARGET_COL, fit_arrays
+from scoring_server import FEATURE_COLS
+from symptom_prior import add_prior_feature
+
+# --- 1. PARAMETERS ---
+DEFAULT_SIZES = [10_000, 1_000_000, 10_000_000]
+BATCH_ROWS = 100_000  # Rows per timed call
+MAX_REPEATS = 5
+REPEAT_ROW_BUDGET = 2_000_000  # Small sizes are repeated until about this many rows were timed
+DEFAULT_THRESHOLD = 0.25  # Allowed relative regression
+LATENCY_SLACK_MS = 1.0  # Absolute slack so sub-millisecond jitter is not a regression
+MEMORY_SLACK_MB = 1.0
+MODEL_TRAIN_ROWS = 10_000  # Rows used to fit the models the scoring stages load
+CLASSIFIER_TREES = 50
+CLASSIFIER_MAX_DEPTH = 12
+BASELINE_FILE = 'benchmark_baseline.json'
+RESULTS_FILE = 'benchmark_results.json'
+RANDOM_SEED = 42
+
+
+# --- 2. STAGES ---
+# prepare(n, batch_rows, workdir) -> list of argument tuples, one per batch (untimed)
+# run(*args) -> the timed work for one batch
+def _batches(df, batch_rows):
+    bounds = np.cumsum([0] + chunk_bounds(len(df), batch_rows))
+    return [df.iloc[a:b].copy() for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+def _lifelike(n):
+    return add_engineered_features(generate_cohort(GWI_LIFELIKE, n, seed=RANDOM_SEED), interaction=False)
+
+
+def _prior(workdir):
+    """Symptom prior fitted on MODEL_TRAIN_ROWS rows, loaded through its exported artifact (cached in workdir)."""
+    path = os.path.join(workdir, 'prior.npz')
+    if not os.path.exists(path):
+        df = generate_cohort(GWI_LIFELIKE, MODEL_TRAIN_ROWS, seed=RANDOM_SEED + 1)
+        state = fit_arrays(df[SYMPTOM_COLS].to_numpy(np.float64), df[TARGET_COL].to_numpy())
+        export_model(state, path, feature_names=SYMPTOM_COLS)
+    return load_predictor(path)
+
+
+def _classifier(workdir, prior):
+    """Random forest on the final five features, exported to the NumPy kernel (cached in workdir)."""
+    from sklearn.ensemble import RandomForestClassifier
+
+    path = os.path.join(workdir, 'classifier.npz')
+    if not os.path.exists(path):
+        train = add_prior_feature(_lifelike(MODEL_TRAIN_ROWS), prior)
+        model = RandomForestClassifier(n_estimators=CLASSIFIER_TREES, max_depth=CLASSIFIER_MAX_DEPTH,
+                                       random_state=RANDOM_SEED, n_jobs=-1)
+        model.fit(train[FEATURE_COLS].to_numpy(), train[TARGET_COL].to_numpy())
+        export_model(model, path, feature_names=FEATURE_COLS)
+    return load_predictor(path)
+
+
+def _prepare_generate(n, batch_rows, workdir):
+    entropy = resolve_entropy(RANDOM_SEED)
+    return [(GWI_LIFELIKE, rows, entropy, i) for i, rows in enumerate(chunk_bounds(n, batch_rows))]
+
+
+def _prepare_features(n, batch_rows, workdir):
+    return [(chunk,) for chunk in _batches(generate_cohort(GWI_LIFELIKE, n, seed=RANDOM_SEED), batch_rows)]
+
+
+def _prepare_prior_training(n, batch_rows, workdir):
+    df = generate_cohort(GWI_LIFELIKE, n, seed=RANDOM_SEED)
+    return [(df[SYMPTOM_COLS].to_numpy(np.float64), df[TARGET_COL].to_numpy())]
+
+
+def _prepare_prior_scoring(n, batch_rows, workdir):
+    prior = _prior(workdir)
+    df = generate_cohort(GWI_LIFELIKE, n, seed=RANDOM_SEED)[SYMPTOM_COLS]
+    return [(chunk, prior) for chunk in _batches(df, batch_rows)]
+
+
+def _prepare_classification(n, batch_rows, workdir):
+    prior = _prior(workdir)
+    predictor = _classifier(workdir, prior)
+    # Scored rows carry the same prior feature the classifier was trained on
+    X = add_prior_feature(_lifelike(n), prior)[FEATURE_COLS].to_numpy(np.float64)
+    return [(X[a:a + batch_rows], predictor) for a in range(0, len(X), batch_rows)]
+
+
+def _predict(X, predictor):
+    return predictor.predict(X)
+
+
+STAGES = {
+    'generate': (_prepare_generate, _generate_indexed_chunk),
+    'features': (_prepare_features, add_engineered_features),
+    'prior_training': (_prepare_prior_training, fit_arrays),
+    'prior_scoring': (_prepare_prior_scoring, add_prior_feature),
+    'classification': (_prepare_classification, _predict),
+}
+
+
+# --- 3. MEASUREMENT ---
+def repeats_for(n):
+    return max(1, min(MAX_REPEATS, REPEAT_ROW_BUDGET // max(n, 1)))
+
+
+def run_stage(stage, n, batch_rows=BATCH_ROWS, workdir=None):
+    """Benchmarks one stage at n rows. Returns a dict of metrics."""
+    prepare, run = STAGES[stage]
+    with tempfile.TemporaryDirectory() if workdir is None else nullcontext(workdir) as workdir:
+        totals, latencies = [], []
+        for _ in range(repeats_for(n)):
+            batches = prepare(n, batch_rows, workdir)  # Fresh inputs: some stages work in place
+            start = time.perf_counter()
+            for args in batches:
+                t0 = time.perf_counter()
+                run(*args)
+                latencies.append(time.perf_counter() - t0)
+            totals.append(time.perf_counter() - start)
+            del batches
+
+        batches = prepare(n, batch_rows, workdir)
+        tracemalloc.start()
+        for args in batches:
+            run(*args)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del batches
+
+    latencies_ms = np.asarray(latencies) * 1000.0
+    return {
+        'rows': n,
+        'repeats': len(totals),
+        'seconds': float(np.median(totals)),
+        'rows_per_sec': float(n / np.median(totals)),
+        'p50_ms': float(np.percentile(latencies_ms, 50)),
+        'p99_ms': float(np.percentile(latencies_ms, 99)),
+        'peak_mb': peak / 2 ** 20,
+    }
+
+
+def run_benchmarks(stages=tuple(STAGES), sizes=DEFAULT_SIZES, batch_rows=BATCH_ROWS, log=print):
+    """Runs every stage at every size. Returns {'meta': ..., 'results': {'<stage>/<rows>': metrics}}."""
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for stage in stages:
+            for n in sizes:
+                metrics = run_stage(stage, n, batch_rows, workdir)
+                results[f'{stage}/{n}'] = metrics
+                log(f"{stage:<15} {n:>12,} rows  {metrics['rows_per_sec']:>14,.0f} rows/s  "
+                    f"p50 {metrics['p50_ms']:>9.2f} ms  p99 {metrics['p99_ms']:>9.2f} ms  "
+                    f"peak {metrics['peak_mb']:>9.1f} MB")
+    meta = {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'batch_rows': batch_rows,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    return {'meta': meta, 'results': results}
+
+
+# --- 4. BASELINES ---
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """Returns a list of human-readable regressions of `current` against `baseline` results."""
+    regressions = []
+    for key, cur in current['results'].items():
+        ref = baseline['results'].get(key)
+        if ref is None:
+            regressions.append(f"{key}: no baseline entry (record one with --update-baseline)")
+            continue
+        if cur['rows_per_sec'] < ref['rows_per_sec'] * (1 - threshold):
+            regressions.append(f"{key}: {cur['rows_per_sec']:,.0f} rows/s vs baseline {ref['rows_per_sec']:,.0f}")
+        if cur['p99_ms'] > ref['p99_ms'] * (1 + threshold) + LATENCY_SLACK_MS:
+            regressions.append(f"{key}: p99 {cur['p99_ms']:.2f} ms vs baseline {ref['p99_ms']:.2f} ms")
+        if cur['peak_mb'] > ref['peak_mb'] * (1 + threshold) + MEMORY_SLACK_MB:
+            regressions.append(f"{key}: peak {cur['peak_mb']:.1f} MB vs baseline {ref['peak_mb']:.1f} MB")
+    return regressions
+
+
+def save_json(data, path):
+    with open(path, 'w') as fh:
+        json.dump(data, fh, indent=2)
+
+
+def load_json(path):
+    with open(path) as fh:
+        return json.load(fh)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+    parser.add_argument('--sizes', nargs='+', type=lambda s: int(float(s)), default=DEFAULT_SIZES)
+    parser.add_argument('--batch-rows', type=int, default=BATCH_ROWS)
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--output', default=RESULTS_FILE)
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument('--update-baseline', action='store_true', help='Store these results as the new baseline')
+    args = parser.parse_args()
+    if not args.update_baseline and not os.path.exists(args.baseline):
+        # Checked before running: a comparison without a reference must not pass
+        print(f"❌ No baseline '{args.baseline}' to compare against; record one with --update-baseline")
+        sys.exit(1)
+
+    current = run_benchmarks(args.stages, args.sizes, args.batch_rows)
+    save_json(current, args.output)
+    print(f"Saved results to '{args.output}'")
+
+    if args.update_baseline:
+        if os.path.exists(args.baseline):
+            # Keep entries for stages/sizes that were not re-run
+            previous = load_json(args.baseline)
+            previous['results'].update(current['results'])
+            current['results'] = previous['results']
+        save_json(current, args.baseline)
+        print(f"✅ Baseline recorded in '{args.baseline}'")
+        sys.exit(0)
+
+    regressions = compare(current, load_json(args.baseline), args.threshold)
+    if regressions:
+        print(f"❌ {len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"✅ No regressions beyond {args.threshold:.0%} against '{args.baseline}'")
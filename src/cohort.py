@@ -0,0 +1,264 @@
+"""Shared, vectorized cohort engine for the synthetic Haley / GWI generators.
+
+Every generator in this folder used to copy the same block of
+``x[target_class == k] = np.random.normal(...)`` lines. This module replaces
+those blocks with one engine that:
+
+* draws whole chunks at once (no per-row Python loops),
+* yields fixed-size ``pd.DataFrame`` chunks so memory stays bounded,
+* gives every chunk its own ``SeedSequence`` stream, so the output is
+  bit-identical whether it runs in one process or across a process pool.
+
+Cohorts are plain dicts (section 2); ``load_spec`` / ``save_spec`` read and
+write them as JSON so new variants need no new script, and ``sweep.py``
+generates many variants of one cohort from shared random draws.
+"""
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# --- 1. PARAMETERS ---
+DEFAULT_CHUNK_SIZE = 1_000_000
+RANDOM_SEED = 42
+HALEY_CLASSES = [0, 1, 2, 3]  # 0=Healthy, 1=Impaired Cognition, 2=Confusion-Ataxia, 3=Arthro-myo-neuropathy
+BIOMARKER_COLS = ['NAD_NADH', 'PCr_ATP', 'GSH_GSSG']
+SYMPTOM_COLS = ['joint_pain', 'confusion', 'dizziness', 'fatigue']
+
+# --- 2. COHORT DEFINITIONS ---
+# A cohort is a plain dict:
+#   class_probs : prevalence of each class (ignored when 'balanced' is True)
+#   balanced    : draw exactly equal class counts inside every chunk
+#   features    : column -> one (mean, SD) pair per class, drawn in this order
+#   clip        : column -> (low, high) bounds applied after drawing
+#   label_col   : name of the emitted class column (None = do not emit one)
+
+# data_gen.py: one population, labels are assigned afterwards by rule
+MITO_3CLASS = {
+    'class_probs': [1.0],
+    'balanced': False,
+    'features': {
+        'NAD_NADH': [(1.5, 0.5)],
+        'PCr_ATP': [(2.0, 0.6)],
+        'GSH_GSSG': [(1.0, 0.3)],
+    },
+    'clip': {},
+    'label_col': None,
+}
+
+# data_gen_haley.py: realistic prevalence in the deployed population
+HALEY_PREVALENCE = {
+    'class_probs': [0.70, 0.10, 0.12, 0.08],
+    'balanced': False,
+    'features': {
+        'NAD_NADH': [(2.0, 0.4), (1.8, 0.4), (1.2, 0.3), (1.5, 0.4)],
+        'PCr_ATP': [(1.8, 0.3), (1.7, 0.3), (1.3, 0.3), (1.1, 0.2)],
+        'GSH_GSSG': [(30.0, 6.0), (25.0, 5.0), (18.0, 4.0), (20.0, 5.0)],
+    },
+    'clip': {},
+    'label_col': 'Haley_Syndrome',
+}
+
+# data_gen_haley_training.py: balanced, well separated ("sep5")
+HALEY_BALANCED_SEP = {
+    'class_probs': [0.25, 0.25, 0.25, 0.25],
+    'balanced': True,
+    'features': {
+        'NAD_NADH': [(2.0, 0.2), (1.8, 0.2), (1.2, 0.15), (1.5, 0.2)],
+        'PCr_ATP': [(1.8, 0.15), (1.7, 0.15), (1.3, 0.15), (1.1, 0.1)],
+        'GSH_GSSG': [(30.0, 3.0), (25.0, 2.5), (18.0, 2.0), (20.0, 2.5)],
+    },
+    'clip': {},
+    'label_col': 'Haley_Syndrome',
+}
+
+# gwi_haley_medium_noise: balanced, SD 0.25 on NAD/NADH
+HALEY_MEDIUM_NOISE = {
+    'class_probs': [0.25, 0.25, 0.25, 0.25],
+    'balanced': True,
+    'features': {
+        'NAD_NADH': [(2.0, 0.25), (1.8, 0.25), (1.2, 0.20), (1.5, 0.25)],
+        'PCr_ATP': [(1.8, 0.20), (1.7, 0.20), (1.3, 0.20), (1.1, 0.15)],
+        'GSH_GSSG': [(30.0, 4.0), (25.0, 3.5), (18.0, 3.0), (20.0, 3.5)],
+    },
+    'clip': {},
+    'label_col': 'Haley_Syndrome',
+}
+
+# haley_dat_gen_clcon_train.py: balanced, "noisy" biomarkers
+HALEY_NOISY = {
+    'class_probs': [0.25, 0.25, 0.25, 0.25],
+    'balanced': True,
+    'features': dict(HALEY_PREVALENCE['features']),
+    'clip': {},
+    'label_col': 'Haley_Syndrome',
+}
+
+# gwi_lifelike_full.py: noisy biomarkers + 0-10 symptom surveys
+GWI_LIFELIKE = {
+    'class_probs': [0.25, 0.25, 0.25, 0.25],
+    'balanced': True,
+    'features': {
+        **HALEY_PREVALENCE['features'],
+        'joint_pain': [(2.0, 1.5), (4.0, 2.0), (5.0, 2.0), (8.5, 1.5)],
+        'confusion': [(1.0, 1.0), (8.0, 1.5), (5.0, 2.0), (3.0, 2.0)],
+        'dizziness': [(1.0, 1.0), (3.0, 2.0), (8.5, 1.5), (2.0, 1.5)],
+        'fatigue': [(2.5, 1.5), (6.0, 2.0), (6.0, 2.0), (9.0, 1.0)],
+    },
+    'clip': {col: (0.0, 10.0) for col in SYMPTOM_COLS},
+    'label_col': 'Haley_Syndrome',
+}
+
+
+# --- 3. CHUNK GENERATION ---
+def chunk_bounds(n, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Returns the row count of every chunk for a cohort of n rows."""
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive")
+    full, rest = divmod(n, chunk_size)
+    return [chunk_size] * full + ([rest] if rest else [])
+
+
+def chunk_rng(entropy, index):
+    """Independent generator for chunk `index` (same stream as SeedSequence(entropy).spawn()[index])."""
+    return np.random.default_rng(np.random.SeedSequence(entropy, spawn_key=(index,)))
+
+
+def draw_labels(spec, n_rows, rng):
+    """Draws the class column for one chunk."""
+    n_classes = len(spec['class_probs'])
+    if spec.get('balanced'):
+        # Equal counts; the n_rows % n_classes spare rows go to classes drawn without
+        # replacement, so small or uneven chunks favour no class
+        labels = np.arange(n_rows, dtype=np.int32) % n_classes
+        spare = n_rows % n_classes
+        if spare:
+            labels[n_rows - spare:] = rng.choice(n_classes, size=spare, replace=False)
+        rng.shuffle(labels)
+        return labels
+    if n_classes == 1:
+        return np.zeros(n_rows, dtype=np.int32)
+    return rng.choice(n_classes, size=n_rows, p=spec['class_probs']).astype(np.int32)
+
+
+def generate_chunk(spec, n_rows, rng):
+    """Generates one chunk of the cohort as a DataFrame, fully vectorized."""
+    labels = draw_labels(spec, n_rows, rng)
+    columns = {}
+    for col, params in spec['features'].items():
+        loc, scale = np.asarray(params, dtype=np.float64).T
+        # One standard-normal draw, rescaled per row by its class parameters
+        values = rng.standard_normal(n_rows)
+        values *= scale[labels]
+        values += loc[labels]
+        if col in spec['clip']:
+            low, high = spec['clip'][col]
+            np.clip(values, low, high, out=values)
+        columns[col] = values
+    if spec.get('label_col'):
+        columns[spec['label_col']] = labels
+    return pd.DataFrame(columns, copy=False)
+
+
+def _generate_indexed_chunk(spec, n_rows, entropy, index):
+    """Process-pool entry point: rebuilds the chunk's RNG from its index."""
+    return generate_chunk(spec, n_rows, chunk_rng(entropy, index))
+
+
+def resolve_entropy(seed):
+    """Turns a user seed (or None for fresh entropy) into SeedSequence entropy."""
+    return np.random.SeedSequence(seed).entropy
+
+
+def generate_chunks(spec, n, chunk_size=DEFAULT_CHUNK_SIZE, seed=RANDOM_SEED, workers=1):
+    """Yields the cohort as fixed-size DataFrame chunks, in order.
+
+    With workers > 1 the chunks are produced by a process pool; at most
+    2 * workers chunks are in flight, so memory stays bounded even if the
+    consumer is slower than the generators. The output does not depend on
+    the number of workers.
+    """
+    entropy = resolve_entropy(seed)
+    sizes = chunk_bounds(n, chunk_size)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(sizes) <= 1:
+        for index, n_rows in enumerate(sizes):
+            yield _generate_indexed_chunk(spec, n_rows, entropy, index)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for index, n_rows in enumerate(sizes):
+            pending.append(pool.submit(_generate_indexed_chunk, spec, n_rows, entropy, index))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def generate_cohort(spec, n, chunk_size=DEFAULT_CHUNK_SIZE, seed=RANDOM_SEED, workers=1):
+    """Generates the whole cohort in memory (convenience wrapper for small n)."""
+    chunks = list(generate_chunks(spec, n, chunk_size=chunk_size, seed=seed, workers=workers))
+    if not chunks:
+        return generate_chunk(spec, 0, np.random.default_rng(0))
+    return pd.concat(chunks, ignore_index=True)
+
+
+# --- 4. DECLARATIVE SPECS ---
+# Registered cohorts, addressable by name from the command line (e.g. sweep.py)
+COHORTS = {
+    'mito_3class': MITO_3CLASS,
+    'haley_prevalence': HALEY_PREVALENCE,
+    'haley_balanced_sep': HALEY_BALANCED_SEP,
+    'haley_medium_noise': HALEY_MEDIUM_NOISE,
+    'haley_noisy': HALEY_NOISY,
+    'gwi_lifelike': GWI_LIFELIKE,
+}
+
+
+def validate_spec(spec):
+    """Checks a cohort dict (e.g. parsed from JSON) and returns a normalized copy."""
+    probs = [float(p) for p in spec['class_probs']]
+    n_classes = len(probs)
+    if not probs or min(probs) < 0 or not np.isclose(sum(probs), 1.0):
+        raise ValueError(f"class_probs must be non-negative and sum to 1, got {probs}")
+    features = {}
+    for col, params in spec['features'].items():
+        if len(params) != n_classes:
+            raise ValueError(f"'{col}' has {len(params)} (mean, SD) pairs for {n_classes} classes")
+        features[col] = [(float(mean), float(sd)) for mean, sd in params]
+        if any(sd < 0 for _, sd in features[col]):
+            raise ValueError(f"'{col}' has a negative SD")
+    clip = {}
+    for col, (low, high) in spec.get('clip', {}).items():
+        if col not in features or low > high:
+            raise ValueError(f"Invalid clip for '{col}': ({low}, {high})")
+        clip[col] = (float(low), float(high))
+    return {
+        'class_probs': probs,
+        'balanced': bool(spec.get('balanced', False)),
+        'features': features,
+        'clip': clip,
+        'label_col': spec.get('label_col'),
+    }
+
+
+def load_spec(source):
+    """Returns a validated cohort from a registered name, a JSON file or a dict."""
+    if isinstance(source, dict):
+        return validate_spec(source)
+    if source in COHORTS:
+        return validate_spec(COHORTS[source])
+    with open(source) as fh:
+        return validate_spec(json.load(fh))
+
+
+def save_spec(spec, path):
+    """Writes a cohort as JSON (pairs become 2-element lists)."""
+    with open(path, 'w') as fh:
+        json.dump(validate_spec(spec), fh, indent=2)
@@ -0,0 +1,378 @@
+"""Columnar, typed storage for generated cohorts.
+
+The generators used to finish with ``df.round(4).to_csv(...)`` and every
+downstream script parsed the whole text file back with ``pd.read_csv``. This
+module is a small pluggable writer/reader layer instead:
+
+* ``parquet`` - Arrow/Parquet, float32 columns (``float_dtype`` overrides),
+  one row group per chunk with min/max statistics (needs ``pyarrow``),
+* ``npy``     - a directory with one raw ``.npy`` file per column plus a
+  ``manifest.json``; readers memory-map the columns they ask for,
+* ``csv``     - the old 4-decimal text format, kept as an export option.
+
+Writers accept chunks (e.g. straight from ``cohort.generate_chunks``) and
+readers can project only the columns they need. A writer left by an
+exception (``open_writer`` / ``write_cohort``) is aborted: its partial
+output is removed rather than finalized as a valid-looking short cohort. ``add_columns`` appends
+derived columns to a stored cohort without rewriting it: new ``.npy`` files
+in npy mode, row-aligned sidecar files in ``<path>.derived/`` for Parquet.
+"""
+import io
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+# --- 1. PARAMETERS ---
+CSV_DECIMALS = 4  # Same precision the generators always rounded to
+FLOAT_DTYPE = np.float32
+NPY_MANIFEST = 'manifest.json'
+NPY_HEADER_LEN = 128  # Fixed .npy header size so the real shape can be written at close
+DERIVED_SUFFIX = '.derived'  # Sidecar directory for columns added to a Parquet cohort
+
+
+def _require_pyarrow():
+    """Imports pyarrow lazily; it is only needed for the Parquet format."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("The 'parquet' format needs pyarrow (pip install pyarrow), "
+                          "or use the 'npy' / 'csv' formats instead.") from e
+    return pa, pq
+
+
+def downcast(df, dtype=FLOAT_DTYPE):
+    """Casts float columns to float32 (labels and other columns keep their dtype)."""
+    return df.astype({col: dtype for col in df.columns if df[col].dtype.kind == 'f'})
+
+
+def detect_format(path):
+    """Guesses the storage format from the path."""
+    if os.path.isdir(path) or path.endswith('.npy'):
+        return 'npy'
+    if path.endswith(('.parquet', '.pq')):
+        return 'parquet'
+    if path.endswith('.csv'):
+        return 'csv'
+    raise ValueError(f"Cannot infer cohort format from '{path}', pass fmt='parquet', 'npy' or 'csv'")
+
+
+# --- 2. WRITERS ---
+class CsvWriter:
+    """Appends chunks to one CSV file, rounded to CSV_DECIMALS."""
+
+    def __init__(self, path):
+        self.path = path
+        self.n_rows = 0
+        self._fh = open(path, 'w', newline='')
+
+    def write(self, chunk):
+        chunk.round(CSV_DECIMALS).to_csv(self._fh, index=False, header=self.n_rows == 0)
+        self.n_rows += len(chunk)
+
+    def close(self):
+        self._fh.close()
+
+    def abort(self):
+        self._fh.close()
+        _remove(self.path)
+
+
+class ParquetWriter:
+    """Streams chunks into a Parquet file, one row group (with statistics) per chunk.
+
+    Float columns are stored as `float_dtype` (float32 by default; np.float64
+    keeps decimal-rounded values exact).
+    """
+
+    def __init__(self, path, compression='zstd', float_dtype=FLOAT_DTYPE):
+        self.path = path
+        self.compression = compression
+        self.float_dtype = float_dtype
+        self.n_rows = 0
+        self._writer = None
+
+    def write(self, chunk):
+        pa, pq = _require_pyarrow()
+        table = pa.Table.from_pandas(downcast(chunk, self.float_dtype), preserve_index=False)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, table.schema, compression=self.compression,
+                                            write_statistics=True)
+        self._writer.write_table(table, row_group_size=len(chunk) or None)
+        self.n_rows += len(chunk)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+    def abort(self):
+        self.close()  # pyarrow cannot drop an open file without writing its footer
+        _remove(self.path)
+
+
+class NpyWriter:
+    """Streams chunks into one raw .npy file per column (memory-mappable on read).
+
+    Each file starts with a fixed-size header that is rewritten with the final
+    row count at close, so the total length does not have to be known upfront.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.n_rows = 0
+        self._files = {}
+        self._dtypes = {}
+        self._created = not os.path.isdir(path)
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, chunk):
+        chunk = downcast(chunk)
+        if self._files and set(chunk.columns) != set(self._files):
+            missing, extra = set(self._files) - set(chunk.columns), set(chunk.columns) - set(self._files)
+            raise ValueError(f"Chunk columns differ from the first chunk's (missing {sorted(missing)}, "
+                             f"unexpected {sorted(extra)}); every column file must keep the same row count")
+        for col in chunk.columns:
+            values = np.ascontiguousarray(chunk[col].to_numpy())
+            if values.dtype.kind not in 'biuf':
+                raise ValueError(f"Column '{col}' has dtype {values.dtype}; the npy format only stores numeric columns")
+            if col not in self._files:
+                self._files[col] = open(os.path.join(self.path, f'{col}.npy'), 'wb')
+                self._files[col].write(b'\0' * NPY_HEADER_LEN)
+                self._dtypes[col] = values.dtype
+            self._files[col].write(values.astype(self._dtypes[col], copy=False).tobytes())
+        self.n_rows += len(chunk)
+
+    def close(self):
+        for col, fh in self._files.items():
+            header = io.BytesIO()
+            np.lib.format.write_array_header_1_0(header, {
+                'descr': np.lib.format.dtype_to_descr(self._dtypes[col]),
+                'fortran_order': False,
+                'shape': (self.n_rows,),
+            })
+            if header.tell() != NPY_HEADER_LEN:
+                raise ValueError(f"Unexpected .npy header length {header.tell()} for '{col}'")
+            fh.seek(0)
+            fh.write(header.getvalue())
+            fh.close()
+        manifest = {
+            'n_rows': self.n_rows,
+            'columns': list(self._files),
+            'dtypes': {col: str(dtype) for col, dtype in self._dtypes.items()},
+        }
+        with open(os.path.join(self.path, NPY_MANIFEST), 'w') as fh:
+            json.dump(manifest, fh, indent=2)
+
+    def abort(self):
+        for col, fh in self._files.items():
+            fh.close()
+            _remove(os.path.join(self.path, f'{col}.npy'))
+        _remove(os.path.join(self.path, NPY_MANIFEST))  # An older manifest no longer matches the files
+        if self._created:
+            shutil.rmtree(self.path, ignore_errors=True)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+WRITERS = {'csv': CsvWriter, 'parquet': ParquetWriter, 'npy': NpyWriter}
+
+
+class open_writer:
+    """Context manager returning the writer registered for the path's format.
+
+    On an exception the writer is aborted instead of closed, removing its partial output.
+    """
+
+    def __init__(self, path, fmt=None, **kwargs):
+        self.writer = WRITERS[fmt or detect_format(path)](path, **kwargs)
+
+    def __enter__(self):
+        return self.writer
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.writer.close()
+        else:
+            self.writer.abort()
+
+
+def write_cohort(data, path, fmt=None, **kwargs):
+    """Writes a DataFrame or an iterable of DataFrame chunks. Returns the row count."""
+    chunks = [data] if isinstance(data, pd.DataFrame) else data
+    with open_writer(path, fmt, **kwargs) as writer:
+        for chunk in chunks:
+            writer.write(chunk)
+    return writer.n_rows
+
+
+# --- 3. READERS ---
+def _npy_manifest(path):
+    with open(os.path.join(path, NPY_MANIFEST)) as fh:
+        return json.load(fh)
+
+
+def _sidecars(path):
+    """{column: sidecar file} of the derived columns added to a Parquet cohort."""
+    directory = path + DERIVED_SUFFIX
+    if not os.path.isdir(directory):
+        return {}
+    return {name[:-len('.parquet')]: os.path.join(directory, name)
+            for name in sorted(os.listdir(directory)) if name.endswith('.parquet')}
+
+
+def _split_parquet_columns(path, columns):
+    """Splits requested columns into (columns of the main file, {column: sidecar file})."""
+    _, pq = _require_pyarrow()
+    main = pq.ParquetFile(path).schema_arrow.names
+    sidecars = _sidecars(path)
+    if columns is None:
+        return main, {col: p for col, p in sidecars.items() if col not in main}
+    missing = [col for col in columns if col not in main and col not in sidecars]
+    if missing:
+        raise KeyError(f"Columns {missing} are not stored in '{path}'")
+    return [col for col in columns if col in main], {col: sidecars[col] for col in columns if col not in main}
+
+
+class _RowStream:
+    """Reads one sidecar column in exactly the row counts asked for (row groups need not line up)."""
+
+    def __init__(self, path, batch_size):
+        _, pq = _require_pyarrow()
+        parquet = pq.ParquetFile(path)
+        self._batches = parquet.iter_batches(batch_size=batch_size)
+        # Empty, but of the stored dtype: concatenating it must not upcast float32 columns
+        self._buffer = np.empty(0, dtype=parquet.schema_arrow.field(0).type.to_pandas_dtype())
+
+    def take(self, n_rows):
+        pieces, have = [self._buffer], len(self._buffer)
+        while have < n_rows:
+            piece = next(self._batches).column(0).to_numpy(zero_copy_only=False)
+            pieces.append(piece)
+            have += len(piece)
+        values = np.concatenate(pieces) if len(pieces) > 1 else pieces[0]
+        self._buffer = values[n_rows:]
+        return values[:n_rows]
+
+
+def stored_columns(path, fmt=None):
+    """Names of the columns stored in a cohort (including derived columns added later)."""
+    fmt = fmt or detect_format(path)
+    if fmt == 'npy':
+        return list(_npy_manifest(path)['columns'])
+    if fmt == 'parquet':
+        main, sidecars = _split_parquet_columns(path, None)
+        return main + list(sidecars)
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def read_columns(path, columns=None, fmt=None):
+    """Returns {column: ndarray}. In npy mode the arrays are read-only memory maps."""
+    fmt = fmt or detect_format(path)
+    if fmt == 'npy':
+        columns = columns or _npy_manifest(path)['columns']
+        return {col: np.load(os.path.join(path, f'{col}.npy'), mmap_mode='r') for col in columns}
+    df = read_cohort(path, columns=columns, fmt=fmt)
+    return {col: df[col].to_numpy() for col in df.columns}
+
+
+def read_cohort(path, columns=None, fmt=None):
+    """Loads a stored cohort as a DataFrame, parsing only the requested columns."""
+    fmt = fmt or detect_format(path)
+    if fmt == 'parquet':
+        _, pq = _require_pyarrow()
+        main, sidecars = _split_parquet_columns(path, columns)
+        df = pq.read_table(path, columns=main).to_pandas()
+        for col, sidecar in sidecars.items():
+            df[col] = pq.read_table(sidecar).column(0).to_numpy()
+        return df[columns] if columns is not None else df
+    if fmt == 'npy':
+        return pd.DataFrame(read_columns(path, columns, fmt='npy'), copy=False)
+    return pd.read_csv(path, usecols=columns)
+
+
+def iter_cohort(path, columns=None, batch_size=1_000_000, fmt=None):
+    """Yields the stored cohort as DataFrame chunks of at most batch_size rows."""
+    fmt = fmt or detect_format(path)
+    if fmt == 'parquet':
+        _, pq = _require_pyarrow()
+        main, sidecars = _split_parquet_columns(path, columns)
+        streams = {col: _RowStream(sidecar, batch_size) for col, sidecar in sidecars.items()}
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size, columns=main):
+            chunk = batch.to_pandas()
+            for col, stream in streams.items():
+                chunk[col] = stream.take(batch.num_rows)
+            yield chunk[columns] if columns is not None else chunk
+    elif fmt == 'npy':
+        arrays = read_columns(path, columns, fmt='npy')
+        n_rows = _npy_manifest(path)['n_rows']
+        for start in range(0, n_rows, batch_size):
+            yield pd.DataFrame({col: arr[start:start + batch_size] for col, arr in arrays.items()}, copy=False)
+    else:
+        yield from pd.read_csv(path, usecols=columns, chunksize=batch_size)
+
+
+# --- 4. ADDING COLUMNS ---
+def _n_rows(path, fmt):
+    if fmt == 'npy':
+        return _npy_manifest(path)['n_rows']
+    _, pq = _require_pyarrow()
+    return pq.ParquetFile(path).metadata.num_rows
+
+
+def add_columns(path, chunks, fmt=None):
+    """Adds (or replaces) columns of a stored cohort from row-aligned DataFrame chunks.
+
+    Only the new columns are written: npy cohorts get new column files and an
+    updated manifest, Parquet cohorts a sidecar file per column under
+    ``<path>.derived/`` that the readers merge transparently. CSV cohorts
+    cannot grow columns without a full rewrite. Returns the row count.
+    """
+    fmt = fmt or detect_format(path)
+    if fmt == 'csv':
+        raise ValueError("CSV cohorts cannot gain columns without a rewrite; store the cohort as parquet or npy")
+    protected = _split_parquet_columns(path, None)[0] if fmt == 'parquet' else []
+    staging = (path if fmt == 'npy' else path + DERIVED_SUFFIX) + f'.adding-{os.getpid()}'
+    os.makedirs(staging, exist_ok=True)
+    writers = {}
+    try:
+        for chunk in chunks:
+            for col in chunk.columns:
+                if col in protected:
+                    raise ValueError(f"'{col}' is stored in the main Parquet file and cannot be replaced by a sidecar")
+                if col not in writers:
+                    target = os.path.join(staging, col) if fmt == 'npy' else os.path.join(staging, f'{col}.parquet')
+                    writers[col] = WRITERS[fmt](target)
+                writers[col].write(chunk[[col]])
+        for writer in writers.values():
+            writer.close()
+        n_rows = _n_rows(path, fmt)
+        bad = {col: w.n_rows for col, w in writers.items() if w.n_rows != n_rows}
+        if bad:
+            raise ValueError(f"New columns must have {n_rows} rows like '{path}', got {bad}")
+
+        if fmt == 'npy':
+            manifest = _npy_manifest(path)
+            for col, writer in writers.items():
+                os.replace(os.path.join(writer.path, f'{col}.npy'), os.path.join(path, f'{col}.npy'))
+                manifest['dtypes'][col] = _npy_manifest(writer.path)['dtypes'][col]
+                if col not in manifest['columns']:
+                    manifest['columns'].append(col)
+            tmp_manifest = os.path.join(staging, NPY_MANIFEST)
+            with open(tmp_manifest, 'w') as fh:
+                json.dump(manifest, fh, indent=2)
+            os.replace(tmp_manifest, os.path.join(path, NPY_MANIFEST))
+        else:
+            os.makedirs(path + DERIVED_SUFFIX, exist_ok=True)
+            for col, writer in writers.items():
+                os.replace(writer.path, os.path.join(path + DERIVED_SUFFIX, f'{col}.parquet'))
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    return n_rows
@@ -0,0 +1,616 @@
+"""Constant-memory streaming statistics and drift checks for cohorts.
+
+The generators used to end with ``df['Haley_Syndrome'].value_counts(...)`` on
+the fully materialized DataFrame, which was the only check on what they
+produced. ``CohortStats`` is updated chunk by chunk instead - as chunks are
+generated, read back or scored - and keeps:
+
+* per-class row counts,
+* per-feature count / mean / sum of squared deviations, merged chunk by
+  chunk with the parallel Welford (Chan et al.) update, so the moments stay
+  accurate however many rows pass through (per class too with
+  ``by_class=True``),
+* one quantile sketch per feature: log-linear buckets (as in HDR
+  histograms) whose quantiles are within ``relative_accuracy`` of the true
+  value. Bucket counts simply add, so sketches from parallel workers merge
+  exactly.
+
+Memory depends only on the number of classes, features and sketch buckets
+(at most ``max_buckets`` per sign), never on the row count. An update costs
+a few vectorized passes per column: about 7 ms per million values of a
+float64 column plus 5 ms per million labels on one core, so ~35-40 ms per
+million rows of the 3-feature generator cohorts (a third of generating
+them). Labels are cheapest as small integers or a ``pd.Categorical``;
+other labels are hashed. A snapshot saved with ``save`` serves as
+the reference for ``drift``, which reports the class mix and, per feature,
+the mean shift, the Kolmogorov-Smirnov distance and the population stability
+index (PSI) of a new cohort.
+
+Usage:
+    stats = CohortStats(label_col='Haley_Syndrome')
+    for chunk in stats.track(generate_chunks(HALEY_PREVALENCE, 10_000_000)):
+        writer.write(chunk)
+    print(format_summary(stats.summary()))
+
+    python cohort_stats.py gwi_haley_10k.parquet --label-col Haley_Syndrome --save reference_stats.npz
+    python cohort_stats.py new_cohort.parquet --reference reference_stats.npz
+"""
+import argparse
+import json
+
+import numpy as np
+import pandas as pd
+
+# --- 1. PARAMETERS ---
+RELATIVE_ACCURACY = 0.01  # Quantile sketches are within 1% of the true value (0.78% in practice)
+MAX_BUCKETS = 4096  # Per sign; 64 powers of two (~1e19 dynamic range) at full accuracy, halved beyond that
+MIN_MAGNITUDE = 1e-9  # Smaller |x| land in the zero bucket
+FLOAT64_MANTISSA_BITS = 52
+SUMMARY_QUANTILES = [0.01, 0.25, 0.5, 0.75, 0.99]
+SMALL_INT_LABELS = 1024  # Integer labels below this are counted with bincount instead of hashed
+UNLABELLED = 'all'  # Class name used when there is no label column
+PSI_BINS = 10  # Reference deciles
+PSI_EPS = 1e-4  # Floor on bin fractions so empty bins do not blow PSI up
+PSI_WARN = 0.1  # Usual PSI reading: < 0.1 stable, 0.1-0.25 moderate shift, > 0.25 drift
+PSI_DRIFT = 0.25
+
+
+# --- 2. QUANTILE SKETCH ---
+class _Buckets:
+    """Dense bucket counts for keys offset .. offset + len(counts) - 1."""
+
+    def __init__(self):
+        self.offset = 0
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    def add(self, start, counts):
+        """Adds dense bucket counts for keys start, start + 1, ..."""
+        used = np.flatnonzero(counts)
+        if not len(used):
+            return
+        counts = counts[used[0]:used[-1] + 1]
+        low, high = start + int(used[0]), start + int(used[-1])
+        if len(self.counts):
+            low, high = min(low, self.offset), max(high, self.offset + len(self.counts) - 1)
+        if low != self.offset or high - low + 1 != len(self.counts):
+            grown = np.zeros(high - low + 1, dtype=np.int64)
+            grown[self.offset - low:self.offset - low + len(self.counts)] = self.counts
+            self.offset, self.counts = low, grown
+        begin = start + int(used[0]) - self.offset
+        self.counts[begin:begin + len(counts)] += counts
+
+    def coarsened(self, bits):
+        """(offset, counts) with every 2 ** bits neighbouring keys merged into key >> bits."""
+        if not len(self.counts) or not bits:
+            return self.offset, self.counts
+        keys = np.arange(self.offset, self.offset + len(self.counts)) >> bits
+        return int(keys[0]), np.add.reduceat(self.counts, np.flatnonzero(np.diff(keys, prepend=keys[0] - 1)))
+
+    def nonzero(self):
+        """(keys, counts) of the non-empty buckets, in ascending key order."""
+        index = np.flatnonzero(self.counts)
+        return index + self.offset, self.counts[index]
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with relative accuracy (log-linear buckets).
+
+    A bucket key is the float64 bit pattern of |x| without its low mantissa
+    bits, as in HDR histograms: every power of two is split into
+    2 ** mantissa_bits equal buckets, so a bucket's midpoint is within
+    ``relative_accuracy`` of every value in it, and keys cost a shift rather
+    than a logarithm. Negatives use a mirrored store and |x| below
+    MIN_MAGNITUDE a zero bucket. NaNs (``missing``) and infinities
+    (``infinite``) are counted separately and left out of the quantiles.
+
+    When the values span more than ``max_buckets`` buckets of one sign, the
+    sketch halves its resolution (drops a mantissa bit) until they fit: an
+    extreme outlier costs accuracy everywhere rather than the bulk of the
+    distribution. Merging takes the coarser resolution of the two.
+    """
+
+    def __init__(self, relative_accuracy=RELATIVE_ACCURACY, max_buckets=MAX_BUCKETS):
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max(1, max_buckets)
+        self._set_shift(FLOAT64_MANTISSA_BITS - min(FLOAT64_MANTISSA_BITS,
+                                                    max(0, int(np.ceil(np.log2(0.5 / relative_accuracy))))))
+        self.positive = _Buckets()
+        self.negative = _Buckets()
+        self.zeros = 0
+        self.missing = 0
+        self.infinite = 0
+        self.count = 0  # Finite values
+        self.min = np.inf
+        self.max = -np.inf
+
+    def _set_shift(self, shift):
+        self.shift = shift
+        self.mantissa_bits = FLOAT64_MANTISSA_BITS - shift  # Negative once buckets span several powers of two
+        self._zero_key = self._key(MIN_MAGNITUDE) - 1  # Keys at or below this are zeros
+        self._sign_offset = 1 << (63 - shift)
+
+    def _key(self, magnitude):
+        return int(np.array(magnitude, dtype=np.float64).view(np.int64)) >> self.shift
+
+    def _bucket_value(self, keys):
+        """Midpoint of each bucket."""
+        keys = np.asarray(keys, dtype=np.int64)
+        lower = (keys << self.shift).view(np.float64)
+        upper = np.minimum(((keys + 1) << self.shift).view(np.float64), np.finfo(np.float64).max)  # Top bucket
+        return lower / 2 + upper / 2
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        low, high = values.min(initial=np.inf), values.max(initial=-np.inf)
+        if not (np.isfinite(low) and np.isfinite(high)) and len(values):
+            finite = np.isfinite(values)
+            missing = int(np.isnan(values).sum())
+            self.missing += missing
+            self.infinite += int(len(values) - finite.sum()) - missing
+            values = values[finite]
+            low, high = values.min(initial=np.inf), values.max(initial=-np.inf)
+        if not len(values):
+            return self
+        self.count += len(values)
+        self.min, self.max = min(self.min, float(low)), max(self.max, float(high))
+
+        # The int64 view of a float sorts like its magnitude within each sign, so a shift
+        # gives the bucket key; negatives come out 2 ** (63 - shift) lower and are moved
+        # to their own block of the same bincount
+        keys = values.view(np.int64) >> self.shift
+        if low < 0:
+            keys += self._sign_offset
+            counts = np.bincount(keys)
+            self._add(self.negative, 0, counts[:self._sign_offset])
+            self._add(self.positive, 0, counts[self._sign_offset:])
+        else:
+            start = self._key(low)
+            keys -= start
+            self._add(self.positive, start, np.bincount(keys))
+        self._fit()
+        return self
+
+    def _add(self, store, start, counts):
+        """Adds a block of counts for magnitude keys start, start + 1, ..., splitting off the zeros."""
+        below = self._zero_key + 1 - start
+        if below > 0:
+            self.zeros += int(counts[:below].sum())
+            start, counts = start + below, counts[below:]
+        store.add(start, counts)
+
+    def _coarsen(self, bits):
+        """Drops `bits` more mantissa bits from every key."""
+        for store in (self.positive, self.negative):
+            store.offset, store.counts = store.coarsened(bits)
+        self._set_shift(self.shift + bits)
+
+    def _fit(self):
+        """Halves the resolution until each store spans at most max_buckets keys."""
+        while max(len(self.positive.counts), len(self.negative.counts)) > self.max_buckets:
+            self._coarsen(1)
+
+    def merge(self, other):
+        if other.shift > self.shift:
+            self._coarsen(other.shift - self.shift)
+        for mine, theirs in ((self.positive, other.positive), (self.negative, other.negative)):
+            if len(theirs.counts):
+                mine.add(*theirs.coarsened(self.shift - other.shift))
+        self.zeros += other.zeros
+        self.missing += other.missing
+        self.infinite += other.infinite
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._fit()
+        return self
+
+    def distribution(self):
+        """(values, counts): bucket midpoints in ascending order with their counts."""
+        pos_keys, pos_counts = self.positive.nonzero()
+        neg_keys, neg_counts = self.negative.nonzero()
+        values = np.concatenate([-self._bucket_value(neg_keys[::-1]), [0.0], self._bucket_value(pos_keys)])
+        counts = np.concatenate([neg_counts[::-1], [self.zeros], pos_counts])
+        keep = counts > 0
+        return values[keep], counts[keep]
+
+    def quantile(self, q):
+        """Estimated q-quantile(s); NaN while the sketch is empty."""
+        q = np.asarray(q, dtype=np.float64)
+        if not self.count:
+            return np.full(q.shape, np.nan) if q.ndim else float('nan')
+        values, counts = self.distribution()
+        index = np.searchsorted(np.cumsum(counts), q * (self.count - 1), side='right')
+        result = np.clip(values[np.minimum(index, len(values) - 1)], self.min, self.max)
+        return result if q.ndim else float(result)
+
+    def cdf(self, x):
+        """Estimated fraction of values <= x."""
+        values, counts = self.distribution()
+        cumulative = np.concatenate([[0], np.cumsum(counts)]) / max(self.count, 1)
+        return cumulative[np.searchsorted(values, x, side='right')]
+
+    def state(self):
+        return {
+            'relative_accuracy': self.relative_accuracy, 'max_buckets': self.max_buckets, 'shift': self.shift,
+            'positive_offset': self.positive.offset, 'positive': self.positive.counts.tolist(),
+            'negative_offset': self.negative.offset, 'negative': self.negative.counts.tolist(),
+            'zeros': self.zeros, 'missing': self.missing, 'infinite': self.infinite, 'count': self.count,
+            'min': self.min if self.count else None, 'max': self.max if self.count else None,
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        sketch = cls(state['relative_accuracy'], state['max_buckets'])
+        sketch._set_shift(state['shift'])
+        for store, name in ((sketch.positive, 'positive'), (sketch.negative, 'negative')):
+            store.offset = state[f'{name}_offset']
+            store.counts = np.asarray(state[name], dtype=np.int64)
+        sketch.zeros, sketch.missing, sketch.count = state['zeros'], state['missing'], state['count']
+        sketch.infinite = state['infinite']
+        if state['count']:
+            sketch.min, sketch.max = state['min'], state['max']
+        return sketch
+
+
+# --- 3. COHORT STATISTICS ---
+def _merge_moments(n_a, mean_a, m2_a, n_b, mean_b, m2_b):
+    """Chan et al. parallel update of (count, mean, M2) arrays; empty groups are handled."""
+    n = n_a + n_b
+    with np.errstate(invalid='ignore', divide='ignore'):
+        delta = mean_b - mean_a
+        weight = np.where(n > 0, n_b / n, 0.0)
+        mean = mean_a + delta * weight
+        m2 = m2_a + m2_b + delta ** 2 * n_a * weight
+    return n, np.where(n > 0, mean, 0.0), np.where(n > 0, m2, 0.0)
+
+
+def _chunk_moments(values, index=None, sizes=None):
+    """(count, mean, M2) of one chunk's column, per group of `index` (0 .. len(sizes)-1) if given."""
+    if not len(values):
+        n_groups = 1 if sizes is None else len(sizes)
+        return np.zeros(n_groups), np.zeros(n_groups), np.zeros(n_groups)
+    shift = values.mean(dtype=np.float64)
+    if not np.isfinite(shift):
+        finite = np.isfinite(values)
+        values = values[finite]
+        if index is not None:
+            index, sizes = index[finite], np.bincount(index[finite], minlength=len(sizes))
+        shift = values.mean(dtype=np.float64) if len(values) else 0.0
+    # Deviations from the chunk mean: one pass per moment, no cancellation
+    deviation = values - shift
+    if index is None:
+        return np.array([len(values)], dtype=np.float64), np.array([shift]), np.array([np.dot(deviation, deviation)])
+    n = sizes.astype(np.float64)
+    s1 = np.bincount(index, weights=deviation, minlength=len(n))
+    deviation *= deviation
+    s2 = np.bincount(index, weights=deviation, minlength=len(n))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(n > 0, s1 / n, 0.0)
+    return n, mean + shift, np.maximum(s2 - mean * s1, 0.0)
+
+
+class CohortStats:
+    """Streaming class counts, feature moments and per-feature quantile sketches.
+
+    `columns` defaults to the numeric columns of the first chunk (without
+    the label). Class labels may be any hashable values; they are few, so
+    the state stays constant-size. With by_class=True the moments are also
+    kept per class (two more weighted passes per column).
+    """
+
+    def __init__(self, columns=None, label_col=None, by_class=False, relative_accuracy=RELATIVE_ACCURACY,
+                 max_buckets=MAX_BUCKETS):
+        self.columns = list(columns) if columns is not None else None
+        self.label_col = label_col
+        self.by_class = by_class
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.classes = []
+        self.rows = np.zeros(0, dtype=np.int64)  # Per class
+        self.n = self.mean = self.m2 = None  # (groups, columns): one group, or one per class
+        self.sketches = {}
+
+    def _start(self, columns):
+        if self.columns is None:
+            self.columns = list(columns)
+        self.sketches = {col: QuantileSketch(self.relative_accuracy, self.max_buckets) for col in self.columns}
+        shape = (0 if self.by_class else 1, len(self.columns))
+        self.n, self.mean, self.m2 = np.zeros(shape), np.zeros(shape), np.zeros(shape)
+
+    def _class_index(self, labels):
+        """Row -> index into self.classes, registering unseen labels."""
+        if isinstance(labels, pd.Categorical) and len(labels) and labels.codes.min() >= 0:
+            # Categorical labels (the generators' named classes) carry their codes: nothing to hash
+            codes = labels.codes
+            positions = np.flatnonzero(np.bincount(codes, minlength=len(labels.categories)))
+            uniques = labels.categories[positions]
+        elif labels.dtype.kind in 'iu' and len(labels) and 0 <= labels.min() and labels.max() < SMALL_INT_LABELS:
+            # Small non-negative integer classes (the generators' labels) need no hashing
+            codes = labels
+            positions = uniques = np.flatnonzero(np.bincount(labels))
+        else:
+            codes, uniques = pd.factorize(labels)
+            positions = np.arange(len(uniques))
+        index = {label: i for i, label in enumerate(self.classes)}
+        for label in uniques:
+            label = label.item() if hasattr(label, 'item') else label
+            if label not in index:
+                index[label] = len(self.classes)
+                self.classes.append(label)
+        grow = len(self.classes) - len(self.rows)
+        if grow:
+            self.rows = np.concatenate([self.rows, np.zeros(grow, dtype=np.int64)])
+            if self.by_class:
+                self.n, self.mean, self.m2 = (np.vstack([a, np.zeros((grow, len(self.columns)))])
+                                              for a in (self.n, self.mean, self.m2))
+        mapping = np.zeros(int(positions.max()) + 1 if len(positions) else 0, dtype=np.intp)
+        mapping[positions] = [index[label.item() if hasattr(label, 'item') else label] for label in uniques]
+        if codes is not labels or not np.array_equal(mapping[positions], positions):
+            return mapping[codes]
+        return codes  # Labels already are class indices
+
+    def update(self, chunk, labels=None):
+        """Adds a DataFrame chunk. Labels come from `label_col`, or `labels` (e.g. predictions)."""
+        if self.n is None:
+            self._start(col for col in chunk.columns if col != self.label_col and chunk[col].dtype.kind in 'biuf')
+        if not len(chunk):
+            return self
+        if labels is None and self.label_col is not None:
+            labels = chunk[self.label_col].array
+        if labels is None:
+            labels = np.array([UNLABELLED], dtype=object)
+            index = np.zeros(len(chunk), dtype=np.intp) + self._class_index(labels)[0]
+        else:
+            index = self._class_index(labels if isinstance(labels, pd.Categorical) else np.asarray(labels))
+        if self.by_class:
+            index = index.astype(np.intp, copy=False)  # bincount would convert it once per call
+        sizes = np.bincount(index, minlength=len(self.classes))
+        self.rows += sizes
+
+        for j, col in enumerate(self.columns):
+            values = chunk[col].to_numpy()
+            self.sketches[col].update(values)
+            moments = _chunk_moments(values, index, sizes) if self.by_class else _chunk_moments(values)
+            self.n[:, j], self.mean[:, j], self.m2[:, j] = _merge_moments(
+                self.n[:, j], self.mean[:, j], self.m2[:, j], *moments)
+        return self
+
+    def track(self, chunks):
+        """Passes chunks through while updating the statistics."""
+        for chunk in chunks:
+            self.update(chunk)
+            yield chunk
+
+    def merge(self, other):
+        """Adds another CohortStats over the same columns (e.g. from a parallel worker)."""
+        if other.n is None:
+            return self
+        if self.n is None:
+            self._start(other.columns)
+        if other.columns != self.columns or other.by_class != self.by_class:
+            raise ValueError(f"Cannot merge statistics over {other.columns} (by_class={other.by_class}) "
+                             f"into {self.columns} (by_class={self.by_class})")
+        index = self._class_index(np.array(other.classes, dtype=object))
+        self.rows[index] += other.rows
+        group = index if self.by_class else np.zeros(1, dtype=np.intp)
+        n, mean, m2 = np.zeros_like(self.n), np.zeros_like(self.mean), np.zeros_like(self.m2)
+        n[group], mean[group], m2[group] = other.n, other.mean, other.m2
+        self.n, self.mean, self.m2 = _merge_moments(self.n, self.mean, self.m2, n, mean, m2)
+        for col in self.columns:
+            self.sketches[col].merge(other.sketches[col])
+        return self
+
+    def moments(self, col, by_class=False):
+        """(count, mean, SD) of a column, overall or as arrays per class (in self.classes order)."""
+        j = self.columns.index(col)
+        n, mean, m2 = self.n[:, j], self.mean[:, j], self.m2[:, j]
+        if by_class:
+            if not self.by_class:
+                raise ValueError("Per-class moments need CohortStats(by_class=True)")
+            with np.errstate(invalid='ignore', divide='ignore'):
+                return n, mean, np.sqrt(m2 / (n - 1))
+        total = (np.zeros(1), np.zeros(1), np.zeros(1))
+        for i in range(len(n)):
+            total = _merge_moments(*total, n[i:i + 1], mean[i:i + 1], m2[i:i + 1])
+        n, mean, m2 = (float(a[0]) for a in total)
+        return n, mean, float(np.sqrt(m2 / (n - 1))) if n > 1 else float('nan')
+
+    def _class_order(self):
+        try:
+            return sorted(range(len(self.classes)), key=lambda i: self.classes[i])
+        except TypeError:  # Mixed label types
+            return list(range(len(self.classes)))
+
+    def summary(self):
+        """JSON-ready dict: class counts and shares, per-feature moments and quantiles."""
+        total = int(self.rows.sum())
+        order = self._class_order()
+        features = {}
+        for col in self.columns or []:
+            n, mean, sd = self.moments(col)
+            sketch = self.sketches[col]
+            features[col] = {
+                'count': int(n), 'missing': sketch.missing, 'infinite': sketch.infinite, 'mean': mean, 'sd': sd,
+                'min': sketch.min if sketch.count else None, 'max': sketch.max if sketch.count else None,
+                'quantiles': dict(zip((f'{q:g}' for q in SUMMARY_QUANTILES),
+                                      sketch.quantile(SUMMARY_QUANTILES).tolist())),
+            }
+            if self.by_class:
+                _, class_means, class_sds = self.moments(col, by_class=True)
+                features[col]['class_mean'] = {str(self.classes[i]): float(class_means[i]) for i in order}
+                features[col]['class_sd'] = {str(self.classes[i]): float(class_sds[i]) for i in order}
+        return {
+            'rows': total,
+            'classes': {str(self.classes[i]): int(self.rows[i]) for i in order},
+            'class_share': {str(self.classes[i]): int(self.rows[i]) / total for i in order} if total else {},
+            'features': features,
+        }
+
+    # --- Snapshots ---
+    def save(self, path):
+        meta = {'columns': self.columns, 'label_col': self.label_col, 'by_class': self.by_class,
+                'classes': self.classes, 'relative_accuracy': self.relative_accuracy,
+                'max_buckets': self.max_buckets,
+                'sketches': {col: sketch.state() for col, sketch in self.sketches.items()}}
+        with open(path, 'wb') as fh:
+            np.savez(fh, meta=json.dumps(meta), n=self.n, mean=self.mean, m2=self.m2, rows=self.rows)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as npz:
+            meta = json.loads(str(npz['meta']))
+            stats = cls(meta['columns'], meta['label_col'], meta['by_class'], meta['relative_accuracy'],
+                        meta['max_buckets'])
+            stats.classes = meta['classes']
+            stats.n, stats.mean, stats.m2, stats.rows = npz['n'], npz['mean'], npz['m2'], npz['rows']
+        stats.sketches = {col: QuantileSketch.from_state(state) for col, state in meta['sketches'].items()}
+        return stats
+
+
+# --- 4. DRIFT ---
+def _psi(expected, actual):
+    expected = np.maximum(expected, PSI_EPS)
+    actual = np.maximum(actual, PSI_EPS)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+def _status(psi):
+    return 'drift' if psi > PSI_DRIFT else 'warn' if psi > PSI_WARN else 'ok'
+
+
+def _ks(a, b):
+    """Kolmogorov-Smirnov distance of two sketches (exact on their buckets when accuracies match)."""
+    points = np.union1d(a.distribution()[0], b.distribution()[0])
+    return float(np.abs(a.cdf(points) - b.cdf(points)).max()) if len(points) else 0.0
+
+
+def drift(current, reference):
+    """Compares a cohort's statistics with a reference snapshot.
+
+    Per feature: standardized mean shift (in reference SDs), SD ratio,
+    KS distance and PSI over the reference deciles; when both sides are
+    labelled, PSI of the class shares. Each PSI gets a status ('ok', 'warn'
+    or 'drift').
+    """
+    features = {}
+    for col in reference.columns:
+        if col not in (current.columns or []):
+            continue
+        _, ref_mean, ref_sd = reference.moments(col)
+        _, cur_mean, cur_sd = current.moments(col)
+        ref, cur = reference.sketches[col], current.sketches[col]
+        edges = np.unique(ref.quantile(np.arange(1, PSI_BINS) / PSI_BINS))
+        expected = np.diff(np.concatenate([[0.0], ref.cdf(edges), [1.0]]))
+        actual = np.diff(np.concatenate([[0.0], cur.cdf(edges), [1.0]]))
+        psi = _psi(expected, actual)
+        features[col] = {
+            'mean_shift_sd': (cur_mean - ref_mean) / ref_sd if ref_sd > 0 else float('nan'),
+            'sd_ratio': cur_sd / ref_sd if ref_sd > 0 else float('nan'),
+            'ks': _ks(ref, cur),
+            'psi': psi,
+            'status': _status(psi),
+        }
+
+    report = {
+        'status': 'ok',
+        'rows': {'reference': int(reference.rows.sum()), 'current': int(current.rows.sum())},
+        'classes': None,
+        'features': features,
+    }
+    statuses = [f['status'] for f in features.values()]
+    if UNLABELLED not in reference.classes and UNLABELLED not in current.classes:
+        # Class mix, only when both sides are labelled
+        classes = [reference.classes[i] for i in reference._class_order()]
+        classes += [c for c in current.classes if c not in reference.classes]
+        ref_rows = np.array([reference.rows[reference.classes.index(c)] if c in reference.classes else 0
+                             for c in classes])
+        cur_rows = np.array([current.rows[current.classes.index(c)] if c in current.classes else 0 for c in classes])
+        ref_share = ref_rows / max(ref_rows.sum(), 1)
+        cur_share = cur_rows / max(cur_rows.sum(), 1)
+        class_psi = _psi(ref_share, cur_share)
+        report['classes'] = {
+            'share': {str(c): {'reference': float(r), 'current': float(s)}
+                      for c, r, s in zip(classes, ref_share, cur_share)},
+            'psi': class_psi,
+            'status': _status(class_psi),
+        }
+        statuses.append(_status(class_psi))
+    report['status'] = 'drift' if 'drift' in statuses else 'warn' if 'warn' in statuses else 'ok'
+    return report
+
+
+# --- 5. REPORTS ---
+def format_summary(summary):
+    lines = [f"{summary['rows']:,} rows"]
+    for c, share in summary['class_share'].items():
+        lines.append(f"  class {c:<12} {summary['classes'][c]:>12,}  {share:7.2%}")
+    lines.append(f"  {'feature':<26} {'mean':>10} {'sd':>10} {'p1':>10} {'median':>10} {'p99':>10}")
+    for col, f in summary['features'].items():
+        q = f['quantiles']
+        lines.append(f"  {col:<26} {f['mean']:>10.4g} {f['sd']:>10.4g} {q['0.01']:>10.4g} {q['0.5']:>10.4g} "
+                     f"{q['0.99']:>10.4g}")
+    return '\n'.join(lines)
+
+
+def format_drift(report):
+    lines = [f"Drift status: {report['status'].upper()} "
+             f"({report['rows']['current']:,} rows vs {report['rows']['reference']:,} reference rows)"]
+    classes = report['classes']
+    if classes is not None:
+        lines.append(f"  class mix PSI {classes['psi']:.4f} [{classes['status']}]")
+        for c, share in classes['share'].items():
+            lines.append(f"    class {c:<12} {share['reference']:7.2%} -> {share['current']:7.2%}")
+    lines.append(f"  {'feature':<26} {'shift (SD)':>10} {'SD ratio':>9} {'KS':>7} {'PSI':>8}")
+    for col, f in report['features'].items():
+        lines.append(f"  {col:<26} {f['mean_shift_sd']:>+10.3f} {f['sd_ratio']:>9.3f} {f['ks']:>7.4f} "
+                     f"{f['psi']:>8.4f} [{f['status']}]")
+    return '\n'.join(lines)
+
+
+def cohort_stats(path, columns=None, label_col=None, by_class=False, batch_size=1_000_000, fmt=None):
+    """Streams a stored cohort (any cohort_io format) through a CohortStats."""
+    from cohort_io import iter_cohort, stored_columns
+
+    stored = stored_columns(path, fmt)
+    label_col = label_col if label_col in stored else None
+    features = [col for col in columns if col != label_col] if columns is not None else None
+    read = features + [label_col] if features is not None and label_col else features
+    stats = CohortStats(features, label_col, by_class=by_class)
+    for chunk in iter_cohort(path, columns=read, batch_size=batch_size, fmt=fmt):
+        stats.update(chunk)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Streaming statistics and drift report for a stored cohort.")
+    parser.add_argument('cohort', help="Cohort file or npy directory")
+    parser.add_argument('--label-col', default=None, help="Class column (e.g. Haley_Syndrome)")
+    parser.add_argument('--columns', nargs='+', default=None,
+                        help="Feature columns (default: the reference's, or all numeric)")
+    parser.add_argument('--by-class', action='store_true', help="Also keep per-class means and SDs")
+    parser.add_argument('--save', default=None, help="Write the statistics snapshot here (.npz)")
+    parser.add_argument('--reference', default=None, help="Reference snapshot to check for drift")
+    parser.add_argument('--json', default=None, help="Also write the summary (and drift report) as JSON")
+    args = parser.parse_args(argv)
+
+    reference = CohortStats.load(args.reference) if args.reference else None
+    label_col = args.label_col or (reference.label_col if reference else None)
+    columns = args.columns or (reference.columns if reference else None)
+    stats = cohort_stats(args.cohort, columns, label_col, by_class=args.by_class)
+    result = {'summary': stats.summary()}
+    print(format_summary(result['summary']))
+    if reference is not None:
+        result['drift'] = drift(stats, reference)
+        print(format_drift(result['drift']))
+    if args.save:
+        stats.save(args.save)
+        print(f"✅ Saved statistics snapshot to '{args.save}'")
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump(result, fh, indent=2)
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Parallel k-fold cross-fitting of ``Symptom_Prior_Probability``.
+
+Fitting the prior and predicting on the same rows leaks each patient's
+label into their own prior feature. Cross-fitting trains one prior per fold
+on the other k-1 folds and predicts only the held-out rows. Folds train in
+parallel worker processes:
+
+* the symptom matrix, labels and the output column live in
+  ``multiprocessing.shared_memory`` blocks, so workers attach to them by
+  name and never pickle the data,
+* every worker writes its out-of-fold predictions straight into the one
+  preallocated output column (folds are disjoint, so no locking is needed),
+* fold models are cached on disk as inference-kernel artifacts, keyed by a
+  hash of the data, fold layout and hyperparameters; reruns with unchanged
+  inputs skip training and only predict.
+"""
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from inference_kernel import export_model, load_predictor, symptom_prior_probability
+from prior_training import CLASSES, DEFAULT_C, fit_arrays
+
+# --- 1. PARAMETERS ---
+DEFAULT_FOLDS = 5
+DEFAULT_CACHE_DIR = '.prior_cache'
+CACHE_VERSION = 1  # Bump when the fitting code changes in a way that invalidates cached folds
+RANDOM_SEED = 42
+
+
+# --- 2. FOLDS & CACHE KEYS ---
+def fold_ids(n_rows, n_folds=DEFAULT_FOLDS, seed=RANDOM_SEED):
+    """Assigns every row to a fold (balanced, shuffled, deterministic)."""
+    ids = np.arange(n_rows, dtype=np.int32) % n_folds
+    np.random.default_rng(seed).shuffle(ids)
+    return ids
+
+
+def cache_key(X, y, n_folds, seed, C, classes):
+    """Content hash of the inputs and hyperparameters that determine the fold models."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f'v{CACHE_VERSION}|{X.shape}|{X.dtype}|{n_folds}|{seed}|{C}|{list(classes)}'.encode())
+    h.update(np.ascontiguousarray(X).data)
+    h.update(np.ascontiguousarray(y).data)
+    return h.hexdigest()
+
+
+# --- 3. SHARED MEMORY ---
+def _share(array):
+    """Copies an array into a new shared-memory block; returns (block, spec to re-attach, view)."""
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    view = np.ndarray(array.shape, array.dtype, buffer=block.buf)
+    view[...] = array
+    return block, (block.name, array.shape, array.dtype.str), view
+
+
+def _attach(spec):
+    name, shape, dtype = spec
+    block = shared_memory.SharedMemory(name=name)
+    return block, np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+
+
+# --- 4. FOLD WORKER ---
+def _fit_fold(fold, specs, model_path, C, classes):
+    """Trains (or loads) one fold model and writes its out-of-fold predictions. Returns True on a cache hit."""
+    blocks, arrays = zip(*[_attach(spec) for spec in specs])
+    try:
+        X, y, folds, out = arrays
+        held_out = folds == fold
+
+        cached = os.path.exists(model_path)
+        if not cached:
+            model = fit_arrays(X[~held_out], y[~held_out], classes=classes, C=C)
+            tmp_path = f'{model_path}.{os.getpid()}.tmp'
+            export_model(model, tmp_path)
+            os.replace(tmp_path, model_path)
+        out[held_out] = symptom_prior_probability(load_predictor(model_path).predict_proba(X[held_out]))
+        return cached
+    finally:
+        # Views must be released before the blocks can be closed
+        arrays = X = y = folds = out = None
+        for block in blocks:
+            block.close()
+
+
+def cross_fit_prior(X, y, n_folds=DEFAULT_FOLDS, C=DEFAULT_C, classes=CLASSES, workers=None,
+                    cache_dir=DEFAULT_CACHE_DIR, seed=RANDOM_SEED):
+    """Returns the out-of-fold Symptom_Prior_Probability for every row.
+
+    Returns (probabilities, n_cached_folds).
+    """
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    y = np.ascontiguousarray(y)
+    folds = fold_ids(len(y), n_folds, seed)
+    key = cache_key(X, y, n_folds, seed, C, classes)
+    os.makedirs(cache_dir, exist_ok=True)
+    model_paths = [os.path.join(cache_dir, f'prior_{key}_fold{k}of{n_folds}.npz') for k in range(n_folds)]
+
+    shared = [_share(X), _share(y), _share(folds), _share(np.zeros(len(y)))]
+    specs = [spec for _, spec, _ in shared]
+    try:
+        workers = min(workers or os.cpu_count() or 1, n_folds)
+        if workers <= 1:
+            hits = [_fit_fold(k, specs, model_paths[k], C, classes) for k in range(n_folds)]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                hits = list(pool.map(_fit_fold, range(n_folds), [specs] * n_folds, model_paths,
+                                     [C] * n_folds, [classes] * n_folds))
+        result = shared[-1][2].copy()
+    finally:
+        # Drop the views before closing their blocks
+        blocks = [block for block, _, _ in shared]
+        shared = None
+        for block in blocks:
+            block.close()
+            block.unlink()
+    return result, sum(hits)
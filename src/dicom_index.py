@@ -0,0 +1,166 @@
+"""Batch DICOM header indexer.
+
+The feature-extraction notebook copied one scan to ``/tmp`` and read the
+whole file (pixel data included) just to print ``PatientID``, ``Modality``
+and ``StudyDate``. This module indexes whole directory trees instead:
+
+* headers only: ``stop_before_pixels`` plus deferred reading of large
+  elements, and only the tags we index are parsed,
+* files are read in place from a local or mounted path (e.g. a Synapse
+  ``mssparkutils.fs.mount`` of the Data Lake), with no temp copy,
+* headers are read across a process pool,
+* results go into a persistent SQLite index keyed by path, size and mtime,
+  so re-runs only open new or changed files.
+
+Usage:
+    python dicom_index.py /synfs/<job_id>/dicom dicom_index.sqlite
+"""
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+
+from instrumentation import timed
+
+# --- 1. PARAMETERS ---
+DICOM_EXTENSIONS = ('.dcm', '.dicom')  # Matched case-insensitively (0002.DCM)
+HEADER_TAGS = ['PatientID', 'Modality', 'StudyDate', 'StudyInstanceUID', 'SeriesInstanceUID', 'SOPInstanceUID']
+DEFER_SIZE = '1 KB'  # Elements larger than this are only read if accessed
+WRITE_BATCH = 1000  # Rows per SQLite transaction
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS dicom_headers (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    {', '.join(f'{tag} TEXT' for tag in HEADER_TAGS)},
+    error TEXT,
+    indexed_at REAL NOT NULL
+)
+"""
+
+
+# --- 2. HEADER READING ---
+def read_header(path):
+    """Reads only the indexed header tags of one DICOM file (no pixel data)."""
+    import pydicom
+
+    ds = pydicom.dcmread(path, defer_size=DEFER_SIZE, stop_before_pixels=True, specific_tags=HEADER_TAGS)
+    return {tag: (str(ds.get(tag)) if ds.get(tag) is not None else None) for tag in HEADER_TAGS}
+
+
+def _index_one(entry):
+    """Process-pool entry point: returns one index row; unreadable files are recorded with their error."""
+    path, size, mtime_ns = entry
+    try:
+        header = read_header(path)
+        error = None
+    except Exception as e:
+        header = dict.fromkeys(HEADER_TAGS)
+        error = f'{type(e).__name__}: {e}'
+    return (path, size, mtime_ns, *[header[tag] for tag in HEADER_TAGS], error, time.time())
+
+
+# --- 3. DIRECTORY SCAN ---
+def scan_directory(root, extensions=DICOM_EXTENSIONS):
+    """Yields (path, size, mtime_ns) for every DICOM file below root, using one stat per entry."""
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.lower().endswith(extensions):
+                    st = entry.stat()
+                    yield entry.path, st.st_size, st.st_mtime_ns
+
+
+def open_index(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute(SCHEMA)
+    return conn
+
+
+# --- 4. INDEXING ---
+@timed('header_indexing', patients=lambda stats: stats['indexed'], nbytes=lambda stats: stats['indexed_bytes'])
+def index_directory(root, db_path, workers=None, prune=True):
+    """Brings the SQLite index up to date with the DICOM files under root.
+
+    Returns a dict with the number of files seen, (re)indexed, unchanged,
+    failed and pruned, plus the bytes of the (re)indexed files.
+    """
+    with closing(open_index(db_path)) as conn:  # Closed (and its write lock released) on errors too
+        rows = conn.execute('SELECT path, size, mtime_ns FROM dicom_headers')
+        known = {path: (size, mtime) for path, size, mtime in rows}
+
+        seen = set()
+        todo = []
+        for path, size, mtime_ns in scan_directory(root):
+            seen.add(path)
+            if known.get(path) != (size, mtime_ns):
+                todo.append((path, size, mtime_ns))
+
+        placeholders = ', '.join('?' * (len(HEADER_TAGS) + 5))
+        upsert = f'INSERT OR REPLACE INTO dicom_headers VALUES ({placeholders})'
+        failed = 0
+        batch = []
+
+        def flush():
+            with conn:
+                conn.executemany(upsert, batch)
+            batch.clear()
+
+        workers = workers or os.cpu_count() or 1
+        if workers <= 1 or len(todo) < 2:
+            rows = map(_index_one, todo)
+            pool = None
+        else:
+            pool = ProcessPoolExecutor(max_workers=workers)
+            rows = pool.map(_index_one, todo, chunksize=max(1, min(256, len(todo) // (4 * workers))))
+        try:
+            for row in rows:
+                failed += row[-2] is not None
+                batch.append(row)
+                if len(batch) >= WRITE_BATCH:
+                    flush()
+            flush()
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        pruned = 0
+        if prune:
+            root_prefix = os.path.join(root, '')
+            stale = [(p,) for p in known if p.startswith(root_prefix) and p not in seen]
+            with conn:
+                conn.executemany('DELETE FROM dicom_headers WHERE path = ?', stale)
+            pruned = len(stale)
+
+    return {
+        'seen': len(seen),
+        'indexed': len(todo),
+        'indexed_bytes': sum(size for _, size, _ in todo),
+        'unchanged': len(seen) - len(todo),
+        'failed': failed,
+        'pruned': pruned,
+    }
+
+
+def load_index(db_path, columns=('path', *HEADER_TAGS)):
+    """Returns the index as a DataFrame (successfully read headers only)."""
+    import pandas as pd
+
+    # A sqlite3 connection's own context manager only commits; closing() releases the file
+    with closing(sqlite3.connect(db_path)) as conn:
+        return pd.read_sql_query(f"SELECT {', '.join(columns)} FROM dicom_headers WHERE error IS NULL", conn)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit("Usage: python dicom_index.py <dicom_dir> <index.sqlite>")
+    stats = index_directory(sys.argv[1], sys.argv[2])
+    print(f"✅ Indexed {stats['indexed']} new/changed scans ({stats['unchanged']} unchanged, "
+          f"{stats['failed']} unreadable, {stats['pruned']} removed) into {sys.argv[2]}")
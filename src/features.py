@@ -0,0 +1,178 @@
+"""Registry of derived biomarker features, computed in fused float32 passes.
+
+Each derived column is declared once, with its inputs and an in-place
+kernel::
+
+    @feature('Metabolic_Index', inputs=['NAD_NADH', 'PCr_ATP', 'GSH_GSSG'], position=3)
+    def _metabolic_index(out, tmp, nad_nadh, pcr_atp, gsh_gssg): ...
+
+Kernels write into ``out`` with ``out=`` ufuncs and one scratch buffer, so a
+feature allocates nothing but its output column. ``compute`` runs all
+requested features block by block (BLOCK_ROWS rows): every input block is
+cast to float32 once and all features are evaluated while it is still in
+cache, instead of one full-size temporary per operator.
+
+``materialize`` adds features to a stored cohort (npy or Parquet): it reads
+only the inputs, computes only the missing columns and appends them with
+``cohort_io.add_columns``, so the base biomarkers are neither regenerated
+nor rewritten.
+
+Usage:
+    python features.py gwi_lifelike_full.parquet Ox_Energy_Interaction
+"""
+import sys
+
+import numpy as np
+import pandas as pd
+
+from cohort_io import add_columns, iter_cohort, stored_columns
+
+# --- 1. PARAMETERS ---
+FLOAT_DTYPE = np.float32
+BLOCK_ROWS = 16384  # Rows per fused block: inputs, scratch and outputs stay cache-resident
+DEFAULT_BATCH_ROWS = 1_000_000  # Rows read per chunk when materializing a stored cohort
+# Healthy-control means used to normalize the Metabolic_Index terms
+METABOLIC_REFERENCE = {'NAD_NADH': 2.0, 'PCr_ATP': 1.8, 'GSH_GSSG': 30.0}
+ENGINEERED_COLS = ['Metabolic_Index', 'Ox_Energy_Interaction']
+
+
+# --- 2. REGISTRY ---
+class Feature:
+    def __init__(self, name, inputs, kernel, position=None):
+        self.name = name
+        self.inputs = tuple(inputs)
+        self.kernel = kernel
+        self.position = position  # Column index when inserted into a DataFrame (None = append)
+
+
+FEATURES = {}
+
+
+def feature(name, inputs, position=None):
+    """Registers `kernel(out, tmp, *inputs)`, which must fill `out` in place (float32 blocks)."""
+    def register(kernel):
+        FEATURES[name] = Feature(name, inputs, kernel, position)
+        return kernel
+    return register
+
+
+@feature('Metabolic_Index', inputs=list(METABOLIC_REFERENCE), position=3)
+def _metabolic_index(out, tmp, *biomarkers):
+    """Total metabolic health: sum of the biomarkers, each normalized by its healthy mean."""
+    refs = list(METABOLIC_REFERENCE.values())
+    np.divide(biomarkers[0], refs[0], out=out)
+    for values, ref in zip(biomarkers[1:], refs[1:]):
+        np.divide(values, ref, out=tmp)
+        out += tmp
+
+
+@feature('Ox_Energy_Interaction', inputs=['NAD_NADH', 'GSH_GSSG'], position=4)
+def _ox_energy_interaction(out, tmp, nad_nadh, gsh_gssg):
+    """Oxidative energy: drops sharply when both NAD/NADH and GSH/GSSG are low."""
+    np.multiply(nad_nadh, gsh_gssg, out=out)
+
+
+def resolve(names):
+    """Orders features so that derived inputs are computed before the features using them."""
+    ordered = []
+
+    def visit(name, path=()):
+        if name in path:
+            raise ValueError(f"Feature cycle: {' -> '.join(path + (name,))}")
+        if name in ordered:
+            return
+        for dep in FEATURES[name].inputs:
+            if dep in FEATURES:
+                visit(dep, path + (name,))
+        ordered.append(name)
+
+    for name in names:
+        if name not in FEATURES:
+            raise KeyError(f"Unknown feature '{name}' (registered: {list(FEATURES)})")
+        visit(name)
+    return ordered
+
+
+# --- 3. FUSED COMPUTATION ---
+def compute(columns, names=ENGINEERED_COLS):
+    """Computes features from a mapping of input columns (DataFrame or dict of arrays).
+
+    Returns {name: float32 array}, including derived inputs pulled in by
+    `names`. Inputs that already exist in `columns` are used, not recomputed.
+    """
+    order = [name for name in resolve(names) if name not in columns or name in names]
+    base = sorted({dep for name in order for dep in FEATURES[name].inputs if dep not in order})
+    arrays = {col: np.asarray(columns[col]) for col in base}
+    n_rows = len(arrays[base[0]]) if base else 0
+    outputs = {name: np.empty(n_rows, dtype=FLOAT_DTYPE) for name in order}
+
+    block = min(BLOCK_ROWS, max(n_rows, 1))
+    buffers = {col: np.empty(block, dtype=FLOAT_DTYPE) for col in base if arrays[col].dtype != FLOAT_DTYPE}
+    tmp = np.empty(block, dtype=FLOAT_DTYPE)
+    for start in range(0, n_rows, block):
+        stop = min(start + block, n_rows)
+        m = stop - start
+        current = {}
+        for col in base:
+            if col in buffers:
+                # One cast per input block, shared by every feature that reads it
+                current[col] = buffers[col][:m]
+                np.copyto(current[col], arrays[col][start:stop], casting='same_kind')
+            else:
+                current[col] = arrays[col][start:stop]
+        for name in order:
+            f = FEATURES[name]
+            out = outputs[name][start:stop]
+            f.kernel(out, tmp[:m], *[current[dep] for dep in f.inputs])
+            current[name] = out
+    return outputs
+
+
+def add_features(df, names=ENGINEERED_COLS):
+    """Adds (or overwrites) features as float32 columns of df, in place. Returns df."""
+    for name, values in compute(df, names).items():
+        position = FEATURES[name].position
+        if name in df.columns:
+            df[name] = values
+        elif position is not None and position <= len(df.columns):
+            df.insert(position, name, values)
+        else:
+            df[name] = values
+    return df
+
+
+def add_engineered_features(df, interaction=True):
+    """Inserts Metabolic_Index (and Ox_Energy_Interaction) after the biomarkers, in place. Returns df."""
+    return add_features(df, ENGINEERED_COLS if interaction else ['Metabolic_Index'])
+
+
+# --- 4. STORED COHORTS ---
+def materialize(path, names=ENGINEERED_COLS, fmt=None, batch_size=DEFAULT_BATCH_ROWS, overwrite=False):
+    """Adds features to a stored cohort, computing only the missing columns.
+
+    Reads only their inputs and appends the new columns without rewriting
+    the existing ones. Returns the list of columns written.
+    """
+    stored = stored_columns(path, fmt)
+    todo = [name for name in resolve(names) if name not in stored or (overwrite and name in names)]
+    if not todo:
+        return []
+    inputs = sorted({dep for name in todo for dep in FEATURES[name].inputs if dep not in todo})
+    missing = [col for col in inputs if col not in stored]
+    if missing:
+        raise KeyError(f"'{path}' lacks the inputs {missing} needed for {todo}")
+
+    def new_columns():
+        for chunk in iter_cohort(path, columns=inputs, batch_size=batch_size, fmt=fmt):
+            values = compute(chunk, todo)
+            yield pd.DataFrame({name: values[name] for name in todo}, copy=False)
+
+    add_columns(path, new_columns(), fmt)
+    return todo
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit(f"Usage: python features.py <cohort.parquet|cohort_dir> [feature ...]\nRegistered: {list(FEATURES)}")
+    written = materialize(sys.argv[1], sys.argv[2:] or ENGINEERED_COLS)
+    print(f"✅ Added {written} to '{sys.argv[1]}'" if written else "Nothing to do: all features already stored")
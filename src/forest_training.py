@@ -0,0 +1,329 @@
+"""Local, multi-core training of the final random-forest classifier on binned features.
+
+The final classifier used to be trained only in the cloud ML service, on the
+28k-row ``gwi_bayesian_training_set.csv``. This module trains the same kind
+of model (bootstrapped Gini trees, sqrt(n_features) candidate features per
+split) locally on cohorts of tens of millions of rows:
+
+* every feature column is binned once into at most 256 quantile bins
+  (``uint8`` codes), so a node's split search is one ``bincount`` histogram
+  per feature instead of a sort,
+* trees are grown level by level: the histograms of every node in a level
+  come from one pass over the rows,
+* trees grow in parallel worker processes that attach to the binned matrix
+  in shared memory, one round of trees at a time; after each round the
+  ensemble's log-loss on a held-out split decides whether adding trees still
+  helps (early stopping), and the best prefix of trees is kept,
+* split thresholds are stored as feature values (the upper edge of the bin),
+  so ``inference_kernel.export_model`` writes a regular ``forest`` artifact
+  that scoring_server.py and ``load_predictor`` load unchanged.
+
+Usage:
+    python forest_training.py gwi_bayesian_training_set.csv classifier.npz --trees 100 --max-depth 12
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+
+import numpy as np
+
+from cohort_io import read_columns
+from cross_fit import _attach, _share
+from inference_kernel import export_model
+
+# --- 1. PARAMETERS ---
+FEATURE_COLS = ['NAD_NADH', 'PCr_ATP', 'GSH_GSSG', 'Metabolic_Index', 'Symptom_Prior_Probability']
+TARGET_COL = 'Haley_Syndrome'
+MAX_BINS = 256  # uint8 codes
+BIN_SAMPLE_ROWS = 1_000_000  # Rows used to place the quantile bin edges
+DEFAULT_TREES = 100  # Upper bound; early stopping may keep fewer
+DEFAULT_MAX_DEPTH = 12
+DEFAULT_MIN_SAMPLES_LEAF = 1
+DEFAULT_VALIDATION_FRACTION = 0.1
+DEFAULT_PATIENCE = 2  # Rounds without a log-loss improvement before stopping
+DEFAULT_TOL = 1e-4  # Relative log-loss improvement that counts
+RANDOM_SEED = 42
+
+
+# --- 2. BINNING ---
+def bin_edges(X, max_bins=MAX_BINS, sample_rows=BIN_SAMPLE_ROWS, seed=RANDOM_SEED):
+    """Upper bin edges per column: code b holds edges[b-1] < x <= edges[b] (at most max_bins - 1 edges)."""
+    rng = np.random.default_rng(seed)
+    sample = X if len(X) <= sample_rows else X[np.sort(rng.choice(len(X), sample_rows, replace=False))]
+    edges = []
+    for j in range(X.shape[1]):
+        column = np.asarray(sample[:, j], dtype=np.float32)
+        values = np.unique(column)
+        if len(values) <= max_bins:
+            cuts = values[:-1]
+        else:
+            # Quantiles of the rows themselves (not of the distinct values), so bins hold equal row
+            # counts; heavily repeated values collapse neighbouring cuts, hence the dedupe
+            cuts = np.unique(np.quantile(column, np.linspace(0, 1, max_bins + 1)[1:-1]).astype(np.float32))
+        edges.append(cuts.astype(np.float64))
+    return edges
+
+
+def bin_features(X, edges):
+    """uint8 bin codes of X. Features are compared as float32, like the inference kernel does."""
+    codes = np.empty(X.shape, dtype=np.uint8)
+    for j, cuts in enumerate(edges):
+        codes[:, j] = np.searchsorted(cuts, np.asarray(X[:, j], dtype=np.float32), side='left')
+    return codes
+
+
+# --- 3. TREE GROWTH ---
+def grow_tree(codes, y, n_bins, n_classes, max_depth=DEFAULT_MAX_DEPTH, min_samples_leaf=DEFAULT_MIN_SAMPLES_LEAF,
+              max_features=None, max_samples=None, seed=0):
+    """Grows one bootstrapped Gini tree level by level. Returns its node arrays (split bins, not thresholds)."""
+    rng = np.random.default_rng(seed)
+    n_rows, n_features = codes.shape
+    max_features = max_features or max(1, int(np.sqrt(n_features)))
+    min_samples_leaf = max(1, min_samples_leaf)
+    max_bins = max(n_bins)
+    sample = rng.integers(0, n_rows, size=max_samples or n_rows)
+    c = np.ascontiguousarray(codes[sample].T)  # (features, rows): each histogram reads one contiguous column
+    labels = y[sample].astype(np.int64)
+    node = np.zeros(len(sample), dtype=np.int64)  # Row -> node index within the current level
+
+    feature, split_bin, left, right, value = [-2], [0], [-1], [-1], [None]
+    level = [0]  # Global node ids of the current level
+    for depth in range(max_depth + 1):
+        n_level = len(level)
+        counts = np.bincount(node * n_classes + labels, minlength=n_level * n_classes).reshape(n_level, n_classes)
+        sizes = counts.sum(axis=1)
+        for i, gid in enumerate(level):
+            value[gid] = counts[i]
+        splittable = (sizes >= 2 * min_samples_leaf) & (counts.max(axis=1) < sizes)
+        if depth == max_depth or not splittable.any():
+            break
+
+        # Random candidate features per node, as in a random forest
+        candidates = np.argsort(rng.random((n_level, n_features)), axis=1)[:, :max_features]
+        is_candidate = np.zeros((n_level, n_features), dtype=bool)
+        np.put_along_axis(is_candidate, candidates, True, axis=1)
+        is_candidate &= splittable[:, None]
+        parent = (counts.astype(np.float64) ** 2).sum(axis=1) / np.maximum(sizes, 1)
+        best_gain = np.zeros(n_level)
+        best_feature = np.full(n_level, -1)
+        best_bin = np.zeros(n_level, dtype=np.int64)
+        base = node * (max_bins * n_classes) + labels  # Histogram slot of (node, bin 0, class)
+        for j in range(n_features):
+            hist = np.bincount(base + c[j].astype(np.int64) * n_classes, minlength=n_level * max_bins * n_classes)
+            # Score only the nodes that may split on this feature
+            nodes = np.flatnonzero(is_candidate[:, j])
+            if not len(nodes):
+                continue
+            hist = hist.reshape(n_level, max_bins, n_classes)[nodes, :n_bins[j] - 1]
+            left_counts = np.cumsum(hist, axis=1).astype(np.float64)
+            n_left = left_counts.sum(axis=2)
+            n_right = sizes[nodes, None] - n_left
+            with np.errstate(divide='ignore', invalid='ignore'):
+                score = ((left_counts ** 2).sum(axis=2) / n_left
+                         + ((counts[nodes, None, :] - left_counts) ** 2).sum(axis=2) / n_right)
+            score[(n_left < min_samples_leaf) | (n_right < min_samples_leaf)] = -np.inf
+            if score.shape[1] == 0:
+                continue
+            b = np.argmax(score, axis=1)
+            gain = score[np.arange(len(nodes)), b] - parent[nodes]
+            better = gain > best_gain[nodes] + 1e-9 * sizes[nodes]
+            nodes, gain, b = nodes[better], gain[better], b[better]
+            best_gain[nodes], best_feature[nodes], best_bin[nodes] = gain, j, b
+
+        split = best_feature >= 0
+        if not split.any():
+            break
+        child = np.full(n_level, -1, dtype=np.int64)
+        child[split] = 2 * np.arange(split.sum())
+        next_level = []
+        for i in np.flatnonzero(split):
+            gid = level[i]
+            feature[gid], split_bin[gid] = int(best_feature[i]), int(best_bin[i])
+            left[gid], right[gid] = len(feature), len(feature) + 1
+            for _ in range(2):
+                feature.append(-2), split_bin.append(0), left.append(-1), right.append(-1), value.append(None)
+            next_level += [left[gid], right[gid]]
+
+        # Rows of nodes that became leaves are done; the others move to a child
+        keep = split[node]
+        c, labels, node = c[:, keep], labels[keep], node[keep]
+        went_right = c[best_feature[node], np.arange(len(node))] > best_bin[node]
+        node = child[node] + went_right
+        level = next_level
+
+    # Nodes of the last level that received no rows (cannot happen with min_samples_leaf >= 1) keep zero counts
+    value = [v if v is not None else np.zeros(n_classes, dtype=np.int64) for v in value]
+    return {
+        'feature': np.asarray(feature, dtype=np.int64),
+        'bin': np.asarray(split_bin, dtype=np.int64),
+        'left': np.asarray(left, dtype=np.int64),
+        'right': np.asarray(right, dtype=np.int64),
+        'value': np.asarray(value, dtype=np.float64),
+    }
+
+
+def _tree_depth(tree):
+    depth = np.zeros(len(tree['left']), dtype=np.int64)
+    for i in range(len(depth)):  # Children always come after their parent
+        if tree['left'][i] >= 0:
+            depth[tree['left'][i]] = depth[tree['right'][i]] = depth[i] + 1
+    return int(depth.max())
+
+
+def predict_binned(tree, codes):
+    """Leaf class distributions (normalized) of a binned tree for binned rows."""
+    node = np.zeros(len(codes), dtype=np.int64)
+    rows = np.arange(len(codes))
+    while True:
+        inner = tree['left'][node] >= 0
+        if not inner.any():
+            break
+        r, n = rows[inner], node[inner]
+        went_right = codes[r, tree['feature'][n]] > tree['bin'][n]
+        node[inner] = np.where(went_right, tree['right'][n], tree['left'][n])
+    value = tree['value'][node]
+    return value / value.sum(axis=1, keepdims=True)
+
+
+def _grow_trees(specs, n_bins, n_classes, params, seeds):
+    """Process-pool entry point: grows trees on the shared binned matrix."""
+    blocks, (codes, y) = zip(*[_attach(spec) for spec in specs])
+    try:
+        return [grow_tree(codes, y, n_bins, n_classes, seed=seed, **params) for seed in seeds]
+    finally:
+        codes = y = None
+        for block in blocks:
+            block.close()
+
+
+# --- 4. ENSEMBLE ---
+class HistForest:
+    """Fitted forest exposing the sklearn attributes export_model reads (estimators_[i].tree_, classes_)."""
+
+    def __init__(self, trees, edges, classes, feature_names, history):
+        self.classes_ = np.asarray(classes)
+        self.feature_names_in_ = np.asarray(feature_names, dtype=object)
+        self.edges = edges
+        self.history = history  # [(n_trees, validation log-loss)] after every round
+        self.estimators_ = [SimpleNamespace(tree_=self._sklearn_tree(tree)) for tree in trees]
+
+    def _sklearn_tree(self, tree):
+        inner = tree['left'] >= 0
+        threshold = np.full(len(inner), -2.0)
+        threshold[inner] = [self.edges[f][b] for f, b in zip(tree['feature'][inner], tree['bin'][inner])]
+        return SimpleNamespace(
+            node_count=len(inner),
+            children_left=np.where(inner, tree['left'], -1),
+            children_right=np.where(inner, tree['right'], -1),
+            feature=np.where(inner, tree['feature'], -2),
+            threshold=threshold,
+            value=tree['value'][:, None, :],
+            max_depth=_tree_depth(tree),
+        )
+
+    def export(self, path):
+        """Writes the inference-kernel forest artifact."""
+        return export_model(self, path, feature_names=list(self.feature_names_in_))
+
+
+def _log_loss(prob_sum, n_trees, y):
+    p = prob_sum[np.arange(len(y)), y] / n_trees
+    return float(-np.mean(np.log(np.clip(p, 1e-15, None))))
+
+
+def train_forest(X, y, feature_names=FEATURE_COLS, n_trees=DEFAULT_TREES, max_depth=DEFAULT_MAX_DEPTH,
+                 min_samples_leaf=DEFAULT_MIN_SAMPLES_LEAF, max_features=None, max_samples=None,
+                 validation_fraction=DEFAULT_VALIDATION_FRACTION, patience=DEFAULT_PATIENCE, tol=DEFAULT_TOL,
+                 workers=None, seed=RANDOM_SEED, log=print):
+    """Trains the forest on (X, y). Returns a HistForest (see .history for the early-stopping curve).
+
+    Trees are grown in rounds of `workers` trees; with validation_fraction > 0
+    training stops once `patience` rounds in a row improved the held-out
+    log-loss by less than `tol` (relative), keeping the best prefix.
+    """
+    rng = np.random.default_rng(seed)
+    classes, y = np.unique(np.asarray(y), return_inverse=True)
+    y = y.astype(np.int8 if len(classes) < 128 else np.int64)
+    edges = bin_edges(X, seed=seed)
+    codes = bin_features(X, edges)
+    n_bins = [len(cuts) + 1 for cuts in edges]
+
+    is_val = rng.random(len(y)) < validation_fraction if validation_fraction else np.zeros(len(y), dtype=bool)
+    val_codes, val_y = codes[is_val], y[is_val].astype(np.int64)
+    train_codes, train_y = np.ascontiguousarray(codes[~is_val]), np.ascontiguousarray(y[~is_val])
+    del codes
+
+    params = {'max_depth': max_depth, 'min_samples_leaf': min_samples_leaf, 'max_features': max_features,
+              'max_samples': max_samples}
+    workers = max(1, min(workers or os.cpu_count() or 1, n_trees))
+    seeds = np.random.SeedSequence(seed).generate_state(n_trees).tolist()
+    shared = [_share(train_codes), _share(train_y)]
+    specs = [spec for _, spec, _ in shared]
+    del train_codes, train_y
+
+    trees, history = [], []
+    prob_sum = np.zeros((len(val_y), len(classes)))
+    best, stale = (np.inf, 0), 0
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        for start in range(0, n_trees, workers):
+            round_seeds = seeds[start:start + workers]
+            if pool is None:
+                grown = _grow_trees(specs, n_bins, len(classes), params, round_seeds)
+            else:
+                futures = [pool.submit(_grow_trees, specs, n_bins, len(classes), params, [s]) for s in round_seeds]
+                grown = [tree for future in futures for tree in future.result()]
+            trees += grown
+            if not len(val_y):
+                continue
+            for tree in grown:
+                prob_sum += predict_binned(tree, val_codes)
+            loss = _log_loss(prob_sum, len(trees), val_y)
+            history.append((len(trees), loss))
+            log(f"{len(trees):>5} trees  validation log-loss {loss:.5f}")
+            if loss < best[0] * (1 - tol):
+                best, stale = (loss, len(trees)), 0
+            else:
+                stale += 1
+                if stale >= patience:
+                    log(f"Early stopping: keeping the best {best[1]} trees")
+                    trees = trees[:best[1]]
+                    break
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        blocks = [block for block, _, _ in shared]
+        shared = None
+        for block in blocks:
+            block.close()
+            block.unlink()
+    return HistForest(trees, edges, classes, feature_names, history)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the final classifier locally and export it for scoring.")
+    parser.add_argument('input', help="Training set (csv, parquet or npy directory)")
+    parser.add_argument('output', help="Forest artifact to write (.npz)")
+    parser.add_argument('--trees', type=int, default=DEFAULT_TREES)
+    parser.add_argument('--max-depth', type=int, default=DEFAULT_MAX_DEPTH)
+    parser.add_argument('--min-samples-leaf', type=int, default=DEFAULT_MIN_SAMPLES_LEAF)
+    parser.add_argument('--max-samples', type=int, default=None, help="Bootstrap rows per tree (default: all)")
+    parser.add_argument('--validation-fraction', type=float, default=DEFAULT_VALIDATION_FRACTION)
+    parser.add_argument('--patience', type=int, default=DEFAULT_PATIENCE)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    columns = read_columns(args.input, FEATURE_COLS + [TARGET_COL])
+    X = np.column_stack([columns[col] for col in FEATURE_COLS])
+    print(f"Training on {len(X)} records from '{args.input}'...")
+    forest = train_forest(X, columns[TARGET_COL], n_trees=args.trees, max_depth=args.max_depth,
+                          min_samples_leaf=args.min_samples_leaf, max_samples=args.max_samples,
+                          validation_fraction=args.validation_fraction, patience=args.patience,
+                          workers=args.workers)
+    forest.export(args.output)
+    print(f"✅ Exported {len(forest.estimators_)} trees to '{args.output}'")
+
+
+if __name__ == "__main__":
+    main()
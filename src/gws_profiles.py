@@ -0,0 +1,311 @@
+"""Vectorized NAA/tCr + PCr-recovery cohort generator with hash-partitioned shards.
+
+Cell 3 of ``01_Feature_Extraction_Notebook.ipnyb`` built its cohort one
+patient at a time (``random.choice`` / ``random.uniform`` / ``round`` per
+field), drew IDs with ``random.randint`` (so two veterans could share one)
+and wrote a single CSV. This module keeps the same profiles:
+
+* Healthy:    NAA/tCr U(1.8, 2.5), PCr recovery U(15, 28) s
+* GWS Type 1: NAA/tCr U(1.0, 1.4), PCr recovery U(35, 60) s
+
+with equal odds, but:
+
+* draws whole chunks with NumPy, each chunk from its own ``SeedSequence``
+  stream (as in cohort.py), so the output does not depend on the number
+  of worker processes,
+* numbers patients with a counter (``VET_00000001``, ...), so IDs never
+  collide; ``start_id`` continues the numbering of an earlier batch,
+* writes ``n_shards`` files (``part-00000.parquet`` ...) partitioned by a
+  hash of the PatientID, plus a ``_manifest.json`` written last. Spark
+  reads the directory as one table (it skips ``_`` files); a local process
+  pool takes one shard per worker (``map_shards``).
+
+The partition hash is 64-bit FNV-1a over the UTF-8 bytes of the PatientID,
+so any reader can locate a patient's shard (``shard_of``). The output
+directory is a local path or a mounted Data Lake container.
+
+Usage:
+    python gws_profiles.py 1000000 gws_cohort --shards 16 --workers 4
+    python gws_profiles.py 100 /synfs/<job_id>/synapse/training_data --index-patient <PatientID>
+"""
+import argparse
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from cohort import DEFAULT_CHUNK_SIZE, RANDOM_SEED, chunk_bounds, chunk_rng, resolve_entropy
+from cohort_io import open_writer, read_cohort
+
+# --- 1. PARAMETERS ---
+# One entry per diagnosis: (label, NAA/tCr range, PCr recovery range in seconds)
+GWS_PROFILES = [
+    ('Healthy', (1.8, 2.5), (15.0, 28.0)),  # High energy, fast recovery
+    ('GWS_Type_1', (1.0, 1.4), (35.0, 60.0)),  # Low energy, slow recovery
+]
+MODALITY = 'MRS_Simulated'
+NAA_DECIMALS = 2
+PCR_DECIMALS = 1
+COLUMNS = ['PatientID', 'Modality', 'NAA_tCr_Ratio', 'PCr_Recovery_Sec', 'Diagnosis_Label']
+ID_PREFIX = 'VET_'
+ID_WIDTH = 8  # Digits after the prefix: 100M patients per prefix
+ID_START = 1
+DEFAULT_SHARDS = 8
+EXTENSIONS = {'parquet': '.parquet', 'csv': '.csv'}  # npy cannot hold the string columns
+# Parquet keeps float64: float32 would turn the 2-decimal NAA/tCr 50.9 into 50.900002
+WRITER_OPTIONS = {'parquet': {'float_dtype': np.float64}, 'csv': {}}
+SHARD_PREFIX = 'part-'
+MANIFEST_FILE = '_manifest.json'  # Leading underscore: Spark and Hive ignore it
+FNV_OFFSET = np.uint64(0xcbf29ce484222325)
+FNV_PRIME = np.uint64(0x100000001b3)
+
+
+# --- 2. PATIENT IDS & PARTITIONING ---
+def format_ids(start, n, prefix=ID_PREFIX, width=ID_WIDTH):
+    """IDs prefix + zero-padded counter for start .. start + n - 1, as a fixed-width bytes array."""
+    if start < 0 or start + n > 10 ** width:
+        raise ValueError(f"Patient numbers {start}..{start + n - 1} do not fit in {width} digits")
+    head = np.frombuffer(prefix.encode('ascii'), dtype=np.uint8)
+    chars = np.empty((n, len(head) + width), dtype=np.uint8)
+    chars[:, :len(head)] = head
+    counter = np.arange(start, start + n, dtype=np.int64)
+    for k in range(len(head) + width - 1, len(head) - 1, -1):
+        chars[:, k] = counter % 10 + ord('0')
+        counter //= 10
+    return chars.view(f'S{chars.shape[1]}').ravel()
+
+
+def id_hash(ids):
+    """64-bit FNV-1a of each ID's UTF-8 bytes (vectorized over a bytes or str array)."""
+    ids = np.asarray(ids)
+    if ids.dtype.kind != 'S':
+        ids = np.char.encode(ids.astype(str), 'utf-8')
+    chars = ids.view(np.uint8).reshape(len(ids), -1) if len(ids) else np.zeros((0, 1), dtype=np.uint8)
+    h = np.full(len(ids), FNV_OFFSET, dtype=np.uint64)
+    ragged = ids.dtype.itemsize > 0 and not chars[:, -1].all()  # Shorter IDs are NUL-padded
+    for j in range(chars.shape[1]):
+        column = chars[:, j]
+        mixed = (h ^ column) * FNV_PRIME
+        h = np.where(column != 0, mixed, h) if ragged else mixed
+    return h
+
+
+def shard_of(ids, n_shards):
+    """Shard number of each PatientID."""
+    return (id_hash(ids) % np.uint64(n_shards)).astype(np.uint16 if n_shards <= 1 << 16 else np.int64)
+
+
+# --- 3. GENERATION ---
+def generate_profiles(n_rows, rng, first_id=ID_START, prefix=ID_PREFIX, width=ID_WIDTH, index_patient=None):
+    """One chunk of patients as a DataFrame (fully vectorized).
+
+    With `index_patient` (e.g. the PatientID of a real scan) the first row
+    gets that ID and the counter IDs fill the remaining rows.
+    """
+    labels = rng.integers(0, len(GWS_PROFILES), size=n_rows)
+    naa_low, naa_high = np.array([p[1] for p in GWS_PROFILES]).T
+    pcr_low, pcr_high = np.array([p[2] for p in GWS_PROFILES]).T
+    naa = rng.uniform(naa_low[labels], naa_high[labels])
+    pcr = rng.uniform(pcr_low[labels], pcr_high[labels])
+
+    ids = format_ids(first_id, n_rows - (index_patient is not None), prefix, width)
+    if index_patient is not None:
+        ids = np.concatenate([np.array([index_patient.encode('utf-8')]), ids])
+    return pd.DataFrame({
+        'PatientID': ids.astype(str),
+        'Modality': pd.Categorical.from_codes(np.zeros(n_rows, dtype=np.int8), [MODALITY]),
+        'NAA_tCr_Ratio': np.round(naa, NAA_DECIMALS, out=naa),
+        'PCr_Recovery_Sec': np.round(pcr, PCR_DECIMALS, out=pcr),
+        'Diagnosis_Label': pd.Categorical.from_codes(labels.astype(np.int8), [p[0] for p in GWS_PROFILES]),
+    }, copy=False)
+
+
+def _generate_indexed_chunk(n_rows, entropy, index, first_id, prefix, width, index_patient):
+    """Process-pool entry point: rebuilds the chunk's RNG from its index."""
+    return generate_profiles(n_rows, chunk_rng(entropy, index), first_id, prefix, width, index_patient)
+
+
+def profile_chunks(n, chunk_size=DEFAULT_CHUNK_SIZE, seed=RANDOM_SEED, workers=1, start_id=ID_START,
+                   prefix=ID_PREFIX, width=ID_WIDTH, index_patient=None):
+    """Yields the cohort in order as DataFrame chunks; IDs run from start_id (after the index patient)."""
+    if index_patient is not None and index_patient.startswith(prefix) and len(index_patient) == len(prefix) + width:
+        raise ValueError(f"Index patient '{index_patient}' looks like a generated ID; use another prefix")
+    entropy = resolve_entropy(seed)
+    jobs = []
+    first_id = start_id
+    for index, n_rows in enumerate(chunk_bounds(n, chunk_size)):
+        patient = index_patient if index == 0 else None
+        jobs.append((n_rows, entropy, index, first_id, prefix, width, patient))
+        first_id += n_rows - (patient is not None)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            yield _generate_indexed_chunk(*job)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for job in jobs:
+            pending.append(pool.submit(_generate_indexed_chunk, *job))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+# --- 4. SHARDED STORAGE ---
+def shard_name(shard, fmt='parquet'):
+    return f'{SHARD_PREFIX}{shard:05d}{EXTENSIONS[fmt]}'
+
+
+def write_shards(chunks, output_dir, n_shards=DEFAULT_SHARDS, fmt='parquet', key='PatientID', meta=None,
+                 schema=None):
+    """Splits chunks by hash of `key` into n_shards files plus a manifest. Returns the manifest.
+
+    Every shard file is created (possibly empty, with the columns of the
+    first chunk or of the empty `schema` frame) so readers can rely on the
+    layout. With no chunk and no schema there is nothing to write: the
+    manifest then lists no shards. Shard files of an earlier cohort in the
+    directory are removed first, so a directory reader sees only this one.
+    The manifest is written last and atomically, so its presence marks a
+    complete cohort.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    stale = os.path.join(output_dir, MANIFEST_FILE)
+    if os.path.exists(stale):
+        os.remove(stale)
+    names = [shard_name(shard, fmt) for shard in range(n_shards)]
+    for name in os.listdir(output_dir):
+        if name.startswith(SHARD_PREFIX) and name not in names:
+            os.remove(os.path.join(output_dir, name))
+    writers = [open_writer(os.path.join(output_dir, name), fmt, **WRITER_OPTIONS[fmt]).writer for name in names]
+    rows = np.zeros(n_shards, dtype=np.int64)
+    empty = None if schema is None else schema.iloc[:0]
+    try:
+        for chunk in chunks:
+            if empty is None:
+                empty = chunk.iloc[:0]
+            shard = shard_of(chunk[key].to_numpy(), n_shards)
+            order = np.argsort(shard, kind='stable')  # Radix sort for small integer shard numbers
+            counts = np.bincount(shard, minlength=n_shards)
+            grouped = chunk.take(order)
+            start = 0
+            for s in np.flatnonzero(counts):
+                writers[s].write(grouped.iloc[start:start + counts[s]])
+                start += counts[s]
+            rows += counts
+        if empty is not None:
+            for s in np.flatnonzero(rows == 0):
+                writers[s].write(empty)  # Empty but readable, with the same schema
+    except BaseException:
+        for writer in writers:
+            writer.abort()  # No partial shards next to a missing manifest
+        raise
+    for writer in writers:
+        writer.close()
+    if empty is None:
+        for name in names:
+            path = os.path.join(output_dir, name)
+            if os.path.exists(path):
+                os.remove(path)
+        names = []
+
+    manifest = {
+        'format': fmt,
+        'n_rows': int(rows.sum()),
+        'n_shards': n_shards,
+        'columns': None if empty is None else list(empty.columns),
+        'partitioning': {'key': key, 'hash': 'fnv1a_64(utf-8 bytes) % n_shards'},
+        'shards': [{'shard': s, 'file': name, 'rows': int(rows[s])} for s, name in enumerate(names)],
+        'created': time.time(),
+        **(meta or {}),
+    }
+    tmp = os.path.join(output_dir, f'{MANIFEST_FILE}.{os.getpid()}.tmp')
+    with open(tmp, 'w') as fh:
+        json.dump(manifest, fh, indent=2)
+    os.replace(tmp, os.path.join(output_dir, MANIFEST_FILE))
+    return manifest
+
+
+def generate_cohort(n, output_dir, n_shards=DEFAULT_SHARDS, fmt='parquet', chunk_size=DEFAULT_CHUNK_SIZE,
+                    seed=RANDOM_SEED, workers=1, start_id=ID_START, prefix=ID_PREFIX, width=ID_WIDTH,
+                    index_patient=None):
+    """Generates n patients into a sharded directory. Returns the manifest."""
+    entropy = resolve_entropy(seed)
+    chunks = profile_chunks(n, chunk_size, entropy, workers, start_id, prefix, width, index_patient)
+    n_counter = n - (index_patient is not None and n > 0)
+    meta = {
+        'generator': {'seed_entropy': entropy, 'chunk_size': chunk_size, 'profiles': GWS_PROFILES},
+        'ids': {'prefix': prefix, 'width': width, 'first': start_id, 'next': start_id + n_counter,
+                'index_patient': index_patient},
+    }
+    schema = generate_profiles(0, np.random.default_rng(), prefix=prefix, width=width)
+    return write_shards(chunks, output_dir, n_shards, fmt, meta=meta, schema=schema)
+
+
+def read_manifest(output_dir):
+    with open(os.path.join(output_dir, MANIFEST_FILE)) as fh:
+        return json.load(fh)
+
+
+def shard_paths(output_dir, shards=None):
+    """Paths of the shard files (all, or the given shard numbers)."""
+    manifest = read_manifest(output_dir)
+    entries = manifest['shards'] if shards is None else [manifest['shards'][s] for s in shards]
+    return [os.path.join(output_dir, entry['file']) for entry in entries]
+
+
+def read_shards(output_dir, shards=None, columns=None):
+    """Loads shards (default: all) into one DataFrame."""
+    manifest = read_manifest(output_dir)
+    frames = [read_cohort(path, columns=columns, fmt=manifest['format']) for path in shard_paths(output_dir, shards)]
+    if not frames:  # A cohort written without any chunk or schema
+        return pd.DataFrame(columns=columns or manifest['columns'])
+    return pd.concat(frames, ignore_index=True)
+
+
+def find_patient(output_dir, patient_id):
+    """Looks a patient up by reading only the shard that holds it."""
+    manifest = read_manifest(output_dir)
+    shard = int(shard_of(np.array([patient_id]), manifest['n_shards'])[0])
+    df = read_shards(output_dir, [shard])
+    return df[df['PatientID'] == patient_id]
+
+
+def map_shards(func, output_dir, workers=None):
+    """Runs func(shard_path) on every shard across a process pool. Returns the results in shard order."""
+    paths = shard_paths(output_dir)
+    if workers == 1:
+        return [func(path) for path in paths]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(func, paths))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the NAA/tCr + PCr-recovery cohort as hash-partitioned shards.")
+    parser.add_argument('n', type=int, help="Patients to generate")
+    parser.add_argument('output_dir', help="Local directory or mounted Data Lake path")
+    parser.add_argument('--shards', type=int, default=DEFAULT_SHARDS)
+    parser.add_argument('--fmt', default='parquet', choices=sorted(EXTENSIONS))
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--seed', type=int, default=RANDOM_SEED)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--start-id', type=int, default=ID_START, help="First patient number (continue a batch)")
+    parser.add_argument('--prefix', default=ID_PREFIX)
+    parser.add_argument('--index-patient', default=None, help="Real PatientID to put first")
+    args = parser.parse_args(argv)
+
+    print(f"Generating {args.n} synthetic veterans into {args.shards} shards...")
+    manifest = generate_cohort(args.n, args.output_dir, args.shards, args.fmt, args.chunk_size, args.seed,
+                               args.workers, args.start_id, args.prefix, index_patient=args.index_patient)
+    print(f"✅ Wrote {manifest['n_rows']} records to '{args.output_dir}' "
+          f"(IDs {args.prefix}{args.start_id:0{ID_WIDTH}d}.., next start-id {manifest['ids']['next']})")
+
+
+if __name__ == "__main__":
+    main()
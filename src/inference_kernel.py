@@ -0,0 +1,430 @@
+"""sklearn-free inference kernel for the symptom prior and the final classifier.
+
+Fitted models are exported to compact, versioned ``.npz`` artifacts:
+
+* ``logreg`` - the multinomial LogisticRegression prior, all classes
+  (``coef`` is K x d, ``intercept`` is K),
+* ``forest`` - a tree ensemble (RandomForest / ExtraTrees) flattened into
+  one set of node arrays shared by every tree,
+* ``prior_table`` - a fitted prior compiled into a quantized lookup table over
+  the 0-10 survey grid (``compile_prior_table``).
+
+The predictors only import NumPy, so serverless workers start fast and stay
+small; sklearn is needed to unpickle a model for export, not to score.
+Forests are evaluated tree by tree over blocks of rows, with the top
+``COMPLETE_DEPTH`` levels of every tree laid out as a complete binary tree
+in heap order, so each level is two gathers and a compare for every row.
+Every row still visits trees x depth nodes.
+
+A prior table stores P(class k | symptoms) at every grid point and looks
+Symptom_Prior_Probability up at the nearest point or by multilinear
+interpolation. It is saved with a guaranteed error bound for softmax priors
+(``softmax_table_bounds``) and the maximum error sampled over random points.
+Tables pay off only for priors that are expensive to evaluate. Inputs
+outside the grid are clamped to its edge, which is exact for the clipped
+survey scores.
+"""
+import sys
+
+import numpy as np
+
+# --- 1. PARAMETERS ---
+FORMAT_VERSION = 1
+PREDICT_CHUNK_ROWS = 16384  # Rows per traversal block (keeps the per-level buffers in cache)
+COMPLETE_DEPTH = 12  # Tree levels laid out as a complete binary tree (2^12 slots per tree)
+STEPS_PER_COMPACTION = 4  # Below it, leaves loop onto themselves, so finished rows can ride along a few steps
+FOREST_TYPES = ('RandomForestClassifier', 'ExtraTreesClassifier', 'HistForest')  # Averaged probability trees
+DEFAULT_ATOL = 1e-6
+SURVEY_RANGE = (0.0, 10.0)  # Symptom scores are clipped to this range by the generators
+DEFAULT_TABLE_STEP = 0.25  # Grid spacing of compiled prior tables
+DEFAULT_TABLE_CHECK_ROWS = 500_000  # Random points used to measure a table's maximum error
+UINT16_SCALE = 1.0 / 65535
+
+
+# --- 2. EXPORT ---
+def _logreg_arrays(model):
+    coef = np.asarray(model.coef_, dtype=np.float64)
+    intercept = np.asarray(model.intercept_, dtype=np.float64)
+    if coef.shape[0] == 1:
+        # Binary model: sigmoid(z) == softmax([0, z])
+        coef = np.vstack([np.zeros_like(coef), coef])
+        intercept = np.concatenate([[0.0], intercept])
+    return {'kind': 'logreg', 'coef': coef, 'intercept': intercept}
+
+
+def _forest_arrays(model):
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for est in model.estimators_:
+        tree = est.tree_
+        n = tree.node_count
+        is_leaf = tree.children_left == -1
+        node_ids = np.arange(offset, offset + n, dtype=np.int32)
+        # Leaves point to themselves and always take the left branch
+        features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+        thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+        lefts.append(np.where(is_leaf, node_ids, tree.children_left + offset).astype(np.int32))
+        rights.append(np.where(is_leaf, node_ids, tree.children_right + offset).astype(np.int32))
+        value = tree.value[:, 0, :].astype(np.float64)
+        values.append(value / value.sum(axis=1, keepdims=True))
+        roots.append(offset)
+        max_depth = max(max_depth, tree.max_depth)
+        offset += n
+    return {
+        'kind': 'forest',
+        'feature': np.concatenate(features),
+        'threshold': np.concatenate(thresholds),
+        'left': np.concatenate(lefts),
+        'right': np.concatenate(rights),
+        'value': np.concatenate(values).astype(np.float32),
+        'roots': np.asarray(roots, dtype=np.int32),
+        'max_depth': max_depth,
+    }
+
+
+def export_model(model, path, feature_names=None, X_check=None, atol=DEFAULT_ATOL):
+    """Serializes a fitted LogisticRegression or tree ensemble to a versioned .npz artifact.
+
+    If X_check is given, the artifact is reloaded and its probabilities are
+    compared with model.predict_proba(X_check); a ValueError is raised when
+    they differ by more than atol.
+    """
+    if hasattr(model, 'coef_'):
+        arrays = _logreg_arrays(model)
+    elif any(cls.__name__ in FOREST_TYPES for cls in type(model).__mro__):
+        arrays = _forest_arrays(model)
+    else:
+        # Boosted ensembles also have estimators_, but their trees are summed, not averaged
+        raise TypeError(f"Cannot export {type(model).__name__}: expected LogisticRegression, "
+                        f"RandomForest, ExtraTrees or HistForest")
+
+    if feature_names is None:
+        feature_names = getattr(model, 'feature_names_in_', [])
+    arrays.update(
+        format_version=FORMAT_VERSION,
+        classes=np.asarray(model.classes_),
+        feature_names=np.asarray(list(feature_names), dtype=str),
+    )
+    with open(path, 'wb') as fh:
+        np.savez(fh, **arrays)
+
+    if X_check is not None:
+        expected = model.predict_proba(X_check)
+        got = load_predictor(path).predict_proba(np.asarray(X_check))
+        err = float(np.max(np.abs(expected - got))) if len(expected) else 0.0
+        if err > atol:
+            raise ValueError(f"Exported {arrays['kind']} differs from the fitted model by {err:.3g} (> {atol})")
+    return path
+
+
+def compile_prior_table(model, path, step=DEFAULT_TABLE_STEP, value_range=SURVEY_RANGE, dtype='uint16',
+                        interpolate=True, n_check=DEFAULT_TABLE_CHECK_ROWS, seed=0):
+    """Tabulates a fitted prior's syndrome-class probabilities on a regular grid; saves a 'prior_table' artifact.
+
+    `model` is anything with predict_proba, classes_ and softmax coefficients
+    whose inputs are the survey scores (sklearn, PriorState or a
+    LogRegPredictor). For both lookup modes the artifact records the error
+    bound of Symptom_Prior_Probability (see softmax_table_bounds) and the
+    sampled maximum error against the model on `n_check` random points and
+    as many grid-cell centres. Returns the path.
+    """
+    coef = getattr(model, 'coef_', getattr(model, 'coef', None))
+    n_features = np.shape(coef)[1]
+    low, high = value_range
+    axis = np.arange(low, high + step / 2, step)
+    if not np.isclose(axis[-1], high):
+        raise ValueError(f"step {step} does not divide the range {value_range}")
+    n_points = len(axis)
+    n_classes = len(model.classes_)
+    table = np.empty((n_points,) * n_features + (n_classes - 1,), dtype=dtype)
+    # One slice of the first axis at a time bounds the probability matrix to n_points^(d-1) rows
+    rest = np.stack(np.meshgrid(*[axis] * (n_features - 1), indexing='ij'), axis=-1).reshape(-1, n_features - 1)
+    for i, x0 in enumerate(axis):
+        probs = model.predict_proba(np.column_stack([np.full(len(rest), x0), rest]))[:, 1:]
+        table[i] = _quantize(probs, dtype).reshape(table.shape[1:])
+
+    arrays = {
+        'kind': 'prior_table',
+        'format_version': FORMAT_VERSION,
+        'classes': np.asarray(model.classes_),
+        'feature_names': np.asarray([], dtype=str),
+        'table': table,
+        'low': low,
+        'step': step,
+        'scale': UINT16_SCALE if np.dtype(dtype) == np.uint16 else 1.0,
+        'interpolate': interpolate,
+    }
+    rng = np.random.default_rng(seed)
+    X = rng.uniform(low, high, size=(n_check, n_features))
+    centres = low + (rng.integers(0, n_points - 1, size=(n_check, n_features)) + 0.5) * step
+    X = np.vstack([X, centres])
+    exact = symptom_prior_probability(model.predict_proba(X))
+    lookup = PriorTablePredictor(arrays)
+    arrays['sampled_max_error_nearest'] = float(np.max(np.abs(lookup.symptom_prior(X, interpolate=False) - exact)))
+    arrays['sampled_max_error_linear'] = float(np.max(np.abs(lookup.symptom_prior(X, interpolate=True) - exact)))
+    arrays['error_bound_nearest'], arrays['error_bound_linear'] = softmax_table_bounds(coef, step, dtype)
+    with open(path, 'wb') as fh:
+        np.savez(fh, **arrays)
+    return path
+
+
+def softmax_table_bounds(coef, step, dtype='uint16'):
+    """Guaranteed (nearest, linear) error bounds of a prior table's class probabilities on the grid.
+
+    For p = softmax(X @ coef.T + b), with R_i the spread of column i of
+    coef, |dp_k/dx_i| <= p_k (1 - p_k) R_i <= R_i / 4 and
+    |d2p_k/dx_i2| = p_k |(a_k - mean)^2 - var| <= R_i^2 / 4. The nearest
+    point is within step / 2 on every axis; multilinear interpolation is
+    off by at most sum_i step^2 / 8 * max|d2p/dx_i2|. Taking the max over
+    classes adds no error, and quantization adds half a step.
+    """
+    coef = np.atleast_2d(np.asarray(coef, dtype=np.float64))
+    if coef.shape[0] == 1:
+        coef = np.vstack([np.zeros_like(coef), coef])  # Binary model: softmax([0, z])
+    spread = np.ptp(coef, axis=0)
+    quantization = UINT16_SCALE / 2 if np.dtype(dtype) == np.uint16 else 2.0 ** -12  # float16 near 1
+    return (float(step * spread.sum() / 8 + quantization),
+            float(step ** 2 * (spread ** 2).sum() / 32 + quantization))
+
+
+def _quantize(probs, dtype):
+    if np.dtype(dtype) == np.uint16:
+        return np.rint(probs / UINT16_SCALE).astype(np.uint16)
+    if np.dtype(dtype) == np.float16:
+        return probs.astype(np.float16)
+    raise ValueError(f"Unsupported table dtype {dtype} (use 'uint16' or 'float16')")
+
+
+# --- 3. PREDICTORS ---
+class LogRegPredictor:
+    """Multinomial logistic regression: softmax(X @ coef.T + intercept)."""
+
+    def __init__(self, arrays):
+        self.coef = arrays['coef']
+        self.intercept = arrays['intercept']
+        self.classes_ = arrays['classes']
+        self.feature_names_in_ = None
+
+    def decision_function(self, X):
+        return np.asarray(X, dtype=np.float64) @ self.coef.T + self.intercept
+
+    def predict_proba(self, X):
+        z = self.decision_function(X)
+        z -= z.max(axis=1, keepdims=True)
+        np.exp(z, out=z)
+        z /= z.sum(axis=1, keepdims=True)
+        return z
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.decision_function(X), axis=1)]
+
+
+class ForestPredictor:
+    """Averaged leaf probabilities of a flattened tree ensemble."""
+
+    def __init__(self, arrays):
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.left = arrays['left']
+        self.right = arrays['right']
+        self.value = arrays['value']
+        self.roots = arrays['roots']
+        self.max_depth = int(arrays['max_depth'])
+        self.classes_ = arrays['classes']
+        self.feature_names_in_ = None
+        self.is_leaf = self.left == np.arange(len(self.left))
+        # children[2 * node + went_right]: one gather per step instead of a where() over two
+        self.children = np.stack([self.left, self.right], axis=1).ravel()
+        self.threshold32 = _float32_thresholds(self.threshold)
+        self.trees = [self._complete_top(root) for root in self.roots]
+
+    def _complete_top(self, root):
+        """Top levels of one tree in heap order: slot i has children 2i and 2i + 1 (slot 0 unused).
+
+        Returns (feature, threshold, exits, depth, deep): after `depth` steps
+        a row sits in slot 2^depth + j, and exits[j] is the original node it
+        reached. `deep` is set when some exits are inner nodes.
+        """
+        features, thresholds = [np.zeros(1, dtype=np.intp)], [np.zeros(1, dtype=np.float32)]
+        nodes = np.array([root])
+        depth = 0
+        while depth < COMPLETE_DEPTH and not self.is_leaf[nodes].all():
+            # Leaves have threshold +inf and point to themselves, so they pad the level below
+            features.append(self.feature[nodes].astype(np.intp))
+            thresholds.append(self.threshold32[nodes])
+            nodes = self.children[2 * nodes[:, None] + np.array([0, 1])].ravel()
+            depth += 1
+        return np.concatenate(features), np.concatenate(thresholds), nodes, depth, not self.is_leaf[nodes].all()
+
+    def _tree_leaves(self, tree, Xf, rowbase, buf):
+        """Leaf of one tree for every row of a block."""
+        feature, threshold, exits, depth, deep = tree
+        slot, index, x, t, went_right = buf
+        slot.fill(1)
+        for _ in range(depth):
+            np.take(feature, slot, out=index)
+            index += rowbase
+            np.take(Xf, index, out=x)
+            np.take(threshold, slot, out=t)
+            np.greater(x, t, out=went_right)
+            slot <<= 1
+            slot += went_right
+        leaves = exits[slot - (1 << depth)]
+        if deep:
+            active = np.flatnonzero(~self.is_leaf[leaves])
+            nodes = leaves[active]
+            while active.size:
+                for _ in range(STEPS_PER_COMPACTION):
+                    went = Xf[self.feature[nodes] + rowbase[active]] > self.threshold32[nodes]
+                    nodes = self.children[2 * nodes + went]
+                done = self.is_leaf[nodes]
+                if done.any():
+                    leaves[active[done]] = nodes[done]
+                    keep = ~done
+                    active, nodes = active[keep], nodes[keep]
+        return leaves
+
+    def predict_proba(self, X):
+        # sklearn compares float32 features against the thresholds
+        X = np.asarray(X, dtype=np.float32)
+        out = np.empty((len(X), self.value.shape[1]), dtype=np.float64)
+        for start in range(0, len(X), PREDICT_CHUNK_ROWS):
+            block = np.ascontiguousarray(X[start:start + PREDICT_CHUNK_ROWS])
+            n_rows = len(block)
+            Xf = block.ravel()  # Feature f of row r sits at r * n_features + f
+            rowbase = np.arange(n_rows, dtype=np.intp) * X.shape[1]
+            buf = (np.empty(n_rows, dtype=np.intp), np.empty(n_rows, dtype=np.intp), np.empty(n_rows, dtype=np.float32),
+                   np.empty(n_rows, dtype=np.float32), np.empty(n_rows, dtype=bool))
+            acc = out[start:start + n_rows]
+            acc[:] = 0.0
+            for tree in self.trees:
+                acc += self.value[self._tree_leaves(tree, Xf, rowbase, buf)]
+            acc /= len(self.trees)
+        return out
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+def _float32_thresholds(threshold):
+    """Largest float32 <= each threshold, so x32 > t32 exactly when x32 > t (no float32 lies in between)."""
+    t32 = threshold.astype(np.float32)
+    above = t32 > threshold
+    t32[above] = np.nextafter(t32[above], np.float32(-np.inf))
+    return t32
+
+
+class PriorTablePredictor:
+    """Symptom prior looked up in a compiled grid table (nearest point or multilinear interpolation)."""
+
+    def __init__(self, arrays):
+        self.table = arrays['table']
+        self.low = float(arrays['low'])
+        self.step = float(arrays['step'])
+        self.scale = np.float32(arrays['scale'])
+        self.interpolate = bool(arrays['interpolate'])
+        self.error_bound = {mode: float(arrays.get(f'error_bound_{mode}', np.nan)) for mode in ('nearest', 'linear')}
+        self.sampled_max_error = {mode: float(arrays.get(f'sampled_max_error_{mode}', np.nan))
+                                  for mode in ('nearest', 'linear')}
+        self.classes_ = arrays['classes']
+        self.feature_names_in_ = None
+        self.n_points = self.table.shape[0]
+        self.n_features = self.table.ndim - 1
+        self.n_channels = self.table.shape[-1]
+        self.flat_max = self.table.max(axis=-1).reshape(-1)  # Nearest lookups need only the max channel
+        self.strides = self.n_points ** np.arange(self.n_features - 1, -1, -1)
+        self.rows = self.table.reshape(-1, self.n_channels)
+        # Flat offsets of the 2^d cell corners; corner c steps along axis j when bit j of c is set,
+        # matching the order of the weights built in _class_probs
+        bits = (np.arange(2 ** self.n_features)[:, None] >> np.arange(self.n_features)) & 1
+        self.corner_offsets = bits @ self.strides
+
+    def _grid_coords(self, X):
+        t = (np.asarray(X, dtype=np.float32) - np.float32(self.low)) / np.float32(self.step)
+        return np.clip(t, 0, self.n_points - 1, out=t)
+
+    def _class_probs(self, X):
+        """Interpolated probabilities of the classes after the first, shape (rows, K - 1)."""
+        t = self._grid_coords(X)
+        cell = np.minimum(t.astype(np.intp), self.n_points - 2)
+        frac = t - cell
+        # Corner weights as an outer product over the axes: (rows, 2^d)
+        weights = np.ones((len(t), 1), dtype=np.float32)
+        for j in range(self.n_features):
+            weights = np.concatenate([weights * (1 - frac[:, j:j + 1]), weights * frac[:, j:j + 1]], axis=1)
+        index = (cell @ self.strides)[:, None] + self.corner_offsets
+        corners = np.take(self.rows, index, axis=0).astype(np.float32)  # (rows, 2^d, K - 1)
+        out = (weights[:, None, :] @ corners)[:, 0, :]
+        out *= self.scale
+        return out
+
+    def symptom_prior(self, X, interpolate=None):
+        """Symptom_Prior_Probability for each row (float32)."""
+        interpolate = self.interpolate if interpolate is None else interpolate
+        X = np.asarray(X)
+        out = np.empty(len(X), dtype=np.float32)
+        for start in range(0, len(X), PREDICT_CHUNK_ROWS):
+            block = X[start:start + PREDICT_CHUNK_ROWS]
+            if interpolate:
+                out[start:start + len(block)] = self._class_probs(block).max(axis=1)
+            else:
+                nearest = np.rint(self._grid_coords(block)).astype(np.intp)
+                out[start:start + len(block)] = self.flat_max[nearest @ self.strides] * self.scale
+        return out
+
+    def predict_proba(self, X):
+        """Interpolated class probabilities (the first class is one minus the rest)."""
+        probs = np.concatenate([self._class_probs(X[a:a + PREDICT_CHUNK_ROWS])
+                                for a in range(0, max(len(X), 1), PREDICT_CHUNK_ROWS)])
+        return np.column_stack([1.0 - probs.sum(axis=1), probs]).astype(np.float64)
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+PREDICTORS = {'logreg': LogRegPredictor, 'forest': ForestPredictor, 'prior_table': PriorTablePredictor}
+
+
+def load_artifact(path):
+    """Loads the raw arrays of an exported artifact and checks its format version."""
+    with np.load(path, allow_pickle=False) as npz:
+        arrays = {key: npz[key] for key in npz.files}
+    version = int(arrays['format_version'])
+    if version != FORMAT_VERSION:
+        raise ValueError(f"{path}: artifact format v{version}, this kernel reads v{FORMAT_VERSION}")
+    arrays['kind'] = str(arrays['kind'])
+    return arrays
+
+
+def load_predictor(path):
+    """Returns the NumPy predictor for an exported .npz artifact."""
+    arrays = load_artifact(path)
+    return PREDICTORS[arrays['kind']](arrays)
+
+
+def symptom_prior_probability(all_probs):
+    """Stage-1 feature: max probability of any syndrome (classes 1, 2 or 3)."""
+    return np.max(all_probs[:, 1:], axis=1)
+
+
+if __name__ == "__main__":
+    # python inference_kernel.py model.pkl model.npz                -> export a pickled sklearn model
+    # python inference_kernel.py table prior.npz table.npz [step]  -> compile an exported prior into a lookup table
+    import pickle
+
+    if len(sys.argv) in (4, 5) and sys.argv[1] == 'table':
+        step = float(sys.argv[4]) if len(sys.argv) == 5 else DEFAULT_TABLE_STEP
+        table = load_predictor(compile_prior_table(load_predictor(sys.argv[2]), sys.argv[3], step=step))
+        print(f"✅ Compiled {sys.argv[2]} into {sys.argv[3]} ({table.table.nbytes / 2 ** 20:.1f} MB)")
+        for mode in ('linear', 'nearest'):
+            print(f"   {mode:<8} error bound {table.error_bound[mode]:.4f}, "
+                  f"sampled max error {table.sampled_max_error[mode]:.4f}")
+        sys.exit()
+    if len(sys.argv) != 3:
+        sys.exit("Usage: python inference_kernel.py <model.pkl> <artifact.npz>\n"
+                 "       python inference_kernel.py table <prior.npz> <table.npz> [step]")
+    with open(sys.argv[1], 'rb') as fh:
+        fitted = pickle.load(fh)
+    export_model(fitted, sys.argv[2])
+    print(f"✅ Exported {type(fitted).__name__} to {sys.argv[2]}")
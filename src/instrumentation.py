@@ -0,0 +1,305 @@
+"""Per-stage latency, volume and cost instrumentation for the pipeline.
+
+The README promises "$0.04 per patient" and "under five seconds"; this
+module measures both. Each pipeline stage (ingestion, header indexing,
+feature extraction, prior scoring, classification) records:
+
+* a latency histogram of its instrumented calls,
+* patients (rows / scans) and bytes processed, and failed calls,
+* an estimated cost from configurable unit prices (compute seconds, GB
+  moved, per-call charges), reported per stage and per patient.
+
+Stage timings are batch calls, so seconds / patients is amortized compute,
+not what one patient waits. The latency a patient sees, from ingestion to
+classification, is recorded separately with ``observe_patient_latency``
+(one histogram entry per patient) and reported as p50/p99.
+
+Instrument code with the ``stage`` context manager or the ``timed``
+decorator; one observation costs two ``perf_counter`` calls, a bisect and
+a few additions under a lock (a few microseconds), so it is meant for per-chunk and
+per-batch calls and can stay on in production::
+
+    with stage('header_indexing') as s:
+        ...
+        s.add(patients=n_files, nbytes=n_bytes)
+
+    @timed('prior_scoring', patients=len)
+    def add_prior_feature(chunk, prior): ...
+
+    observe_patient_latency(time.perf_counter() - received, patients=len(X))
+
+``write_metrics`` writes an OpenMetrics text file and a JSON run summary.
+Setting ``MITO_METRICS_DIR`` writes both automatically at interpreter exit;
+``MITO_UNIT_PRICES`` may point to a JSON file overriding ``DEFAULT_PRICES``.
+Calls made inside worker processes are not seen by the parent's recorder,
+so stages are instrumented where the parent waits on their results.
+"""
+import atexit
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+
+# --- 1. PARAMETERS ---
+LATENCY_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0]
+METRIC_PREFIX = 'mito'
+METRICS_FILE = 'mito_metrics.prom'
+SUMMARY_FILE = 'mito_run_summary.json'
+
+# Unit prices (USD). Top-level keys apply to every stage; 'stages' overrides them per stage.
+DEFAULT_PRICES = {
+    'compute_usd_per_sec': 0.143 / 3600,  # One Synapse / Azure ML vCore-hour
+    'io_usd_per_gb': 0.01,  # Data Lake reads/writes and transfer
+    'usd_per_call': 0.0,  # Per-request charges (e.g. a managed endpoint)
+    'stages': {},
+}
+
+
+def load_prices(path=None):
+    """DEFAULT_PRICES updated from a JSON file (default: $MITO_UNIT_PRICES, if set)."""
+    prices = {**DEFAULT_PRICES, 'stages': dict(DEFAULT_PRICES['stages'])}
+    path = path or os.environ.get('MITO_UNIT_PRICES')
+    if path:
+        with open(path) as fh:
+            overrides = json.load(fh)
+        prices['stages'].update(overrides.pop('stages', {}))
+        prices.update(overrides)
+    return prices
+
+
+# --- 2. RECORDING ---
+class StageMetrics:
+    """Histogram and counters of one stage (guarded by the recorder's lock)."""
+
+    def __init__(self):
+        self.bucket_counts = [0] * (len(LATENCY_BUCKETS) + 1)  # Last bucket is +Inf
+        self.count = 0
+        self.seconds = 0.0
+        self.patients = 0
+        self.bytes = 0
+        self.errors = 0
+
+    def quantile(self, q):
+        """Upper bound of the histogram bucket holding the q-quantile (None if empty or above the last bound)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(LATENCY_BUCKETS, self.bucket_counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return None
+
+
+class _StageTimer:
+    __slots__ = ('recorder', 'name', 'patients', 'nbytes', 'start')
+
+    def __init__(self, recorder, name, patients, nbytes):
+        self.recorder = recorder
+        self.name = name
+        self.patients = patients
+        self.nbytes = nbytes
+
+    def add(self, patients=0, nbytes=0):
+        """Adds volume discovered inside the block."""
+        self.patients += patients
+        self.nbytes += nbytes
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.recorder.observe(self.name, time.perf_counter() - self.start, self.patients, self.nbytes,
+                              error=exc_type is not None)
+        return False
+
+
+class Recorder:
+    """Collects stage metrics for one process; thread-safe."""
+
+    def __init__(self, prices=None, enabled=True):
+        self.prices = prices or load_prices()
+        self.enabled = enabled
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._patient_latency = StageMetrics()
+
+    def observe(self, name, seconds, patients=0, nbytes=0, error=False):
+        if not self.enabled:
+            return
+        i = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+        with self._lock:
+            m = self._stages.get(name)
+            if m is None:
+                m = self._stages[name] = StageMetrics()
+            m.bucket_counts[i] += 1
+            m.count += 1
+            m.seconds += seconds
+            m.patients += patients
+            m.bytes += nbytes
+            m.errors += error
+
+    def observe_patient_latency(self, seconds, patients=1):
+        """Records the ingestion-to-classification wall time of `patients` patients that finished together."""
+        if not self.enabled or not patients:
+            return
+        i = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+        with self._lock:
+            m = self._patient_latency
+            m.bucket_counts[i] += patients
+            m.count += patients
+            m.seconds += seconds * patients
+            m.patients += patients
+
+    def stage(self, name, patients=0, nbytes=0):
+        """Context manager timing one call of a stage; use .add() for volume known only inside."""
+        return _StageTimer(self, name, patients, nbytes)
+
+    def timed(self, name, patients=None, nbytes=None):
+        """Decorator timing every call; `patients` / `nbytes` are optional callables of the result."""
+        def decorate(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    result = func(*args, **kwargs)
+                except BaseException:
+                    self.observe(name, time.perf_counter() - start, error=True)
+                    raise
+                elapsed = time.perf_counter() - start
+                self.observe(name, elapsed, patients(result) if patients else 0, nbytes(result) if nbytes else 0)
+                return result
+            return wrapper
+        return decorate
+
+    def reset(self):
+        with self._lock:
+            self._stages = {}
+            self._patient_latency = StageMetrics()
+        self.started = time.time()
+
+    # --- 3. COST & REPORTS ---
+    def _stage_cost(self, name, m):
+        p = {**self.prices, **self.prices.get('stages', {}).get(name, {})}
+        return (m.seconds * p['compute_usd_per_sec'] + m.bytes / 1e9 * p['io_usd_per_gb']
+                + m.count * p['usd_per_call'])
+
+    def summary(self):
+        """Run summary as a dict (per stage and totals, including cost per patient)."""
+        stages = {}
+        with self._lock:
+            for name, m in self._stages.items():
+                stages[name] = {
+                    'calls': m.count,
+                    'errors': m.errors,
+                    'seconds': m.seconds,
+                    'p50_s': m.quantile(0.5),
+                    'p99_s': m.quantile(0.99),
+                    'patients': m.patients,
+                    'bytes': m.bytes,
+                    'compute_seconds_per_patient': m.seconds / m.patients if m.patients else None,
+                    'cost_usd': self._stage_cost(name, m),
+                }
+            latency = self._patient_latency
+            patient_latency = {
+                'patients': latency.count,
+                'mean_s': latency.seconds / latency.count,
+                'p50_s': latency.quantile(0.5),
+                'p99_s': latency.quantile(0.99),
+            } if latency.count else None
+        # Patients diagnosed = patients classified; runs without a classification stage use the largest count
+        patients = stages.get('classification', {}).get('patients') or max(
+            (s['patients'] for s in stages.values()), default=0)
+        total_cost = sum(s['cost_usd'] for s in stages.values())
+        # Amortized batch compute per patient over all stages; what one patient waits is patient_latency
+        per_patient_compute = [s['compute_seconds_per_patient'] for s in stages.values()
+                               if s['compute_seconds_per_patient']]
+        return {
+            'started': self.started,
+            'finished': time.time(),
+            'patients': patients,
+            'total_seconds': sum(s['seconds'] for s in stages.values()),
+            'total_cost_usd': total_cost,
+            'cost_per_patient_usd': total_cost / patients if patients else None,
+            'compute_seconds_per_patient': sum(per_patient_compute) if per_patient_compute else None,
+            'patient_latency': patient_latency,
+            'prices': self.prices,
+            'stages': stages,
+        }
+
+    def openmetrics(self):
+        """All metrics in the OpenMetrics text exposition format."""
+        name = f'{METRIC_PREFIX}_stage_latency_seconds'
+        lines = [f'# TYPE {name} histogram', f'# UNIT {name} seconds',
+                 f'# HELP {name} Wall time of instrumented pipeline calls.']
+        with self._lock:
+            snapshot = {stage: (m, list(m.bucket_counts), self._stage_cost(stage, m)) for stage, m in self._stages.items()}
+            latency = self._patient_latency
+            latency_counts, latency_count, latency_sum = list(latency.bucket_counts), latency.count, latency.seconds
+        for stage, (m, counts, _) in snapshot.items():
+            cumulative = 0
+            for bound, n in zip(LATENCY_BUCKETS + ['+Inf'], counts):
+                cumulative += n
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {m.count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {m.seconds:.9g}')
+
+        name = f'{METRIC_PREFIX}_patient_latency_seconds'
+        lines += [f'# TYPE {name} histogram', f'# UNIT {name} seconds',
+                  f'# HELP {name} Wall time from ingestion to classification, one entry per patient.']
+        cumulative = 0
+        for bound, n in zip(LATENCY_BUCKETS + ['+Inf'], latency_counts):
+            cumulative += n
+            lines.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_count {latency_count}')
+        lines.append(f'{name}_sum {latency_sum:.9g}')
+
+        counters = [('patients', 'patients', None, 'Patients (rows or scans) processed.'),
+                    ('bytes', 'bytes', 'bytes', 'Bytes processed.'),
+                    ('errors', 'errors', None, 'Failed calls.')]
+        for attr, suffix, unit, help_text in counters:
+            family = f'{METRIC_PREFIX}_stage_{suffix}'
+            lines.append(f'# TYPE {family} counter')
+            if unit:
+                lines.append(f'# UNIT {family} {unit}')
+            lines.append(f'# HELP {family} {help_text}')
+            lines += [f'{family}_total{{stage="{stage}"}} {getattr(m, attr)}' for stage, (m, _, _) in snapshot.items()]
+
+        family = f'{METRIC_PREFIX}_stage_cost_usd'
+        lines += [f'# TYPE {family} gauge', f'# HELP {family} Estimated cost from the configured unit prices.']
+        lines += [f'{family}{{stage="{stage}"}} {cost:.9g}' for stage, (_, _, cost) in snapshot.items()]
+        per_patient = self.summary()['cost_per_patient_usd']
+        family = f'{METRIC_PREFIX}_cost_per_patient_usd'
+        lines += [f'# TYPE {family} gauge', f'# HELP {family} Estimated total cost divided by patients processed.']
+        if per_patient is not None:
+            lines.append(f'{family} {per_patient:.9g}')
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, directory='.', metrics_file=METRICS_FILE, summary_file=SUMMARY_FILE):
+        """Writes the OpenMetrics file and the JSON summary (atomically). Returns both paths."""
+        os.makedirs(directory, exist_ok=True)
+        paths = os.path.join(directory, metrics_file), os.path.join(directory, summary_file)
+        for path, text in zip(paths, (self.openmetrics(), json.dumps(self.summary(), indent=2))):
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w') as fh:
+                fh.write(text)
+            os.replace(tmp_path, path)
+        return paths
+
+
+# --- 4. PROCESS-WIDE RECORDER ---
+RECORDER = Recorder(enabled=os.environ.get('MITO_METRICS', '1') != '0')
+stage = RECORDER.stage
+timed = RECORDER.timed
+observe_patient_latency = RECORDER.observe_patient_latency
+write_metrics = RECORDER.write
+
+if os.environ.get('MITO_METRICS_DIR'):
+    atexit.register(lambda: RECORDER.write(os.environ['MITO_METRICS_DIR'])
+                    if RECORDER._stages or RECORDER._patient_latency.count else None)
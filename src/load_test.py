@@ -0,0 +1,211 @@
+"""Load generator for the /score endpoint, for capacity planning of the scoring tier.
+
+Sends synthetic patients (GWI_LIFELIKE biomarkers) in batches of
+``--batch-size`` rows through one pooled ``ScoreClient``, in one of two modes:
+
+* closed loop (``--concurrency N``): N requests are always in flight, so
+  the run measures the throughput the server sustains at that concurrency,
+* open loop (``--rate R``): requests are started at R per second whatever
+  the server does (at most ``--concurrency`` in flight). Latency is measured
+  from each request's scheduled start, so queueing behind a slow server is
+  counted rather than hidden (no coordinated omission).
+
+The report gives throughput (requests and patients per second), p50/p95/p99
+latency, a latency histogram over instrumentation.LATENCY_BUCKETS and the
+client's retry and connection counters. ``--local MODEL`` starts
+scoring_server.py in-process on a free port and targets it, so runs need no
+network or Azure access.
+
+Usage:
+    python load_test.py --local classifier.npz --batch-size 16 --concurrency 32 --requests 5000
+    python load_test.py --url https://<endpoint>/score --api-key $KEY --rate 50 --duration 60
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+
+import numpy as np
+
+from cohort import GWI_LIFELIKE, generate_cohort
+from features import add_engineered_features
+from instrumentation import LATENCY_BUCKETS
+from score_client import DEFAULT_POOL_SIZE, DEFAULT_RETRIES, DEFAULT_TIMEOUT_S, ScoreClient, ScoreError
+from scoring_server import FEATURE_COLS
+
+# --- 1. PARAMETERS ---
+DEFAULT_BATCH_SIZE = 16
+DEFAULT_CONCURRENCY = 16
+DEFAULT_REQUESTS = 1000
+N_BODIES = 64  # Distinct pre-encoded request bodies, cycled through
+RANDOM_SEED = 42
+
+
+# --- 2. PAYLOADS ---
+def make_bodies(batch_size=DEFAULT_BATCH_SIZE, n_bodies=N_BODIES, seed=RANDOM_SEED):
+    """Pre-encoded /score request bodies of `batch_size` synthetic patients each.
+
+    Biomarkers come from the GWI_LIFELIKE cohort; the symptom prior is drawn
+    uniformly, since only the request shape matters for load.
+    """
+    df = add_engineered_features(generate_cohort(GWI_LIFELIKE, batch_size * n_bodies, seed=seed), interaction=False)
+    df['Symptom_Prior_Probability'] = np.random.default_rng(seed).random(len(df))
+    records = df[FEATURE_COLS].round(4).to_dict('records')
+    return [json.dumps({'Inputs': {'data': records[i:i + batch_size]}}).encode('utf-8')
+            for i in range(0, len(records), batch_size)]
+
+
+# --- 3. LOAD LOOPS ---
+async def run_load(client, bodies, batch_size, requests=None, duration=None, concurrency=DEFAULT_CONCURRENCY,
+                   rate=None):
+    """Sends requests until `requests` were sent or `duration` seconds passed. Returns a report dict."""
+    if requests is None and duration is None:
+        requests = DEFAULT_REQUESTS
+    loop = asyncio.get_running_loop()
+    latencies, failures = [], []
+    start = loop.time()
+    deadline = start + duration if duration else float('inf')
+    sent = 0
+
+    def take():
+        nonlocal sent
+        if (requests is not None and sent >= requests) or loop.time() >= deadline:
+            return None
+        sent += 1
+        return sent - 1
+
+    async def send(i, scheduled):
+        try:
+            await client.post(bodies[i % len(bodies)])
+        except ScoreError as e:
+            failures.append(str(e))
+            return
+        latencies.append(loop.time() - scheduled)
+
+    if rate is None:
+        async def worker():
+            while (i := take()) is not None:
+                await send(i, loop.time())
+
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+    else:
+        in_flight = asyncio.Semaphore(concurrency)
+        tasks = set()  # At most `concurrency` running requests; finished ones drop out
+
+        def finished(task):
+            tasks.discard(task)
+            in_flight.release()
+
+        while (i := take()) is not None:
+            scheduled = start + i / rate
+            await asyncio.sleep(max(0.0, scheduled - loop.time()))
+            # A request that waits here for a free slot still counts its latency from `scheduled`
+            await in_flight.acquire()
+            task = asyncio.create_task(send(i, scheduled))
+            tasks.add(task)
+            task.add_done_callback(finished)
+        await asyncio.gather(*tasks)
+
+    return report(latencies, failures, loop.time() - start, batch_size, client.stats)
+
+
+def report(latencies, failures, seconds, batch_size, client_stats):
+    """Throughput, latency percentiles and histogram of a run."""
+    lat = np.asarray(latencies)
+    counts = np.bincount(np.searchsorted(LATENCY_BUCKETS, lat), minlength=len(LATENCY_BUCKETS) + 1)
+    percentiles = np.percentile(lat * 1000.0, [50, 95, 99]) if len(lat) else [None] * 3
+    return {
+        'requests': len(lat) + len(failures),
+        'succeeded': len(lat),
+        'failed': len(failures),
+        'patients': len(lat) * batch_size,
+        'seconds': seconds,
+        'requests_per_sec': len(lat) / seconds if seconds else None,
+        'patients_per_sec': len(lat) * batch_size / seconds if seconds else None,
+        'p50_ms': percentiles[0],
+        'p95_ms': percentiles[1],
+        'p99_ms': percentiles[2],
+        'max_ms': float(lat.max() * 1000.0) if len(lat) else None,
+        'histogram': {str(bound): int(n) for bound, n in zip(LATENCY_BUCKETS + ['+Inf'], counts)},
+        'client': dict(client_stats),
+        'first_errors': failures[:5],
+    }
+
+
+def format_report(r):
+    lines = [f"{r['succeeded']}/{r['requests']} requests OK in {r['seconds']:.2f}s: "
+             f"{r['requests_per_sec']:,.1f} req/s, {r['patients_per_sec']:,.0f} patients/s"]
+    if r['succeeded']:
+        lines.append(f"latency p50 {r['p50_ms']:.2f} ms  p95 {r['p95_ms']:.2f} ms  p99 {r['p99_ms']:.2f} ms  "
+                     f"max {r['max_ms']:.2f} ms")
+        peak = max(r['histogram'].values())
+        for bound, n in r['histogram'].items():
+            if n:
+                lines.append(f"  <= {bound:>6} s {n:>8}  {'#' * max(1, round(40 * n / peak))}")
+    c = r['client']
+    lines.append(f"retries {c['retries']}, failures {c['failures']}, connections opened {c['connections_opened']}, "
+                 f"reconnects {c['reconnects']}")
+    lines += [f"  error: {e}" for e in r['first_errors']]
+    return '\n'.join(lines)
+
+
+# --- 4. LOCAL STAND-IN SERVER ---
+def start_local_server(model_path, allow_pickle=False, **batcher_kwargs):
+    """Starts scoring_server.py on a free local port in a background thread. Returns (server, url)."""
+    from scoring_server import load_model, make_server
+
+    server = make_server(load_model(model_path, allow_pickle), '127.0.0.1', 0, **batcher_kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}/score'
+
+
+async def _main(args, url):
+    bodies = make_bodies(args.batch_size)
+    async with ScoreClient(url, api_key=args.api_key, pool_size=max(args.pool_size, 1), timeout=args.timeout,
+                           retries=args.retries, cafile=args.cafile) as client:
+        return await run_load(client, bodies, args.batch_size, requests=args.requests, duration=args.duration,
+                              concurrency=args.concurrency, rate=args.rate)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the /score endpoint.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', help="Endpoint URL, e.g. https://<endpoint>/score")
+    target.add_argument('--local', metavar='MODEL', help="Serve this .npz model locally and target it")
+    parser.add_argument('--allow-pickle', action='store_true',
+                        help="Let --local load a pickled model (runs code from the file: trusted files only)")
+    parser.add_argument('--api-key', default=None)
+    parser.add_argument('--cafile', default=None, help="CA bundle to trust (e.g. a self-signed dev certificate)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Patients per request")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help="Requests in flight (cap)")
+    parser.add_argument('--rate', type=float, default=None, help="Target requests/sec (open loop)")
+    parser.add_argument('--requests', type=int, default=None, help=f"Requests to send (default {DEFAULT_REQUESTS})")
+    parser.add_argument('--duration', type=float, default=None, help="Seconds to run")
+    parser.add_argument('--pool-size', type=int, default=DEFAULT_POOL_SIZE, help="Max open connections")
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT_S)
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES)
+    parser.add_argument('--json', default=None, help="Also write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    server, url = start_local_server(args.local, args.allow_pickle) if args.local else (None, args.url)
+    mode = f"{args.rate:g} req/s" if args.rate else f"concurrency {args.concurrency}"
+    print(f"Load testing {url}: batches of {args.batch_size}, {mode}...")
+    started = time.time()
+    try:
+        result = asyncio.run(_main(args, url))
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+            server.batcher.close()
+    result['started'] = started
+    print(format_report(result))
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump(result, fh, indent=2)
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,35 @@
 import pandas as pd
+from cohort_io import read_cohort
+from inference_kernel import export_model
 from sklearn.linear_model import LogisticRegression
 
-# 1. Load the data file you generated yesterday
-# Make sure this file is in the same folder as this script
-df = pd.read_csv('gwi_lifelike_full.csv')
-
-# 2. Define the inputs (Symptoms) and target (Diagnosis)
-X = df[['joint_pain', 'confusion', 'dizziness', 'fatigue']]
-y = df['Haley_Syndrome']
-
-# 3. Train the simple model to get the weights
-model = LogisticRegression(max_iter=1000)
-model.fit(X, y)
-
-# 4. PRINT THE NUMBERS FOR YOUR UI
-print("-" * 30)
-print("COPY THESE INTO YOUR app.py FILE:")
-print(f"INTERCEPT = {model.intercept_[0]:.5f}")
-print(f"COEF_PAIN = {model.coef_[0][0]:.5f}")
-print(f"COEF_CONFUSION = {model.coef_[0][1]:.5f}")
-print(f"COEF_DIZZINESS = {model.coef_[0][2]:.5f}")
-print(f"COEF_FATIGUE = {model.coef_[0][3]:.5f}")
-print("-" * 30)
+symptom_cols = ['joint_pain', 'confusion', 'dizziness', 'fatigue']
+
+
+def main():
+    # 1. Load the data file you generated yesterday
+    # Make sure this file is in the same folder as this script
+    # Only the symptom + target columns are read (Parquet/npy skip the rest entirely)
+    df = read_cohort('gwi_lifelike_full.parquet', columns=symptom_cols + ['Haley_Syndrome'])
+
+    # 2. Define the inputs (Symptoms) and target (Diagnosis)
+    X = df[symptom_cols]
+    y = df['Haley_Syndrome']
+
+    # 3. Train the simple model to get the weights
+    model = LogisticRegression(max_iter=1000)
+    model.fit(X, y)
+
+    # 4. EXPORT ALL 4 CLASSES FOR YOUR UI
+    # app.py loads this with inference_kernel.load_predictor() - no sklearn and no copy/paste needed
+    artifact = export_model(model, 'symptom_prior_v1.npz', X_check=X)
+    print("-" * 30)
+    print(f"Saved the full multinomial prior to '{artifact}'")
+    for k, cls in enumerate(model.classes_):
+        print(f"CLASS {cls}: INTERCEPT = {model.intercept_[k]:.5f}, "
+              + ", ".join(f"COEF_{col.upper()} = {w:.5f}" for col, w in zip(symptom_cols, model.coef_[k])))
+    print("-" * 30)
+
+
+if __name__ == "__main__":
+    main()
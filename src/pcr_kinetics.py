@@ -0,0 +1,161 @@
+"""Batched mono-exponential PCr recovery fitting for 31P-MRS time series.
+
+After exercise, phosphocreatine recovers as
+
+    PCr(t) = baseline - amplitude * exp(-t / tau)
+
+and tau (the PCr recovery time) is the pipeline's headline biomarker. Instead
+of one ``curve_fit`` per patient, every patient sampled on the same time grid
+is fitted at once:
+
+1. Variable projection over a log-spaced tau grid: for a fixed tau the model
+   is linear in (baseline, amplitude), so the least-squares residual of every
+   patient for every candidate tau comes out of one matrix product.
+2. A few batched Levenberg-Marquardt steps on (baseline, amplitude, log tau)
+   refine each patient from its best grid point, solving all the 3 x 3 normal
+   equations in one ``np.linalg.solve`` call.
+
+``simulate_recovery`` draws synthetic series from the class means the rest of
+the pipeline uses (notebook recovery ranges, Haley PCr/ATP means) for tests
+and benchmarks.
+"""
+import numpy as np
+import pandas as pd
+
+from cohort import HALEY_PREVALENCE
+from instrumentation import timed
+
+# --- 1. PARAMETERS ---
+TAU_GRID = np.geomspace(5.0, 200.0, 160)  # Candidate recovery times (s)
+LM_ITERATIONS = 8
+LM_LAMBDA = 1e-3
+MIN_DAMPING = 1e-12  # Keeps the damped system solvable for flat curves (amplitude 0: no tau direction)
+DEFAULT_TIMES = np.arange(0.0, 300.0, 4.0)  # Post-exercise sampling, one spectrum every 4 s
+
+# Recovery time ranges from the notebook's GWS criteria (Healthy < 30 s, GWS > 35 s)
+HEALTHY_TAU_RANGE = (15.0, 28.0)
+GWS_TAU_RANGE = (35.0, 60.0)
+DEPLETION_RANGE = (0.2, 0.4)  # Fraction of resting PCr used up by the exercise bout
+FEATURE_COLS = ['PCr_Recovery_Sec', 'PCr_Baseline', 'PCr_Depletion', 'Fit_R2', 'Fit_RMSE']
+
+
+# --- 2. GRID SEARCH (VARIABLE PROJECTION) ---
+def _grid_search(Y, t, tau_grid):
+    """Best grid tau per patient plus its linear (baseline, amplitude) solution."""
+    n_times = len(t)
+    E = np.exp(-t[:, None] / tau_grid[None, :])  # (T, G)
+    # Normal equations of the basis [1, -e] for every tau
+    s_e = E.sum(axis=0)
+    s_ee = (E * E).sum(axis=0)
+    det = n_times * s_ee - s_e ** 2
+
+    sum_y = Y.sum(axis=1, keepdims=True)  # (N, 1)
+    ye = Y @ E  # (N, G): the one big product
+    # baseline b and amplitude a for every (patient, tau)
+    b = (s_ee * sum_y - s_e * ye) / det
+    a = (s_e * sum_y - n_times * ye) / det
+    # SSE = ||y||^2 - [b, a] . [sum(y), -sum(y e)]
+    sse = (Y * Y).sum(axis=1, keepdims=True) - (b * sum_y - a * ye)
+
+    best = np.argmin(sse, axis=1)
+    rows = np.arange(len(Y))
+    return b[rows, best], a[rows, best], tau_grid[best]
+
+
+# --- 3. BATCHED LEVENBERG-MARQUARDT REFINEMENT ---
+def _residuals(Y, t, b, a, log_tau):
+    e = np.exp(-t[None, :] / np.exp(log_tau)[:, None])
+    return Y - (b[:, None] - a[:, None] * e), e
+
+
+def _refine(Y, t, b, a, tau, iterations=LM_ITERATIONS):
+    log_tau = np.log(tau)
+    lam = np.full(len(Y), LM_LAMBDA)
+    r, e = _residuals(Y, t, b, a, log_tau)
+    sse = np.einsum('nt,nt->n', r, r)
+    n_times = len(t)
+    for _ in range(iterations):
+        # Jacobian columns w.r.t. (b, a, log tau) are [1, -e, g] with g = -a * e * t / tau;
+        # the 3 x 3 normal equations only need their row sums, never the (N, T, 3) Jacobian
+        g = e * t[None, :]
+        g *= (-a / np.exp(log_tau))[:, None]
+        s_e, s_g = e.sum(axis=1), g.sum(axis=1)
+        s_ee, s_eg, s_gg = np.einsum('nt,nt->n', e, e), np.einsum('nt,nt->n', e, g), np.einsum('nt,nt->n', g, g)
+        JTJ = np.empty((len(Y), 3, 3))
+        JTJ[:, 0, 0] = n_times
+        JTJ[:, 0, 1] = JTJ[:, 1, 0] = -s_e
+        JTJ[:, 0, 2] = JTJ[:, 2, 0] = s_g
+        JTJ[:, 1, 1] = s_ee
+        JTJ[:, 1, 2] = JTJ[:, 2, 1] = -s_eg
+        JTJ[:, 2, 2] = s_gg
+        JTr = np.stack([r.sum(axis=1), -np.einsum('nt,nt->n', e, r), np.einsum('nt,nt->n', g, r)], axis=1)
+        diag = np.maximum(np.diagonal(JTJ, axis1=1, axis2=2), MIN_DAMPING)
+        damped = JTJ + lam[:, None, None] * np.eye(3) * diag[:, :, None]
+        step = np.linalg.solve(damped, JTr[..., None])[..., 0]
+
+        b_new, a_new, lt_new = b + step[:, 0], a + step[:, 1], log_tau + step[:, 2]
+        r_new, e_new = _residuals(Y, t, b_new, a_new, lt_new)
+        sse_new = np.einsum('nt,nt->n', r_new, r_new)
+        better = sse_new < sse
+        # Accept per patient; shrink the damping where it helped, grow it where it did not
+        b, a, log_tau = np.where(better, b_new, b), np.where(better, a_new, a), np.where(better, lt_new, log_tau)
+        r, e, sse = np.where(better[:, None], r_new, r), np.where(better[:, None], e_new, e), np.where(better, sse_new, sse)
+        lam = np.where(better, lam * 0.3, lam * 10.0)
+    return b, a, np.exp(log_tau), sse
+
+
+# --- 4. PUBLIC API ---
+@timed('feature_extraction.recovery', patients=len)
+def fit_recovery(Y, t=DEFAULT_TIMES, tau_grid=TAU_GRID, refine=True):
+    """Fits every row of Y (patients x time points, shared time grid t) at once.
+
+    Returns a DataFrame with PCr_Recovery_Sec (tau), PCr_Baseline,
+    PCr_Depletion (amplitude), Fit_R2 and Fit_RMSE per patient.
+    """
+    Y = np.atleast_2d(np.asarray(Y, dtype=np.float64))
+    t = np.asarray(t, dtype=np.float64)
+    if Y.shape[1] != len(t):
+        raise ValueError(f"Y has {Y.shape[1]} time points but t has {len(t)}")
+    if len(t) < 3:
+        raise ValueError(f"Fitting (baseline, amplitude, tau) needs at least 3 time points, got {len(t)}")
+    b, a, tau = _grid_search(Y, t, np.asarray(tau_grid, dtype=np.float64))
+    if refine:
+        b, a, tau, sse = _refine(Y, t, b, a, tau)
+    else:
+        r, _ = _residuals(Y, t, b, a, np.log(tau))
+        sse = np.einsum('nt,nt->n', r, r)
+
+    centered = Y - Y.mean(axis=1, keepdims=True)
+    sst = np.einsum('nt,nt->n', centered, centered)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r2 = np.where(sst > 0, 1.0 - sse / sst, np.nan)
+    return pd.DataFrame({
+        'PCr_Recovery_Sec': tau,
+        'PCr_Baseline': b,
+        'PCr_Depletion': a,
+        'Fit_R2': r2,
+        'Fit_RMSE': np.sqrt(sse / len(t)),
+    })
+
+
+def simulate_recovery(n, t=DEFAULT_TIMES, noise_sd=0.03, seed=42):
+    """Synthetic post-exercise PCr series for a Haley-class cohort.
+
+    Resting PCr follows the per-class PCr/ATP means; Healthy (class 0)
+    recovers within the notebook's healthy range, classes 1-3 within the
+    GWS range. Returns (Y, truth DataFrame).
+    """
+    rng = np.random.default_rng(seed)
+    spec = HALEY_PREVALENCE
+    labels = rng.choice(len(spec['class_probs']), size=n, p=spec['class_probs'])
+    loc, scale = np.asarray(spec['features']['PCr_ATP']).T
+    baseline = loc[labels] + scale[labels] * rng.standard_normal(n)
+
+    tau = np.where(labels == 0, rng.uniform(*HEALTHY_TAU_RANGE, n), rng.uniform(*GWS_TAU_RANGE, n))
+    amplitude = baseline * rng.uniform(*DEPLETION_RANGE, n)
+    Y = baseline[:, None] - amplitude[:, None] * np.exp(-np.asarray(t)[None, :] / tau[:, None])
+    Y += noise_sd * rng.standard_normal(Y.shape)
+
+    truth = pd.DataFrame({'PCr_Recovery_Sec': tau, 'PCr_Baseline': baseline, 'PCr_Depletion': amplitude,
+                          'Haley_Syndrome': labels})
+    return Y, truth
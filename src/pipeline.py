@@ -0,0 +1,317 @@
+"""In-process DAG runner for the cohort -> prior -> training-set pipeline.
+
+The manual chain (generator script writes a CSV, symptom-to-probability.py
+parses it back and writes another CSV, someone uploads it) is replaced by
+declared stages::
+
+    Stage('prior', fit_prior, inputs=['cohort'], outputs=['prior'], params=['C'])
+
+A stage is a function of its inputs (passed as keyword arguments) and its
+parameters; it returns one value per output name. The runner orders the
+stages, passes outputs between them in memory (DataFrames and arrays by
+reference, no text round trip) and content-hashes every output:
+
+* a stage's cache key hashes its name, version, parameter values and the
+  content hashes of its inputs, so changing only the prior's C reruns the
+  prior and everything downstream but reuses the cached cohort,
+* cached outputs are stored in ``cache_dir`` in raw form (cohorts as npy
+  column directories, read back as memory maps; arrays as ``.npy``; states
+  through their own save/load) and are only loaded if a stage that has to
+  run reads them,
+* DataFrame outputs are downcast to float32 once, when they leave their
+  stage, so a cached rerun sees exactly the values of a fresh run.
+
+Stages with ``cache=False`` (the file sinks) always run.
+
+Usage:
+    python pipeline.py                         # gwi_lifelike cohort -> prior -> gwi_bayesian_training_set.csv
+    python pipeline.py --set C=0.5 --set n=100000
+"""
+import argparse
+import hashlib
+import importlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+from cohort_io import downcast, read_cohort, write_cohort
+
+# --- 1. PARAMETERS ---
+DEFAULT_CACHE_DIR = '.pipeline_cache'
+CACHE_VERSION = 1  # Bump when the storage layout changes
+OUTPUTS_FILE = 'outputs.json'
+
+
+# --- 2. STAGES & HASHING ---
+class Stage:
+    """One pipeline step: func(**inputs, **params) -> one value per output (a tuple if several)."""
+
+    def __init__(self, name, func, inputs=(), outputs=None, params=(), runtime=(), version=1, cache=True):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs or [name])
+        self.params = list(params)
+        self.runtime = list(runtime)  # Passed like params but left out of the cache key (e.g. worker counts)
+        self.version = version  # Bump when the stage's code changes its results
+        self.cache = cache
+
+
+def _update_hash(h, value):
+    if isinstance(value, pd.DataFrame):
+        h.update(b'frame')
+        for col in value.columns:
+            values = np.ascontiguousarray(value[col].to_numpy())
+            h.update(f'|{col}|{values.dtype.str}|{len(values)}'.encode())
+            h.update(values.data)
+    elif isinstance(value, np.ndarray):
+        h.update(f'array|{value.dtype.str}|{value.shape}'.encode())
+        h.update(np.ascontiguousarray(value).data)
+    elif isinstance(value, dict):
+        h.update(b'dict')
+        for key in sorted(value, key=str):
+            _update_hash(h, str(key))
+            _update_hash(h, value[key])
+    elif isinstance(value, (list, tuple)):
+        h.update(f'list|{len(value)}'.encode())
+        for item in value:
+            _update_hash(h, item)
+    elif hasattr(value, '__dict__'):
+        h.update(f'object|{type(value).__module__}.{type(value).__qualname__}'.encode())
+        _update_hash(h, vars(value))
+    else:
+        h.update(f'{type(value).__name__}|{value!r}'.encode())
+
+
+def content_hash(value):
+    """Stable hash of a value's content (DataFrames and arrays by their raw buffers)."""
+    h = hashlib.blake2b(digest_size=16)
+    _update_hash(h, value)
+    return h.hexdigest()
+
+
+def stage_key(stage, params, input_hashes):
+    """Cache key of one stage run: its code version, parameters and input contents."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f'v{CACHE_VERSION}|{stage.name}|{stage.version}|'.encode())
+    h.update(json.dumps({p: params[p] for p in stage.params}, sort_keys=True, default=repr).encode())
+    for name in stage.inputs:
+        h.update(f'|{name}={input_hashes[name]}'.encode())
+    return h.hexdigest()
+
+
+# --- 3. CACHE STORAGE ---
+def _store(value, directory, name):
+    """Writes one output in raw form; returns its manifest entry (without the hash)."""
+    if isinstance(value, pd.DataFrame):
+        write_cohort(value, os.path.join(directory, name), fmt='npy')
+        return {'kind': 'cohort', 'file': name}
+    if isinstance(value, np.ndarray):
+        np.save(os.path.join(directory, f'{name}.npy'), value, allow_pickle=False)
+        return {'kind': 'array', 'file': f'{name}.npy'}
+    if hasattr(value, 'save') and hasattr(type(value), 'load'):
+        value.save(os.path.join(directory, f'{name}.npz'))
+        return {'kind': 'state', 'file': f'{name}.npz',
+                'type': f'{type(value).__module__}:{type(value).__qualname__}'}
+    return {'kind': 'json', 'value': value}
+
+
+def _load(entry, directory):
+    if entry['kind'] == 'cohort':
+        return read_cohort(os.path.join(directory, entry['file']), fmt='npy')
+    if entry['kind'] == 'array':
+        return np.load(os.path.join(directory, entry['file']), mmap_mode='r')
+    if entry['kind'] == 'state':
+        module, qualname = entry['type'].split(':')
+        return getattr(importlib.import_module(module), qualname).load(os.path.join(directory, entry['file']))
+    return entry['value']
+
+
+class StageCache:
+    """Directory of stage outputs keyed by stage_key; entries are written atomically."""
+
+    def __init__(self, root=DEFAULT_CACHE_DIR):
+        self.root = root
+
+    def _dir(self, stage, key):
+        return os.path.join(self.root, f'{stage.name}-{key}')
+
+    def lookup(self, stage, key):
+        """Manifest {output: entry} of a cached run, or None."""
+        path = os.path.join(self._dir(stage, key), OUTPUTS_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path) as fh:
+            return json.load(fh)
+
+    def load(self, stage, key, entry):
+        return _load(entry, self._dir(stage, key))
+
+    def save(self, stage, key, values, hashes):
+        final = self._dir(stage, key)
+        tmp = f'{final}.{os.getpid()}.tmp'
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        manifest = {}
+        for name in stage.outputs:
+            manifest[name] = {**_store(values[name], tmp, name), 'hash': hashes[name]}
+        with open(os.path.join(tmp, OUTPUTS_FILE), 'w') as fh:
+            json.dump(manifest, fh, indent=2)
+        shutil.rmtree(final, ignore_errors=True)
+        os.replace(tmp, final)
+        return manifest
+
+
+# --- 4. RUNNER ---
+class Pipeline:
+    """A DAG of stages with default parameters."""
+
+    def __init__(self, stages, params=None):
+        self.stages = {stage.name: stage for stage in stages}
+        self.params = dict(params or {})
+        self.producer = {}
+        for stage in stages:
+            for output in stage.outputs:
+                if output in self.producer:
+                    raise ValueError(f"Output '{output}' is produced by both '{self.producer[output]}' and '{stage.name}'")
+                self.producer[output] = stage.name
+
+    def order(self, targets=None):
+        """Stages needed for `targets` (output names; default: all), dependencies first."""
+        ordered = []
+
+        def visit(name, path=()):
+            if name in path:
+                raise ValueError(f"Stage cycle: {' -> '.join(path + (name,))}")
+            if name in ordered:
+                return
+            for dep in self.stages[name].inputs:
+                if dep not in self.producer:
+                    raise KeyError(f"Stage '{name}' reads '{dep}', which no stage produces")
+                visit(self.producer[dep], path + (name,))
+            ordered.append(name)
+
+        for output in targets or list(self.producer):
+            visit(self.producer[output])
+        return ordered
+
+    def run(self, targets=None, params=None, cache_dir=DEFAULT_CACHE_DIR, log=print):
+        """Runs the stages needed for `targets` and returns {output: value} for them.
+
+        Cached stages are skipped; their outputs are loaded only if a stage
+        that does run needs them (or they are targets). cache_dir=None
+        disables the cache.
+        """
+        params = {**self.params, **(params or {})}
+        targets = targets or list(self.producer)
+        cache = StageCache(cache_dir) if cache_dir else None
+        values, hashes, cached = {}, {}, {}  # cached: output -> (stage, key, entry), not loaded yet
+
+        def get(output):
+            if output not in values:
+                stage, key, entry = cached.pop(output)
+                values[output] = cache.load(stage, key, entry)
+            return values[output]
+
+        for name in self.order(targets):
+            stage = self.stages[name]
+            key = stage_key(stage, params, hashes)
+            manifest = cache.lookup(stage, key) if cache and stage.cache else None
+            if manifest is not None:
+                for output in stage.outputs:
+                    hashes[output] = manifest[output]['hash']
+                    cached[output] = (stage, key, manifest[output])
+                log(f"{name:<14} cached ({key[:12]})")
+                continue
+
+            start = time.perf_counter()
+            kwargs = {p: params[p] for p in stage.params + stage.runtime}
+            result = stage.func(**{dep: get(dep) for dep in stage.inputs}, **kwargs)
+            result = result if len(stage.outputs) > 1 else (result,)
+            for output, value in zip(stage.outputs, result):
+                # Same float32 values whether the next stage gets them in memory or from the cache
+                values[output] = downcast(value) if isinstance(value, pd.DataFrame) else value
+                hashes[output] = content_hash(values[output])
+            if cache and stage.cache:
+                cache.save(stage, key, values, hashes)
+            log(f"{name:<14} ran in {time.perf_counter() - start:.2f}s ({key[:12]})")
+        return {output: get(output) for output in targets}
+
+
+# --- 5. GWI TWO-STAGE PIPELINE ---
+def _cohort(n, seed, workers):
+    from gwi_lifelike_full import build_cohort
+
+    return build_cohort(n, seed=seed, workers=workers)
+
+
+def _prior(cohort, C):
+    from prior_training import SYMPTOM_COLS, TARGET_COL, fit_arrays
+
+    return fit_arrays(cohort[SYMPTOM_COLS].to_numpy(np.float64), cohort[TARGET_COL].to_numpy(), C=C)
+
+
+def _training_set(cohort, prior):
+    from prior_training import SYMPTOM_COLS, TARGET_COL
+    from symptom_prior import BIOMARKER_COLS, FINAL_COLS, add_prior_feature
+
+    # Column selection copies, so the prior column never lands in the (hashed) cohort
+    chunk = add_prior_feature(cohort[BIOMARKER_COLS + SYMPTOM_COLS + [TARGET_COL]], prior)
+    return chunk[FINAL_COLS]
+
+
+def _export(training_set, prior, output_file, prior_artifact):
+    from inference_kernel import export_model
+    from prior_training import SYMPTOM_COLS
+
+    export_model(prior, prior_artifact, feature_names=SYMPTOM_COLS)
+    return write_cohort(training_set, output_file)
+
+
+GWI_PIPELINE = Pipeline(
+    [
+        Stage('cohort', _cohort, outputs=['cohort'], params=['n', 'seed'], runtime=['workers']),
+        Stage('prior', _prior, inputs=['cohort'], outputs=['prior'], params=['C']),
+        Stage('training_set', _training_set, inputs=['cohort', 'prior'], outputs=['training_set']),
+        Stage('export', _export, inputs=['training_set', 'prior'], outputs=['n_rows'],
+              params=['output_file', 'prior_artifact'], cache=False),
+    ],
+    params={
+        'n': 28_000,
+        'seed': 42,
+        'workers': 1,  # Runtime only: the cohort does not depend on it
+        'C': 1.0,
+        'output_file': 'gwi_bayesian_training_set.csv',
+        'prior_artifact': 'symptom_prior_v1.npz',
+    },
+)
+
+
+def _parse_value(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the cohort -> prior -> training-set pipeline.")
+    parser.add_argument('--set', action='append', default=[], metavar='NAME=VALUE',
+                        help=f"Override a parameter (defaults: {GWI_PIPELINE.params})")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--no-cache', action='store_true')
+    args = parser.parse_args(argv)
+
+    params = dict(item.split('=', 1) for item in args.set)
+    params = {name: _parse_value(value) for name, value in params.items()}
+    result = GWI_PIPELINE.run(['n_rows'], params, cache_dir=None if args.no_cache else args.cache_dir)
+    output_file = params.get('output_file', GWI_PIPELINE.params['output_file'])
+    print(f"✅ Saved final training file: '{output_file}' ({result['n_rows']} records)")
+
+
+if __name__ == "__main__":
+    main()
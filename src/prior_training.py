@@ -0,0 +1,225 @@
+"""Out-of-core, resumable training of the multinomial symptom prior.
+
+``symptom-to-probability.py`` fits ``LogisticRegression(max_iter=1000)`` on
+the whole cohort in memory. This module fits the same model (multinomial
+softmax, L2 penalty ``0.5 / C * ||coef||^2`` on the coefficients, unpenalized
+intercepts) by streaming Newton passes: every pass reads the data in chunks
+and accumulates the loss, gradient and Hessian, which for 4 symptoms and 4
+classes is only a 20 x 20 matrix. Memory therefore stays flat however many
+rows there are, and the fit converges to the same optimum as the batch model.
+
+The saved state keeps a quadratic summary (gradient + Hessian at the fitted
+weights) of all data seen so far. ``update_streaming`` uses it to fold in
+newly appended records by reading only those records.
+
+Usage:
+    python prior_training.py fit gwi_lifelike_full.parquet symptom_prior_state.npz
+    python prior_training.py update symptom_prior_state.npz new_surveys.parquet
+"""
+import sys
+
+import numpy as np
+
+from cohort_io import iter_cohort
+
+# --- 1. PARAMETERS ---
+SYMPTOM_COLS = ['joint_pain', 'confusion', 'dizziness', 'fatigue']
+TARGET_COL = 'Haley_Syndrome'
+CLASSES = [0, 1, 2, 3]
+DEFAULT_C = 1.0  # Same default regularization as sklearn's LogisticRegression
+DEFAULT_CHUNK_ROWS = 1_000_000
+MAX_PASSES = 50
+TOL = 1e-8  # Stop when the largest Newton update is below this
+
+
+# --- 2. MODEL STATE ---
+class PriorState:
+    """Fitted prior plus the sufficient summary needed to resume training.
+
+    Exposes coef_ / intercept_ / classes_ / predict_proba so it can be
+    passed to inference_kernel.export_model like a fitted sklearn model.
+    """
+
+    def __init__(self, classes, n_features, C=DEFAULT_C):
+        self.classes_ = np.asarray(classes)
+        self.C = C
+        n_params = len(classes) * (n_features + 1)
+        self.weights = np.zeros((len(classes), n_features + 1))  # Last column is the intercept
+        self.n_rows = 0
+        self.data_grad = np.zeros(n_params)  # Data-term gradient at `weights`
+        self.data_hess = np.zeros((n_params, n_params))  # Data-term Hessian at `weights`
+
+    @property
+    def coef_(self):
+        return self.weights[:, :-1]
+
+    @property
+    def intercept_(self):
+        return self.weights[:, -1]
+
+    def predict_proba(self, X):
+        return _softmax(_with_bias(np.asarray(X, dtype=np.float64)) @ self.weights.T)
+
+    def save(self, path):
+        with open(path, 'wb') as fh:
+            np.savez(fh, classes=self.classes_, C=self.C, weights=self.weights, n_rows=self.n_rows,
+                     data_grad=self.data_grad, data_hess=self.data_hess)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as npz:
+            state = cls(npz['classes'], npz['weights'].shape[1] - 1, float(npz['C']))
+            state.weights = npz['weights']
+            state.n_rows = int(npz['n_rows'])
+            state.data_grad = npz['data_grad']
+            state.data_hess = npz['data_hess']
+        return state
+
+
+def _with_bias(X):
+    return np.hstack([X, np.ones((len(X), 1))])
+
+
+def _softmax(z):
+    z = z - z.max(axis=1, keepdims=True)
+    np.exp(z, out=z)
+    z /= z.sum(axis=1, keepdims=True)
+    return z
+
+
+# --- 3. STREAMING ACCUMULATION ---
+def iter_xy(source, columns=SYMPTOM_COLS, target=TARGET_COL, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Yields (X, y) chunks from a stored cohort path or from a callable returning DataFrame chunks."""
+    chunks = source() if callable(source) else iter_cohort(source, columns=columns + [target], batch_size=chunk_rows)
+    for chunk in chunks:
+        yield chunk[columns].to_numpy(dtype=np.float64), chunk[target].to_numpy()
+
+
+def accumulate(chunks, weights, classes):
+    """One pass over the data: cross-entropy loss, gradient and Hessian of the data term."""
+    n_classes, n_cols = weights.shape
+    loss = 0.0
+    n_rows = 0
+    grad = np.zeros((n_classes, n_cols))
+    hess = np.zeros((n_classes, n_cols, n_classes, n_cols))
+    for X, y in chunks:
+        Xb = _with_bias(X)
+        labels = np.searchsorted(classes, y)
+        if np.any(classes[np.minimum(labels, n_classes - 1)] != y):
+            raise ValueError(f"Found labels outside the configured classes {classes.tolist()}")
+        P = _softmax(Xb @ weights.T)
+        loss -= np.log(np.maximum(P[np.arange(len(y)), labels], 1e-300)).sum()
+        residual = P
+        residual[np.arange(len(y)), labels] -= 1.0
+        grad += residual.T @ Xb
+        P[np.arange(len(y)), labels] += 1.0  # Restore probabilities for the Hessian
+        # d^2 / dW_k dW_l = sum_i p_ik (delta_kl - p_il) x_i x_i^T, one small (d+1) x (d+1) block per class pair
+        for k in range(n_classes):
+            for l in range(k, n_classes):
+                w = P[:, k] * ((k == l) - P[:, l])
+                block = Xb.T @ (w[:, None] * Xb)
+                hess[k, :, l, :] += block
+                if l != k:
+                    hess[l, :, k, :] += block
+        n_rows += len(y)
+    n_params = n_classes * n_cols
+    return loss, grad.ravel(), hess.reshape(n_params, n_params), n_rows
+
+
+def _penalty(weights, C):
+    """L2 penalty on the coefficients (not the intercepts): value, gradient, Hessian."""
+    mask = np.ones_like(weights)
+    mask[:, -1] = 0.0
+    value = 0.5 / C * np.sum((weights * mask) ** 2)
+    return value, (weights * mask / C).ravel(), np.diag(mask.ravel() / C)
+
+
+def _newton(state, pass_fn):
+    """Damped Newton iterations; pass_fn(weights) -> (loss, grad, hess, n_rows) of the data term."""
+    weights = state.weights
+    best = None
+    step = 1.0
+    direction = None
+    for _ in range(MAX_PASSES):
+        loss, grad, hess, n_rows = pass_fn(weights)
+        pen, pen_grad, pen_hess = _penalty(weights, state.C)
+        total = loss + pen
+        if best is not None and total > best[0] + 1e-12 * abs(best[0]):
+            # Overshot: halve the step from the last accepted point (no new data pass for the direction)
+            step *= 0.5
+            if step < 1e-6:
+                break
+            weights = best[1] + step * direction
+            continue
+        best = (total, weights, grad, hess, n_rows)
+        # The softmax is invariant to shifting all classes, so use the minimum-norm solution
+        direction = -np.linalg.lstsq(hess + pen_hess, grad + pen_grad, rcond=None)[0].reshape(weights.shape)
+        step = 1.0
+        if np.max(np.abs(direction)) < TOL:
+            break
+        weights = weights + direction
+    _, state.weights, state.data_grad, state.data_hess, n_rows = best
+    return state, n_rows
+
+
+# --- 4. PUBLIC API ---
+def fit_streaming(source, classes=CLASSES, C=DEFAULT_C, state=None, columns=SYMPTOM_COLS, target=TARGET_COL,
+                  chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Fits the prior with full streaming passes over `source` (warm-started from `state` if given)."""
+    if state is None:
+        state = PriorState(classes, len(columns), C)
+    classes = np.asarray(state.classes_)
+
+    def full_pass(weights):
+        return accumulate(iter_xy(source, columns, target, chunk_rows), weights, classes)
+
+    state, state.n_rows = _newton(state, full_pass)
+    return state
+
+
+def fit_arrays(X, y, classes=CLASSES, C=DEFAULT_C, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Fits the prior on in-memory arrays, still accumulating chunk by chunk."""
+    state = PriorState(classes, X.shape[1], C)
+
+    def array_pass(weights):
+        chunks = ((X[i:i + chunk_rows], y[i:i + chunk_rows]) for i in range(0, len(y), chunk_rows))
+        return accumulate(chunks, weights, np.asarray(state.classes_))
+
+    state, state.n_rows = _newton(state, array_pass)
+    return state
+
+
+def update_streaming(state, new_source, columns=SYMPTOM_COLS, target=TARGET_COL, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Folds newly appended records into a saved state, reading only the new records.
+
+    Previously seen data enters through its quadratic summary at the saved
+    weights, which is exact for the current fit and a second-order
+    approximation as the weights move.
+    """
+    classes = np.asarray(state.classes_)
+    w0 = state.weights.ravel().copy()
+    old_grad, old_hess, old_rows = state.data_grad, state.data_hess, state.n_rows
+
+    def incremental_pass(weights):
+        loss, grad, hess, n_rows = accumulate(iter_xy(new_source, columns, target, chunk_rows), weights, classes)
+        delta = weights.ravel() - w0
+        loss += old_grad @ delta + 0.5 * delta @ old_hess @ delta
+        return loss, grad + old_grad + old_hess @ delta, hess + old_hess, n_rows
+
+    state, n_new = _newton(state, incremental_pass)
+    state.n_rows = old_rows + n_new
+    return state
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] not in ('fit', 'update'):
+        sys.exit(__doc__)
+    if sys.argv[1] == 'fit':
+        prior_state = fit_streaming(sys.argv[2])
+        prior_state.save(sys.argv[3])
+        print(f"✅ Fitted the prior on {prior_state.n_rows} records, state saved to '{sys.argv[3]}'")
+    else:
+        prior_state = update_streaming(PriorState.load(sys.argv[2]), sys.argv[3])
+        prior_state.save(sys.argv[2])
+        print(f"✅ Prior updated, now covers {prior_state.n_rows} records ('{sys.argv[2]}')")
@@ -0,0 +1,246 @@
+"""Content-addressed cache of diagnoses for repeat and re-submitted patients.
+
+Clinics re-submit the same record many times (re-opened charts, retries
+after a timeout), and every submission used to be a full model call. The
+cache sits in front of ``predict``:
+
+* a row's key is a keyed BLAKE2b hash of its five features, rounded to
+  the 4 decimals the generators and CSV exports use, with the model version
+  (the artifact's content hash) as the hash key. The same record under
+  another model never matches,
+* rows are scored on their rounded values, so a cached answer is exactly
+  what the model would return for the key,
+* entries live in a bounded in-memory LRU and expire after ``ttl``
+  seconds; with ``spill_path`` the entries evicted from memory move to a
+  SQLite file and are promoted back on a hit,
+* ``set_version`` drops every entry of older models (scoring_server.py
+  calls it when a new artifact is deployed),
+* ``predict`` scores only a batch's misses, each distinct row once.
+
+Usage:
+    cache = DiagnosisCache(artifact_version('model.npz'), max_entries=100_000, ttl=3600)
+    predictions = cache.predict(model.predict, X)
+    cache.snapshot()  # {'hits': ..., 'misses': ..., ...}
+"""
+import hashlib
+import json
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from cohort_io import CSV_DECIMALS
+
+# --- 1. PARAMETERS ---
+DEFAULT_MAX_ENTRIES = 100_000  # In memory; about 200 bytes each
+DEFAULT_TTL_S = 24 * 3600.0  # None keeps entries until evicted or invalidated
+DEFAULT_MAX_SPILL_ENTRIES = 10_000_000
+KEY_BYTES = 16
+SQL_BATCH = 500  # Keys per IN (...) lookup, below SQLite's parameter limit
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS diagnoses (
+    key BLOB PRIMARY KEY,
+    version TEXT NOT NULL,
+    expires REAL NOT NULL,
+    value TEXT NOT NULL
+)
+"""
+
+
+def artifact_version(path):
+    """Content hash of a model artifact: the same file gives the same version wherever it is deployed."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+# --- 2. CACHE ---
+class DiagnosisCache:
+    """Thread-safe LRU + TTL cache of predictions keyed by model version and rounded features."""
+
+    def __init__(self, version, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL_S, spill_path=None,
+                 max_spill_entries=DEFAULT_MAX_SPILL_ENTRIES, decimals=CSV_DECIMALS, clock=time.time):
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_spill_entries = max_spill_entries
+        self.decimals = decimals
+        self.clock = clock  # Wall clock, so spilled expiry times stay valid across restarts
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires, value), least recently used first
+        self.counters = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0, 'spilled': 0,
+                         'invalidations': 0}
+        self._db = None
+        self._disk_rows = 0
+        if spill_path is not None:
+            self._db = sqlite3.connect(spill_path, check_same_thread=False)  # Only used under self._lock
+            self._db.execute(SCHEMA)
+        self.version = None
+        self.set_version(version)
+
+    # --- Keys ---
+    def canonical(self, X):
+        """Rounded float64 copy of a feature matrix (-0.0 folded into 0.0), as scored and hashed."""
+        Xr = np.round(np.asarray(X, dtype=np.float64), self.decimals)
+        Xr += 0.0
+        return np.ascontiguousarray(Xr)
+
+    def keys(self, Xr):
+        """One key per row of a canonical matrix."""
+        raw = Xr.tobytes()
+        width = Xr.shape[1] * Xr.itemsize if Xr.ndim == 2 else Xr.itemsize
+        key = self._version_key
+        return [hashlib.blake2b(raw[i:i + width], digest_size=KEY_BYTES, key=key).digest()
+                for i in range(0, len(raw), width)]
+
+    # --- Lookups ---
+    def get_many(self, keys):
+        """Cached values for the keys (None for a miss), refreshing their LRU position."""
+        now = self.clock()
+        values = [None] * len(keys)
+        missing = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                entry = self._entries.get(key)
+                if entry is not None:
+                    if entry[0] > now:
+                        self._entries.move_to_end(key)
+                        values[i] = entry[1]
+                        continue
+                    del self._entries[key]
+                    self.counters['expired'] += 1
+                missing.append(i)
+            if missing and self._db is not None:
+                found, n_expired = self._disk_get({keys[i] for i in missing}, now)
+                self.counters['expired'] += n_expired
+                for i in missing:
+                    if keys[i] in found:
+                        values[i] = found[keys[i]][1]
+                self._insert(found.items(), now)
+                self.counters['disk_hits'] += sum(keys[i] in found for i in missing)
+            n_missed = sum(values[i] is None for i in missing)
+            self.counters['hits'] += len(keys) - n_missed
+            self.counters['misses'] += n_missed
+        return values
+
+    def put_many(self, keys, values):
+        """Stores values (JSON-serializable predictions) under their keys."""
+        now = self.clock()
+        expires = now + self.ttl if self.ttl is not None else math.inf
+        with self._lock:
+            self._insert(((key, (expires, value)) for key, value in zip(keys, values)), now)
+
+    def predict(self, predict, X):
+        """Predictions for X, calling predict(rows) only on the distinct rows that miss the cache."""
+        Xr = self.canonical(X)
+        keys = self.keys(Xr)
+        values = self.get_many(keys)
+        first = {}  # Key of each distinct missed row -> its first row index
+        for i, value in enumerate(values):
+            if value is None:
+                first.setdefault(keys[i], i)
+        if first:
+            scored = np.asarray(predict(Xr[list(first.values())])).tolist()
+            self.put_many(list(first), scored)
+            position = dict(zip(first, range(len(first))))
+            for i, value in enumerate(values):
+                if value is None:
+                    values[i] = scored[position[keys[i]]]
+        return np.asarray(values)
+
+    # --- Invalidation ---
+    def set_version(self, version):
+        """Switches to another model version, dropping the entries of every other version."""
+        with self._lock:
+            if version == self.version:
+                return
+            if self.version is not None:
+                self.counters['invalidations'] += 1
+            self.version = version
+            self._version_key = hashlib.blake2b(str(version).encode('utf-8'), digest_size=32).digest()
+            self._entries.clear()
+            if self._db is not None:
+                with self._db:
+                    self._db.execute('DELETE FROM diagnoses WHERE version != ? OR expires <= ?',
+                                     (self.version, self.clock()))
+                self._disk_rows = self._db.execute('SELECT COUNT(*) FROM diagnoses').fetchone()[0]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                with self._db:
+                    self._db.execute('DELETE FROM diagnoses')
+                self._disk_rows = 0
+
+    def snapshot(self):
+        with self._lock:
+            lookups = self.counters['hits'] + self.counters['misses']
+            return {
+                **self.counters,
+                'hit_rate': self.counters['hits'] / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'model_version': self.version,
+            }
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    # --- Storage (callers hold self._lock) ---
+    def _insert(self, items, now):
+        for key, entry in items:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+        spill = []
+        while len(self._entries) > self.max_entries:
+            key, (expires, value) = self._entries.popitem(last=False)
+            self.counters['evictions'] += 1
+            if expires > now:
+                spill.append((key, self.version, expires, json.dumps(value)))
+        if spill and self._db is not None:
+            self._disk_put(spill, now)
+
+    def _disk_get(self, keys, now):
+        """Live spilled entries for the keys, plus how many expired ones were found (and deleted)."""
+        keys = list(keys)
+        found = {}
+        expired = []
+        for start in range(0, len(keys), SQL_BATCH):
+            part = keys[start:start + SQL_BATCH]
+            rows = self._db.execute(
+                f"SELECT key, expires, value FROM diagnoses WHERE version = ? "
+                f"AND key IN ({', '.join('?' * len(part))})", (self.version, *part))
+            for key, expires, value in rows:
+                if expires > now:
+                    found[bytes(key)] = (expires, json.loads(value))
+                else:
+                    expired.append((key,))
+        if expired:
+            with self._db:
+                self._db.executemany('DELETE FROM diagnoses WHERE key = ?', expired)
+            self._disk_rows = max(0, self._disk_rows - len(expired))
+        return found, len(expired)
+
+    def _disk_put(self, rows, now):
+        with self._db:
+            self._db.executemany('INSERT OR REPLACE INTO diagnoses VALUES (?, ?, ?, ?)', rows)
+            self.counters['spilled'] += len(rows)
+            self._disk_rows += len(rows)  # Upper bound (replaced keys are counted twice)
+            if self._disk_rows > self.max_spill_entries:
+                n_rows = self._db.execute('SELECT COUNT(*) FROM diagnoses').fetchone()[0]
+                # Expired rows sort first, then the ones closest to expiry
+                self._db.execute('DELETE FROM diagnoses WHERE key IN '
+                                 '(SELECT key FROM diagnoses ORDER BY expires LIMIT ?)',
+                                 (max(0, n_rows - self.max_spill_entries),))
+                self._disk_rows = min(n_rows, self.max_spill_entries)
+
@@ -0,0 +1,201 @@
+"""Asyncio client for the ``/score`` endpoint (Azure ML or scoring_server.py).
+
+``test_api.py`` used to open a new connection per call with
+``urllib.request.urlopen``, without a timeout or retries, and turned off
+certificate checks for the whole process. This client:
+
+* keeps a pool of persistent HTTP/1.1 connections (at most ``pool_size``
+  open; idle ones are reused most-recently-used first),
+* verifies TLS certificates. A self-signed development certificate is
+  trusted by passing its CA file (``cafile``), for this client only,
+* applies a per-attempt timeout and retries connection errors, timeouts and
+  429/5xx answers with exponential backoff and jitter. A keep-alive
+  connection the server closed while idle is replaced once, right away.
+
+Only the standard library is used, so the load tester runs anywhere the
+pipeline does.
+
+Usage:
+    async with ScoreClient('http://127.0.0.1:8080/score') as client:
+        classes = await client.score([{"NAD_NADH": 1.2, ...}])
+"""
+import asyncio
+import json
+import random
+import ssl
+from urllib.parse import urlsplit
+
+# --- 1. PARAMETERS ---
+DEFAULT_POOL_SIZE = 16
+DEFAULT_TIMEOUT_S = 10.0  # Per attempt
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF_S = 0.05  # First retry waits about this long, doubling each time
+MAX_BACKOFF_S = 2.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class ScoreError(Exception):
+    """A request that failed after all retries (HTTP error, connection failure or an answer that is not JSON)."""
+
+    def __init__(self, message, status=None, body=b''):
+        super().__init__(message)
+        self.status = status
+        self.body = body
+
+
+# --- 2. CONNECTIONS ---
+class _Connection:
+    """One persistent HTTP/1.1 connection (requests on it are sequential)."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.reusable = True
+
+    @classmethod
+    async def open(cls, host, port, ssl_context):
+        reader, writer = await asyncio.open_connection(host, port, ssl=ssl_context,
+                                                       server_hostname=host if ssl_context else None)
+        return cls(reader, writer)
+
+    async def request(self, head, body):
+        self.writer.write(head + body)
+        await self.writer.drain()
+        status_line = await self.reader.readuntil(b'\r\n')
+        status = int(status_line.split(None, 2)[1])
+        headers = {}
+        while True:
+            line = await self.reader.readuntil(b'\r\n')
+            if line == b'\r\n':
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            parts = []
+            while True:
+                size = int((await self.reader.readuntil(b'\r\n')).split(b';')[0], 16)
+                if size == 0:
+                    while await self.reader.readuntil(b'\r\n') != b'\r\n':  # Trailers
+                        pass
+                    break
+                parts.append(await self.reader.readexactly(size + 2))
+            data = b''.join(part[:-2] for part in parts)
+        elif 'content-length' in headers:
+            data = await self.reader.readexactly(int(headers['content-length']))
+        else:
+            data = await self.reader.read()
+            self.reusable = False
+        if headers.get('connection', '').lower() == 'close':
+            self.reusable = False
+        return status, headers, data
+
+    def close(self):
+        self.reusable = False
+        self.writer.close()
+
+
+# --- 3. CLIENT ---
+class ScoreClient:
+    """Pooled, retrying client for one /score URL. Create and use it inside one event loop."""
+
+    def __init__(self, url, api_key=None, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT_S,
+                 retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF_S, cafile=None, ssl_context=None):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise ValueError(f"Unsupported URL scheme in '{url}'")
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+        if parts.scheme == 'https':
+            self.ssl_context = ssl_context or ssl.create_default_context(cafile=cafile)
+        else:
+            self.ssl_context = None
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        headers = {'Host': parts.netloc, 'Content-Type': 'application/json', 'Connection': 'keep-alive'}
+        if api_key:
+            headers['Authorization'] = f'Bearer {api_key}'
+        self._head = ''.join(f'{k}: {v}\r\n' for k, v in headers.items())
+        self._slots = asyncio.Semaphore(pool_size)
+        self._idle = []
+        self.stats = {'requests': 0, 'attempts': 0, 'retries': 0, 'failures': 0, 'connections_opened': 0,
+                      'reconnects': 0}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        while self._idle:
+            self._idle.pop().close()
+
+    async def _connect(self):
+        self.stats['connections_opened'] += 1
+        return await _Connection.open(self.host, self.port, self.ssl_context)
+
+    async def _attempt(self, body):
+        """One request on a pooled connection; a stale keep-alive connection is replaced once."""
+        head = f'POST {self.path} HTTP/1.1\r\n{self._head}Content-Length: {len(body)}\r\n\r\n'.encode('latin-1')
+        async with self._slots:
+            reused = bool(self._idle)
+            conn = self._idle.pop() if reused else await self._connect()
+            if reused and conn.reader.at_eof():
+                conn.close()
+                reused, conn = False, await self._connect()
+            try:
+                try:
+                    response = await asyncio.wait_for(conn.request(head, body), self.timeout)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    if not reused:
+                        raise
+                    # The server may close an idle keep-alive connection just as we send
+                    conn.close()
+                    self.stats['reconnects'] += 1
+                    conn = await self._connect()
+                    response = await asyncio.wait_for(conn.request(head, body), self.timeout)
+            except BaseException:
+                conn.close()
+                raise
+            if conn.reusable:
+                self._idle.append(conn)
+            else:
+                conn.close()
+            return response
+
+    async def post(self, body):
+        """POSTs an encoded JSON body with retries. Returns the decoded JSON answer."""
+        self.stats['requests'] += 1
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.stats['retries'] += 1
+                delay = min(MAX_BACKOFF_S, self.backoff * 2 ** (attempt - 1))
+                await asyncio.sleep(delay * (0.5 + random.random()))
+            self.stats['attempts'] += 1
+            try:
+                status, _, data = await self._attempt(body)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+                error = ScoreError(f"{type(e).__name__}: {e}")
+                continue
+            if status == 200:
+                try:
+                    return json.loads(data)
+                except ValueError as e:  # Not JSON (or not UTF-8): a proxy's error page, say; not retried
+                    error = ScoreError(f"HTTP 200 with a body that is not JSON ({e}): "
+                                       f"{data[:200].decode('utf-8', 'replace')}", status, data)
+                    break
+            error = ScoreError(f"HTTP {status}: {data[:200].decode('utf-8', 'replace')}", status, data)
+            if status not in RETRY_STATUSES:
+                break
+        self.stats['failures'] += 1
+        raise error
+
+    async def score(self, records):
+        """Scores patient records (dicts of the five features). Returns the predicted classes."""
+        body = json.dumps({'Inputs': {'data': records}}).encode('utf-8')
+        answer = await self.post(body)
+        # scoring_server.py answers {"Results": [...]}; other deployments may return the list itself
+        return answer['Results'] if isinstance(answer, dict) and 'Results' in answer else answer
@@ -0,0 +1,429 @@
+"""Local micro-batching scoring service for the two-stage diagnostic model.
+
+Accepts the same request contract as the Azure ML ``/score`` endpoint used
+by ``test_api.py``::
+
+    {"Inputs": {"data": [{"NAD_NADH": ..., "PCr_ATP": ..., "GSH_GSSG": ...,
+                          "Metabolic_Index": ..., "Symptom_Prior_Probability": ...}]}}
+
+and answers with ``{"Results": [<class>, ...]}``. The model is loaded once;
+concurrent requests are coalesced by a single batching thread into one
+vectorized ``predict`` call per micro-batch. A batch is flushed when it
+reaches ``max_batch_size`` rows or when its oldest request has waited
+``max_latency_ms``. ``GET /metrics`` reports queue depth and batch sizes.
+The model is an ``inference_kernel`` artifact; a pickled estimator is only
+loaded with ``--allow-pickle``, since unpickling runs code from the file.
+
+With ``--stats`` (or ``--reference``) every scored batch also feeds a
+streaming ``cohort_stats.CohortStats`` keyed by the predicted class;
+``GET /stats`` returns its summary and, given a reference snapshot, the
+drift of the scored traffic from it.
+
+With ``--cache`` a ``score_cache.DiagnosisCache`` answers re-submitted
+patients: each micro-batch is looked up first and only its misses reach the
+model. With ``--cache`` or an explicit ``--reload-interval`` the model file
+is re-checked every ``--reload-interval`` seconds (default 2); a new
+artifact is loaded and the cache moves to its version, dropping the old
+answers. ``GET /metrics`` includes the cache's hit/miss counters.
+
+Usage:
+    python scoring_server.py --model model.npz --port 8080
+    python scoring_server.py --model model.npz --reference reference_stats.npz
+    python scoring_server.py --model model.npz --cache --cache-ttl 3600 --cache-spill cache.sqlite
+"""
+import argparse
+import json
+import os
+import pickle
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from cohort_stats import CohortStats, drift
+from inference_kernel import load_predictor
+from instrumentation import RECORDER, observe_patient_latency, stage
+from score_cache import DEFAULT_MAX_ENTRIES, DEFAULT_TTL_S, DiagnosisCache, artifact_version
+
+# --- 1. PARAMETERS ---
+FEATURE_COLS = ['NAD_NADH', 'PCr_ATP', 'GSH_GSSG', 'Metabolic_Index', 'Symptom_Prior_Probability']
+DEFAULT_MAX_BATCH_SIZE = 512
+DEFAULT_MAX_LATENCY_MS = 5.0
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048]
+DEFAULT_RELOAD_INTERVAL_S = 2.0  # How often the model file is checked for a new artifact
+
+
+def load_model(path, allow_pickle=False):
+    """Loads an exported .npz artifact (NumPy kernel) or, with allow_pickle, a pickled estimator.
+
+    Unpickling runs arbitrary code from the file, so pickles are refused
+    unless the caller trusts the path.
+    """
+    if path.endswith('.npz'):
+        return load_predictor(path)
+    if not allow_pickle:
+        raise ValueError(f"{path} is not an exported .npz artifact; export it with inference_kernel.py, "
+                         f"or pass --allow-pickle if the file and its directory are trusted")
+    with open(path, 'rb') as fh:
+        return pickle.load(fh)
+
+
+def rows_to_matrix(records):
+    """Converts the JSON patient records into a float64 feature matrix."""
+    if not isinstance(records, list) or not records:
+        raise ValueError("'data' must be a non-empty list of patient records")
+    if not all(isinstance(r, dict) for r in records):
+        raise ValueError(f"Every patient record must be an object with {FEATURE_COLS}")
+    try:
+        return np.array([[float(r[col]) for col in FEATURE_COLS] for r in records], dtype=np.float64).reshape(-1, len(FEATURE_COLS))
+    except KeyError as e:
+        raise ValueError(f"Missing feature {e} (expected {FEATURE_COLS})") from e
+
+
+# --- 2. MICRO-BATCHING ---
+class BatchMetrics:
+    """Thread-safe counters for the batching loop."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.rows = 0
+        self.batches = 0
+        self.errors = 0
+        self.stats_errors = 0
+        self.reloads = 0
+        self.max_queue_depth = 0
+        self.batch_size_hist = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+
+    def record_request(self, queue_depth):
+        with self._lock:
+            self.requests += 1
+            self.max_queue_depth = max(self.max_queue_depth, queue_depth)
+
+    def record_batch(self, n_rows):
+        with self._lock:
+            self.batches += 1
+            self.rows += n_rows
+            self.batch_size_hist[int(np.searchsorted(BATCH_SIZE_BUCKETS, n_rows))] += 1
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def record_stats_error(self):
+        with self._lock:
+            self.stats_errors += 1
+
+    def record_reload(self):
+        with self._lock:
+            self.reloads += 1
+
+    def snapshot(self, queue_depth):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'rows_scored': self.rows,
+                'batches': self.batches,
+                'errors': self.errors,
+                'stats_errors': self.stats_errors,
+                'model_reloads': self.reloads,
+                'queue_depth': queue_depth,
+                'max_queue_depth': self.max_queue_depth,
+                'mean_batch_rows': self.rows / self.batches if self.batches else 0.0,
+                'batch_rows_hist': {f'<={b}': n for b, n in zip(BATCH_SIZE_BUCKETS + ['inf'], self.batch_size_hist)},
+            }
+
+
+class MicroBatcher:
+    """Coalesces concurrent scoring requests into vectorized model calls."""
+
+    def __init__(self, model, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_latency_ms=DEFAULT_MAX_LATENCY_MS,
+                 stats=None, cache=None, model_path=None, reload_interval_s=DEFAULT_RELOAD_INTERVAL_S,
+                 allow_pickle=False):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000.0
+        self.metrics = BatchMetrics()
+        self.stats = stats  # Optional CohortStats of the scored rows, labelled by prediction
+        self._stats_lock = threading.Lock()
+        self.cache = cache  # Optional DiagnosisCache; only its misses are scored
+        self.model_path = model_path  # Watched for new artifacts when set
+        self.allow_pickle = allow_pickle  # Whether a reload may unpickle the watched file
+        self.reload_interval = reload_interval_s
+        self._artifact_stamp = self._stamp()
+        self.model_version = artifact_version(model_path) if self._artifact_stamp else None
+        self._next_check = time.monotonic() + reload_interval_s
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, X):
+        """Queues a (n, 5) feature matrix; returns a Future resolving to its predictions."""
+        future = Future()
+        self._queue.put((X, future))
+        self.metrics.record_request(self._queue.qsize())
+        return future
+
+    def predict(self, X, timeout=None):
+        """Blocking convenience wrapper around submit()."""
+        return self.submit(X).result(timeout)
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def stats_report(self, reference=None):
+        """Summary of the scored traffic (and its drift from `reference`), or None without stats."""
+        if self.stats is None:
+            return None
+        with self._stats_lock:
+            report = {'summary': self.stats.summary()}
+            if reference is not None and self.stats.rows.sum():
+                report['drift'] = drift(self.stats, reference)
+        return report
+
+    def _collect(self):
+        """Blocks for the first request, then gathers more until the batch is full or the window closes."""
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        n_rows = len(first[0])
+        deadline = time.perf_counter() + self.max_latency
+        while n_rows < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)  # Finish this batch, stop on the next loop
+                break
+            batch.append(item)
+            n_rows += len(item[0])
+        return batch
+
+    def _stamp(self):
+        try:
+            st = os.stat(self.model_path) if self.model_path else None
+        except OSError:
+            return None
+        return st and (st.st_mtime_ns, st.st_size)
+
+    def _maybe_reload(self):
+        """Loads a newly deployed artifact (checked at most every reload_interval) and re-keys the cache."""
+        if self.model_path is None or time.monotonic() < self._next_check:
+            return
+        self._next_check = time.monotonic() + self.reload_interval
+        stamp = self._stamp()
+        if stamp is None or stamp == self._artifact_stamp:
+            return
+        try:
+            version = artifact_version(self.model_path)
+            model = load_model(self.model_path, self.allow_pickle) if version != self.model_version else None
+        except Exception:
+            return  # A partly copied artifact; the next check retries
+        self._artifact_stamp = stamp
+        if model is None:
+            return  # Touched but unchanged
+        self.model = model
+        self.model_version = version
+        self.metrics.record_reload()
+        if self.cache is not None:
+            self.cache.set_version(version)
+
+    def _as_model_input(self, X):
+        """Models fitted on a DataFrame (sklearn / Azure ML) are scored with named columns."""
+        if getattr(self.model, 'feature_names_in_', None) is not None:
+            return pd.DataFrame(X, columns=FEATURE_COLS, copy=False)
+        return X
+
+    def _predict(self, X):
+        with stage('classification', patients=len(X), nbytes=X.nbytes):
+            return np.asarray(self.model.predict(self._as_model_input(X)))
+
+    def _score(self, X):
+        if self.cache is None:
+            return self._predict(X)
+        return self.cache.predict(self._predict, X)
+
+    def _score_each(self, batch):
+        """Scores the requests of a failed batch one at a time; only the failing ones get the error."""
+        scored = []
+        for x, future in batch:
+            try:
+                predictions = self._score(x)
+            except Exception as e:
+                self.metrics.record_error()
+                future.set_exception(e)
+                continue
+            future.set_result(predictions)
+            scored.append((x, predictions))
+        return scored
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            X = np.concatenate([x for x, _ in batch]) if len(batch) > 1 else batch[0][0]
+            try:
+                self._maybe_reload()
+                predictions = self._score(X)
+            except Exception as e:
+                if len(batch) == 1:
+                    self.metrics.record_error()
+                    batch[0][1].set_exception(e)
+                    continue
+                # One bad payload must not fail the requests it was batched with
+                scored = self._score_each(batch)
+                if not scored:
+                    continue
+                X = np.concatenate([x for x, _ in scored])
+                predictions = np.concatenate([p for _, p in scored])
+            else:
+                start = 0
+                for x, future in batch:
+                    future.set_result(predictions[start:start + len(x)])
+                    start += len(x)
+            self.metrics.record_batch(len(X))
+            if self.stats is not None:
+                # After the answers are released, so the statistics add no latency
+                try:
+                    with self._stats_lock:
+                        self.stats.update(pd.DataFrame(X, columns=FEATURE_COLS, copy=False), labels=predictions)
+                except Exception as e:
+                    # Keep the batching thread alive: the batch is answered, only its statistics are lost
+                    self.metrics.record_stats_error()
+                    print(f"❌ Statistics update failed for a batch of {len(X)} rows: {e!r}", file=sys.stderr)
+
+
+# --- 3. HTTP FRONT END ---
+class ScoringHandler(BaseHTTPRequestHandler):
+    """Serves POST /score, GET /metrics (JSON), GET /metrics/openmetrics, GET /stats and GET /health."""
+
+    protocol_version = 'HTTP/1.1'  # Keep-alive for clients that reuse connections
+    batcher = None  # Set by make_server()
+    reference = None  # Optional CohortStats snapshot for GET /stats drift
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/metrics':
+            metrics = self.batcher.metrics.snapshot(self.batcher.queue_depth())
+            if self.batcher.cache is not None:
+                metrics['cache'] = self.batcher.cache.snapshot()
+            self._send_json(200, metrics)
+        elif self.path == '/metrics/openmetrics':
+            body = RECORDER.openmetrics().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/openmetrics-text; version=1.0.0; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif self.path == '/stats':
+            report = self.batcher.stats_report(self.reference)
+            if report is None:
+                self._send_json(404, {'error': 'Statistics are off (start the server with --stats)'})
+            else:
+                self._send_json(200, report)
+        elif self.path == '/health':
+            self._send_json(200, {'status': 'ok'})
+        else:
+            self._send_json(404, {'error': f'Unknown path {self.path}'})
+
+    def do_POST(self):
+        received = time.perf_counter()
+        if self.path != '/score':
+            self._send_json(404, {'error': f'Unknown path {self.path}'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length))
+            X = rows_to_matrix(payload['Inputs']['data'])
+        except (ValueError, KeyError, TypeError) as e:
+            self._send_json(400, {'error': f'Bad request: {e}'})
+            return
+        try:
+            predictions = self.batcher.predict(X)
+        except Exception as e:
+            self._send_json(500, {'error': str(e)})
+            return
+        # Request received -> classified: the wait of every patient in the request
+        observe_patient_latency(time.perf_counter() - received, patients=len(X))
+        self._send_json(200, {'Results': predictions.tolist()})
+
+    def log_message(self, format, *args):
+        # Per-request access logs would dominate the hot path under load
+        pass
+
+
+def make_server(model, host='127.0.0.1', port=8080, reference=None, **batcher_kwargs):
+    """Builds a ThreadingHTTPServer whose handlers share one MicroBatcher."""
+    batcher = MicroBatcher(model, **batcher_kwargs)
+    handler = type('BoundScoringHandler', (ScoringHandler,), {'batcher': batcher, 'reference': reference})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.batcher = batcher
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local micro-batching /score server")
+    parser.add_argument('--model', required=True,
+                        help="Path to the .npz artifact (or a pickled classifier with --allow-pickle)")
+    parser.add_argument('--allow-pickle', action='store_true',
+                        help="Accept a pickled model. Unpickling runs code from the file, and with reloading "
+                             "from every new version of it: only use it for a trusted file in a trusted directory")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--max-batch-size', type=int, default=DEFAULT_MAX_BATCH_SIZE)
+    parser.add_argument('--max-latency-ms', type=float, default=DEFAULT_MAX_LATENCY_MS)
+    parser.add_argument('--stats', action='store_true', help="Keep streaming statistics of the scored rows")
+    parser.add_argument('--reference', default=None, help="Statistics snapshot (.npz) to report drift against")
+    parser.add_argument('--cache', action='store_true', help="Answer re-submitted patients from a diagnosis cache")
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_MAX_ENTRIES, help="Entries kept in memory")
+    parser.add_argument('--cache-ttl', type=float, default=DEFAULT_TTL_S, help="Seconds an answer stays valid")
+    parser.add_argument('--cache-spill', default=None, help="SQLite file for entries evicted from memory")
+    parser.add_argument('--reload-interval', type=float, default=None,
+                        help="Seconds between checks of the model file for a new artifact "
+                             f"(on by default with --cache, every {DEFAULT_RELOAD_INTERVAL_S:g} s)")
+    args = parser.parse_args()
+
+    reference = CohortStats.load(args.reference) if args.reference else None
+    stats = CohortStats(FEATURE_COLS) if args.stats or reference is not None else None
+    cache = None
+    if args.cache or args.cache_spill:
+        cache = DiagnosisCache(artifact_version(args.model), max_entries=args.cache_size, ttl=args.cache_ttl,
+                               spill_path=args.cache_spill)
+    # The model file is only watched when asked for (or when cached answers must follow new artifacts)
+    reload = cache is not None or args.reload_interval is not None
+    server = make_server(load_model(args.model, args.allow_pickle), args.host, args.port, reference=reference,
+                         max_batch_size=args.max_batch_size, max_latency_ms=args.max_latency_ms, stats=stats,
+                         cache=cache, model_path=args.model if reload else None,
+                         reload_interval_s=DEFAULT_RELOAD_INTERVAL_S if args.reload_interval is None
+                         else args.reload_interval, allow_pickle=args.allow_pickle)
+    print(f"✅ Scoring server listening on http://{args.host}:{args.port}/score")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.batcher.close()
+        if cache is not None:
+            cache.close()
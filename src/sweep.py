@@ -0,0 +1,216 @@
+"""Parallel parameter sweeps over cohort specs with common random numbers.
+
+Studying how separable Type 1 is as noise grows used to mean one full
+generation per noise level. A sweep instead draws the random part of every
+chunk once - the class labels (or the uniforms they come from) and one
+standard-normal column per feature - and turns it into each variant with an
+affine rescale ``z * SD[label] + mean[label]``. Variants therefore differ
+only by their parameters, not by sampling noise (common random numbers), and
+a 50-variant sweep costs one set of draws plus 50 multiply-adds per column.
+
+The draws are consumed in the same order as ``cohort.generate_chunk``, so a
+variant equal to its base spec is bit-identical to ``generate_cohort``
+with the same seed and chunk size.
+
+All variants must share the feature columns, the class count and the
+``balanced`` flag; means, SDs, clipping and (unbalanced) class priors may
+differ. ``run_sweep`` splits the variants across worker processes, each of
+which regenerates the shared draws chunk by chunk from the chunk's seed and
+streams its variants to disk, so no chunk data crosses processes.
+
+Usage:
+    python sweep.py haley_balanced_sep --noise 0.5 1 1.5 2 --n 1000000 --out sweep_noise
+    python sweep.py my_cohort.json --noise 1 2 --separation 1 0.5 --columns NAD_NADH PCr_ATP
+"""
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+
+import numpy as np
+import pandas as pd
+
+from cohort import DEFAULT_CHUNK_SIZE, RANDOM_SEED, chunk_bounds, chunk_rng, draw_labels, load_spec, resolve_entropy
+from cohort_io import open_writer
+
+# --- 1. PARAMETERS ---
+SWEEP_MANIFEST = 'sweep.json'
+EXTENSIONS = {'parquet': '.parquet', 'npy': '', 'csv': '.csv'}  # npy cohorts are directories
+
+
+# --- 2. VARIANTS ---
+def vary(spec, noise=1.0, separation=1.0, columns=None):
+    """Copy of a spec with SDs multiplied by `noise` and class means pulled toward their
+    prevalence-weighted centre by `separation` (1 = unchanged, 0 = no class signal)."""
+    spec = load_spec(spec)
+    probs = np.asarray(spec['class_probs'])
+    for col, params in spec['features'].items():
+        if columns is not None and col not in columns:
+            continue
+        centre = float(np.dot(probs, [mean for mean, _ in params]))
+        spec['features'][col] = [(centre + separation * (mean - centre), sd * noise) for mean, sd in params]
+    return spec
+
+
+def grid(spec, noise=(1.0,), separation=(1.0,), columns=None):
+    """Named variants for every (noise, separation) combination, e.g. 'noise1.5_sep1'."""
+    return {f'noise{n:g}_sep{s:g}': vary(spec, n, s, columns) for n in noise for s in separation}
+
+
+def check_variants(variants):
+    """Validates {name: spec} and checks that the variants can share their draws."""
+    specs = {name: load_spec(spec) for name, spec in variants.items()}
+    if not specs:
+        raise ValueError("A sweep needs at least one variant")
+    base_name, base = next(iter(specs.items()))
+    for name, spec in specs.items():
+        if list(spec['features']) != list(base['features']):
+            raise ValueError(f"Variant '{name}' has columns {list(spec['features'])}, "
+                             f"'{base_name}' has {list(base['features'])}")
+        if len(spec['class_probs']) != len(base['class_probs']) or spec['balanced'] != base['balanced']:
+            raise ValueError(f"Variant '{name}' and '{base_name}' differ in class count or balancing")
+    return specs
+
+
+# --- 3. SHARED DRAWS ---
+def draw_base(spec, n_rows, rng):
+    """Draws one chunk's randomness, in generate_chunk's order.
+
+    Returns (labels, uniforms, normals): balanced and single-class cohorts
+    share `labels`; otherwise `uniforms` is kept and each variant maps it
+    through its own class priors.
+    """
+    n_classes = len(spec['class_probs'])
+    labels, uniforms = None, None
+    if spec['balanced'] or n_classes == 1:
+        labels = draw_labels(spec, n_rows, rng)
+    else:
+        # Generator.choice(p=...) draws these uniforms and inverts the prior CDF
+        uniforms = rng.random(n_rows)
+    normals = {col: rng.standard_normal(n_rows) for col in spec['features']}
+    return labels, uniforms, normals
+
+
+def variant_labels(spec, uniforms):
+    """Class labels of an unbalanced variant from the shared uniforms."""
+    cdf = np.cumsum(spec['class_probs'])
+    cdf /= cdf[-1]
+    return cdf.searchsorted(uniforms, side='right').astype(np.int32)
+
+
+def apply_variant(spec, labels, normals):
+    """Builds one variant's chunk from the shared draws (the affine rescale of generate_chunk)."""
+    columns = {}
+    index = labels.astype(np.intp)  # Native index width makes the per-row gathers cheaper
+    for col, params in spec['features'].items():
+        loc, scale = np.asarray(params, dtype=np.float64).T
+        values = scale.take(index)
+        values *= normals[col]
+        values += loc.take(index)
+        if col in spec['clip']:
+            low, high = spec['clip'][col]
+            np.clip(values, low, high, out=values)
+        columns[col] = values
+    if spec.get('label_col'):
+        columns[spec['label_col']] = labels
+    return pd.DataFrame(columns, copy=False)
+
+
+def _variant_chunks(specs, n_rows, rng):
+    """{name: DataFrame} of every variant for one chunk."""
+    base = next(iter(specs.values()))
+    labels, uniforms, normals = draw_base(base, n_rows, rng)
+    by_prior = {}
+    chunks = {}
+    for name, spec in specs.items():
+        if uniforms is not None:
+            key = tuple(spec['class_probs'])
+            if key not in by_prior:
+                by_prior[key] = variant_labels(spec, uniforms)
+            labels = by_prior[key]
+        chunks[name] = apply_variant(spec, labels, normals)
+    return chunks
+
+
+# --- 4. RUNNERS ---
+def sweep_chunks(variants, n, chunk_size=DEFAULT_CHUNK_SIZE, seed=RANDOM_SEED):
+    """Yields {variant: DataFrame chunk} in order, all variants built from the same draws."""
+    specs = check_variants(variants)
+    entropy = resolve_entropy(seed)
+    for index, n_rows in enumerate(chunk_bounds(n, chunk_size)):
+        yield _variant_chunks(specs, n_rows, chunk_rng(entropy, index))
+
+
+def _write_group(specs, paths, n, chunk_size, entropy, fmt):
+    """Process-pool entry point: streams a group of variants to disk. Returns {name: rows}."""
+    with ExitStack() as stack:
+        writers = {name: stack.enter_context(open_writer(paths[name], fmt)) for name in specs}
+        for index, n_rows in enumerate(chunk_bounds(n, chunk_size)):
+            for name, chunk in _variant_chunks(specs, n_rows, chunk_rng(entropy, index)).items():
+                writers[name].write(chunk)
+    return {name: writer.n_rows for name, writer in writers.items()}
+
+
+def run_sweep(variants, n, output_dir, fmt='parquet', chunk_size=DEFAULT_CHUNK_SIZE, seed=RANDOM_SEED, workers=1):
+    """Writes one cohort per variant to `output_dir` plus a sweep.json manifest. Returns the manifest.
+
+    Variants are split across `workers` processes (None = all cores); each
+    worker redraws the shared randomness once per chunk for all its variants.
+    """
+    specs = check_variants(variants)
+    entropy = resolve_entropy(seed)  # Resolved once so every worker draws the same stream
+    os.makedirs(output_dir, exist_ok=True)
+    paths = {name: os.path.join(output_dir, name + EXTENSIONS[fmt]) for name in specs}
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(specs)))
+    names = list(specs)
+    groups = [{name: specs[name] for name in names[i::workers]} for i in range(workers)]
+    rows = {}
+    if workers == 1:
+        rows.update(_write_group(specs, paths, n, chunk_size, entropy, fmt))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_write_group, group, paths, n, chunk_size, entropy, fmt) for group in groups]
+            for future in futures:
+                rows.update(future.result())
+
+    manifest = {
+        'n': n,
+        'chunk_size': chunk_size,
+        'entropy': entropy,
+        'format': fmt,
+        'variants': {name: {'path': os.path.basename(paths[name]), 'rows': rows[name], 'spec': specs[name]}
+                     for name in names},
+    }
+    with open(os.path.join(output_dir, SWEEP_MANIFEST), 'w') as fh:
+        json.dump(manifest, fh, indent=2)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate cohort variants from shared random draws.")
+    parser.add_argument('spec', help="Registered cohort name (see cohort.COHORTS) or a JSON spec file")
+    parser.add_argument('--noise', type=float, nargs='+', default=[1.0], help="SD multipliers")
+    parser.add_argument('--separation', type=float, nargs='+', default=[1.0],
+                        help="Class-mean distance multipliers (1 = unchanged)")
+    parser.add_argument('--columns', nargs='+', default=None, help="Columns to vary (default: all)")
+    parser.add_argument('--n', type=int, default=100_000)
+    parser.add_argument('--out', default='sweep')
+    parser.add_argument('--fmt', default='parquet', choices=sorted(EXTENSIONS))
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--seed', type=int, default=RANDOM_SEED)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    variants = grid(args.spec, args.noise, args.separation, args.columns)
+    print(f"Generating {len(variants)} variants x {args.n} rows of '{args.spec}'...")
+    manifest = run_sweep(variants, args.n, args.out, fmt=args.fmt, chunk_size=args.chunk_size,
+                         seed=args.seed, workers=args.workers)
+    print(f"✅ Sweep written to '{args.out}' ({', '.join(manifest['variants'])})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,23 @@
 import pandas as pd
 import numpy as np
-from sklearn.linear_model import LogisticRegression
+
+from cohort_io import iter_cohort, read_cohort
+from cross_fit import cross_fit_prior
+from symptom_prior import FINAL_COLS, add_prior_feature, train_prior_batch, train_prior_streaming, write_training_set
 
 # 1. Load the "Real-Life" Data
 # This file contains BOTH the noisy biomarkers AND the subjective symptoms
-input_file = 'gwi_lifelike_full.csv'
-df = pd.read_csv(input_file)
-print(f"Loaded {len(df)} records from '{input_file}'")
+input_file = 'gwi_lifelike_full.parquet'
+
+# 'batch'     = sklearn fit on the whole cohort in memory (fine for the 28k cohort)
+# 'streaming' = out-of-core Newton passes over chunks: flat memory on 100M rows, and the saved
+#               state can be resumed with `python prior_training.py update` when new surveys arrive
+TRAINING_MODE = 'batch'
+PRIOR_STATE_FILE = 'symptom_prior_state.npz'
+# >1 = (batch mode) build the feature out-of-fold from k fold priors trained in parallel processes;
+#      fold models are cached in .prior_cache/ so unchanged reruns skip training
+CROSS_FIT_FOLDS = 0
+CHUNK_ROWS = 1_000_000
 
 # 2. Define Your Feature Sets
 # These MUST match the columns you generated in the previous script
@@ -14,39 +25,55 @@ symptom_cols = ['joint_pain', 'confusion', 'dizziness', 'fatigue']
 biomarker_cols = ['NAD_NADH', 'PCr_ATP', 'GSH_GSSG', 'Metabolic_Index']
 target = 'Haley_Syndrome'
 
-# 3. Train the "Subjective Prior" Model (The Survey Analyzer)
-# We use Logistic Regression because it gives us calibrated probabilities (0-100%)
-print("Training Subjective Prior Model (Logistic Regression)...")
-X_sym = df[symptom_cols]
-y = df[target]
-
-# Note: We fit on the whole dataset here to generate the feature for the next stage.
-# In a production pipeline, this model would be saved and versioned separately.
-prior_model = LogisticRegression(max_iter=1000)
-prior_model.fit(X_sym, y)
-
-# 4. Generate the "Symptom Probability" Feature
-# We ask the model: "Based strictly on these symptoms, what is the probability this patient is sick?"
-# predict_proba returns an array [Prob_Healthy, Prob_Type1, Prob_Type2, Prob_Type3]
-# We take the MAXIMUM probability of any specific syndrome to capture "Confidence of Illness"
-all_probs = prior_model.predict_proba(X_sym)
-df['Symptom_Prior_Probability'] = np.max(all_probs[:, 1:], axis=1) # Max prob of class 1, 2, or 3
-
-# Alternatively, if you want the probability of the *specific* predicted class:
-# df['Symptom_Prior_Probability'] = all_probs.max(axis=1)
-
-print("✅ Generated 'Symptom_Prior_Probability' column.")
-
-# 5. Create the Final "Two-Stage" Dataset
-# CRITICAL: We DROP the raw symptom columns now. 
-# The final model will only see the Biomarkers + The Symptom Probability.
-final_cols = biomarker_cols + ['Symptom_Prior_Probability', target]
-df_final = df[final_cols]
-
-output_file = 'gwi_bayesian_training_set.csv'
-df_final.to_csv(output_file, index=False)
-
-print(f"\nSUCCESS! Saved final training file: '{output_file}'")
-print("-" * 30)
-print(f"Columns included: {list(df_final.columns)}")
-print("UPLOAD THIS FILE to Azure for your final training run.")
+
+def main():
+    # 3. Train the "Subjective Prior" Model (The Survey Analyzer)
+    # We use Logistic Regression because it gives us calibrated probabilities (0-100%)
+    print(f"Training Subjective Prior Model (Logistic Regression, {TRAINING_MODE})...")
+
+    # Note: We fit on the whole dataset here to generate the feature for the next stage.
+    # The fitted prior is saved as a versioned NumPy artifact (checked against sklearn's probabilities).
+    if TRAINING_MODE == 'streaming':
+        prior, state = train_prior_streaming(input_file, state_file=PRIOR_STATE_FILE, symptom_cols=symptom_cols,
+                                             target=target, chunk_rows=CHUNK_ROWS)
+        print(f"Fitted on {state.n_rows} records (resumable state: '{PRIOR_STATE_FILE}')")
+    else:
+        # Only the columns used below are read (Parquet/npy skip the rest entirely)
+        df = read_cohort(input_file, columns=biomarker_cols + symptom_cols + [target])
+        print(f"Loaded {len(df)} records from '{input_file}'")
+        if CROSS_FIT_FOLDS <= 1:  # Cross-fitting trains its own fold priors below
+            prior = train_prior_batch(df, symptom_cols=symptom_cols, target=target)
+
+    # 4. Generate the "Symptom Probability" Feature
+    # We ask the model: "Based strictly on these symptoms, what is the probability this patient is sick?"
+    # predict_proba returns an array [Prob_Healthy, Prob_Type1, Prob_Type2, Prob_Type3]
+    # We take the MAXIMUM probability of any specific syndrome to capture "Confidence of Illness"
+    # (symptom_prior.add_prior_feature: max prob of class 1, 2, or 3)
+    if TRAINING_MODE == 'streaming':
+        chunks = iter_cohort(input_file, columns=biomarker_cols + symptom_cols + [target], batch_size=CHUNK_ROWS)
+        chunks = (add_prior_feature(chunk, prior, symptom_cols) for chunk in chunks)
+    elif CROSS_FIT_FOLDS > 1:
+        # Each patient's prior comes from a model that never saw their label
+        df['Symptom_Prior_Probability'], n_cached = cross_fit_prior(
+            df[symptom_cols].to_numpy(), df[target].to_numpy(), n_folds=CROSS_FIT_FOLDS)
+        print(f"Cross-fitted the prior over {CROSS_FIT_FOLDS} folds ({n_cached} fold models loaded from cache)")
+        chunks = [df]
+    else:
+        chunks = [add_prior_feature(df, prior, symptom_cols)]
+
+    # 5. Create the Final "Two-Stage" Dataset
+    # CRITICAL: We DROP the raw symptom columns now.
+    # The final model will only see the Biomarkers + The Symptom Probability.
+    # CSV export (4 decimals) for the Azure ML upload, written chunk by chunk
+    output_file = 'gwi_bayesian_training_set.csv'
+    n_rows = write_training_set(chunks, output_file, FINAL_COLS)
+
+    print("✅ Generated 'Symptom_Prior_Probability' column.")
+    print(f"\nSUCCESS! Saved final training file: '{output_file}' ({n_rows} records)")
+    print("-" * 30)
+    print(f"Columns included: {FINAL_COLS}")
+    print("UPLOAD THIS FILE to Azure for your final training run.")
+
+
+if __name__ == "__main__":
+    main()
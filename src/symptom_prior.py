@@ -0,0 +1,63 @@
+"""Importable core of the Symptom_Prior_Probability stage.
+
+``symptom-to-probability.py`` is the runnable script (its name is not
+importable); the training and scoring steps it chains live here so that
+benchmarks and other stages can call them directly.
+"""
+from cohort_io import open_writer
+from inference_kernel import compile_prior_table, export_model, load_predictor, symptom_prior_probability
+from instrumentation import timed
+from prior_training import DEFAULT_CHUNK_ROWS, SYMPTOM_COLS, TARGET_COL, fit_streaming
+
+# --- 1. PARAMETERS ---
+BIOMARKER_COLS = ['NAD_NADH', 'PCr_ATP', 'GSH_GSSG', 'Metabolic_Index']
+PRIOR_COL = 'Symptom_Prior_Probability'
+FINAL_COLS = BIOMARKER_COLS + [PRIOR_COL, TARGET_COL]
+PRIOR_ARTIFACT = 'symptom_prior_v1.npz'
+PRIOR_TABLE_ARTIFACT = 'symptom_prior_table_v1.npz'
+
+
+# --- 2. TRAINING ---
+def train_prior_batch(df, artifact=PRIOR_ARTIFACT, symptom_cols=SYMPTOM_COLS, target=TARGET_COL):
+    """sklearn fit on an in-memory cohort; exports and returns the NumPy predictor."""
+    from sklearn.linear_model import LogisticRegression
+
+    X_sym = df[symptom_cols]
+    model = LogisticRegression(max_iter=1000)
+    model.fit(X_sym, df[target])
+    return load_predictor(export_model(model, artifact, X_check=X_sym))
+
+
+def train_prior_streaming(source, artifact=PRIOR_ARTIFACT, state_file=None, symptom_cols=SYMPTOM_COLS,
+                          target=TARGET_COL, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Out-of-core fit over a cohort file; returns (predictor, resumable PriorState)."""
+    state = fit_streaming(source, columns=symptom_cols, target=target, chunk_rows=chunk_rows)
+    if state_file:
+        state.save(state_file)
+    return load_predictor(export_model(state, artifact, feature_names=symptom_cols)), state
+
+
+def compile_prior(prior, artifact=PRIOR_TABLE_ARTIFACT, interpolate=True, **kwargs):
+    """Compiles a fitted prior into a lookup table (see inference_kernel.compile_prior_table) and loads it."""
+    return load_predictor(compile_prior_table(prior, artifact, interpolate=interpolate, **kwargs))
+
+
+# --- 3. SCORING ---
+@timed('prior_scoring', patients=len)
+def add_prior_feature(chunk, prior, symptom_cols=SYMPTOM_COLS):
+    """Adds Symptom_Prior_Probability (max probability of classes 1-3) to a chunk, in place."""
+    X = chunk[symptom_cols].to_numpy()
+    if hasattr(prior, 'symptom_prior'):
+        # Compiled lookup table: a gather per patient, no probability matrix
+        chunk[PRIOR_COL] = prior.symptom_prior(X)
+    else:
+        chunk[PRIOR_COL] = symptom_prior_probability(prior.predict_proba(X))
+    return chunk
+
+
+def write_training_set(chunks, output_file, columns=FINAL_COLS):
+    """Writes the final two-stage training set chunk by chunk. Returns the number of rows."""
+    with open_writer(output_file) as writer:
+        for chunk in chunks:
+            writer.write(chunk[columns])
+    return writer.n_rows
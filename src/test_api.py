@@ -1,14 +1,12 @@
-import urllib.request
+import asyncio
 import json
 import os
-import ssl
 
-def allowSelfSignedHttps(allowed):
-    # Bypass certificate errors if using a self-signed cert (common in dev)
-    if allowed and not os.environ.get('PYTHONHTTPSVERIFY', '') and getattr(ssl, '_create_unverified_context', None):
-        ssl._create_default_https_context = ssl._create_unverified_context
+from score_client import ScoreClient, ScoreError
 
-allowSelfSignedHttps(True) # Call the bypass
+# TLS certificates are always verified. For a self-signed dev endpoint, point
+# MITO_CA_BUNDLE at its CA certificate; it is trusted by this client only.
+CA_BUNDLE = os.environ.get('MITO_CA_BUNDLE')
 
 # --- CONFIGURATION ---
 # I pulled this URL directly from your screenshot
@@ -50,25 +48,28 @@ data = {
     }
 }
 
-body = str.encode(json.dumps(data))
 
-headers = {'Content-Type':'application/json', 'Authorization':('Bearer '+ api_key)}
+async def score(payload):
+    async with ScoreClient(url, api_key=api_key, cafile=CA_BUNDLE) as client:
+        return await client.post(json.dumps(payload).encode('utf-8'))
 
-req = urllib.request.Request(url, body, headers)
 
-try:
-    response = urllib.request.urlopen(req)
+def main():
+    try:
+        result = asyncio.run(score(data))
+    except ScoreError as error:
+        print(f"The request failed with status code: {error.status}")
+        print(error)
+        return
 
-    result = response.read()
     print("-" * 30)
     print("AZURE DIAGNOSIS RESULTS:")
     print("-" * 30)
     # The result usually comes back as a JSON list of predictions
-    print(json.loads(result)) 
+    print(result)
     print("-" * 30)
     print("Expected: [0, 2, 3] (or similar classes)")
 
-except urllib.error.HTTPError as error:
-    print("The request failed with status code: " + str(error.code))
-    print(error.info())
-    print(error.read().decode("utf8", 'ignore'))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+import os
+import subprocess
+import sys
+
+from benchmark import compare
+
+SCRIPT = os.path.join(os.path.dirname(__file__), '..', 'src', 'benchmark.py')
+
+
+def result(rows_per_sec=1e6, p99_ms=10.0, peak_mb=50.0):
+    return {'rows_per_sec': rows_per_sec, 'p99_ms': p99_ms, 'peak_mb': peak_mb}
+
+
+def test_fails_without_a_baseline(tmp_path):
+    run = subprocess.run([sys.executable, SCRIPT, '--stages', 'generate', '--sizes', '1e3',
+                          '--baseline', str(tmp_path / 'missing.json'), '--output', str(tmp_path / 'out.json')],
+                         capture_output=True, text=True, cwd=tmp_path, timeout=120)
+    assert run.returncode == 1
+    assert 'No baseline' in run.stdout
+    assert not (tmp_path / 'out.json').exists()  # Refused before running anything
+
+
+def test_compare_flags_regressions_and_missing_entries():
+    baseline = {'results': {'generate/1000': result(), 'features/1000': result()}}
+    current = {'results': {
+        'generate/1000': result(rows_per_sec=0.9e6, p99_ms=11.0, peak_mb=55.0),  # Within 25%
+        'features/1000': result(rows_per_sec=0.5e6, peak_mb=200.0),
+        'classification/1000': result(),
+    }}
+    regressions = compare(current, baseline)
+    assert len(regressions) == 3
+    assert sum(line.startswith('features/1000') for line in regressions) == 2
+    assert 'no baseline entry' in regressions[-1]
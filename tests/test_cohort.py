@@ -0,0 +1,18 @@
+import numpy as np
+import pytest
+
+from cohort import GWI_LIFELIKE, chunk_rng, draw_labels, generate_chunks
+
+
+@pytest.mark.parametrize('n_rows', [4, 5, 7, 1000, 1003])
+def test_balanced_labels_are_balanced(n_rows):
+    counts = np.bincount(draw_labels(GWI_LIFELIKE, n_rows, chunk_rng(0, 0)), minlength=4)
+    assert counts.sum() == n_rows
+    assert counts.max() - counts.min() <= 1
+
+
+def test_small_chunks_favour_no_class():
+    # 5-row chunks of a 4-class cohort: one spare row per chunk
+    labels = np.concatenate([chunk['Haley_Syndrome'] for chunk in generate_chunks(GWI_LIFELIKE, 5_000, 5)])
+    shares = np.bincount(labels, minlength=4) / len(labels)
+    np.testing.assert_allclose(shares, 0.25, atol=0.01)
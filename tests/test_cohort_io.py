@@ -0,0 +1,72 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cohort_io import NPY_MANIFEST, NpyWriter, add_columns, iter_cohort, open_writer, read_cohort, write_cohort
+
+FORMATS = {'csv': 'cohort.csv', 'parquet': 'cohort.parquet', 'npy': 'cohort.npy'}
+
+
+def chunks(n_chunks=3, rows=100):
+    rng = np.random.default_rng(0)
+    return [pd.DataFrame({'NAD_NADH': rng.uniform(1, 2, rows), 'Haley_Syndrome': rng.integers(0, 4, rows)})
+            for _ in range(n_chunks)]
+
+
+@pytest.mark.parametrize('fmt', FORMATS)
+def test_round_trip(tmp_path, fmt):
+    path = str(tmp_path / FORMATS[fmt])
+    assert write_cohort(chunks(), path) == 300
+    df = read_cohort(path)
+    expected = pd.concat(chunks(), ignore_index=True)
+    np.testing.assert_allclose(df['NAD_NADH'], expected['NAD_NADH'], atol=1e-4)
+    np.testing.assert_array_equal(df['Haley_Syndrome'], expected['Haley_Syndrome'])
+
+
+@pytest.mark.parametrize('fmt', FORMATS)
+def test_exception_removes_partial_output(tmp_path, fmt):
+    path = str(tmp_path / FORMATS[fmt])
+    with pytest.raises(RuntimeError):
+        with open_writer(path) as writer:
+            writer.write(chunks()[0])
+            raise RuntimeError('generator failed')
+    assert not os.path.exists(path)
+
+
+def test_abort_keeps_unrelated_files_in_an_existing_directory(tmp_path):
+    path = tmp_path / 'cohort'
+    path.mkdir()
+    (path / 'notes.txt').write_text('keep me')
+    with pytest.raises(RuntimeError):
+        with open_writer(str(path)) as writer:
+            writer.write(chunks()[0])
+            raise RuntimeError
+    assert sorted(os.listdir(path)) == ['notes.txt']
+
+
+def test_npy_rejects_changed_columns(tmp_path):
+    writer = NpyWriter(str(tmp_path / 'cohort'))
+    first = chunks()[0]
+    writer.write(first)
+    with pytest.raises(ValueError, match='missing'):
+        writer.write(first[['NAD_NADH']])
+    with pytest.raises(ValueError, match='unexpected'):
+        writer.write(first.assign(PCr_ATP=1.0))
+    writer.write(first[['Haley_Syndrome', 'NAD_NADH']])  # Order does not matter
+    writer.close()
+    assert len(read_cohort(str(tmp_path / 'cohort'))) == 200
+    assert os.path.exists(tmp_path / 'cohort' / NPY_MANIFEST)
+
+
+def test_iter_cohort_keeps_sidecar_dtypes(tmp_path):
+    path = str(tmp_path / FORMATS['parquet'])
+    write_cohort(chunks(), path)
+    prior = [pd.DataFrame({'Symptom_Prior_Probability': c['NAD_NADH'].to_numpy(np.float32) / 2}) for c in chunks()]
+    add_columns(path, prior)
+    whole = read_cohort(path)
+    streamed = pd.concat(iter_cohort(path, batch_size=70), ignore_index=True)
+    assert streamed.dtypes.to_dict() == whole.dtypes.to_dict()
+    assert whole['Symptom_Prior_Probability'].dtype == np.float32
+    pd.testing.assert_frame_equal(streamed, whole)
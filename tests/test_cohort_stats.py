@@ -0,0 +1,92 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cohort_stats import CohortStats, QuantileSketch
+
+
+def cohort(n, seed=0):
+    rng = np.random.default_rng(seed)
+    labels = rng.integers(0, 3, n)
+    return pd.DataFrame({'a': rng.normal(labels, 1.0), 'b': rng.lognormal(0.0, 1.0, n), 'label': labels})
+
+
+def test_moments_and_quantiles_match_numpy():
+    df = cohort(200_000)
+    stats = CohortStats(label_col='label', by_class=True)
+    for start in range(0, len(df), 30_000):
+        stats.update(df.iloc[start:start + 30_000])
+    n, mean, sd = stats.moments('a')
+    assert n == len(df)
+    assert mean == pytest.approx(df['a'].mean(), rel=1e-12)
+    assert sd == pytest.approx(df['a'].std(), rel=1e-12)
+    _, class_means, _ = stats.moments('a', by_class=True)
+    np.testing.assert_allclose(class_means, df.groupby('label')['a'].mean().to_numpy(), rtol=1e-12, atol=1e-12)
+    for q in (0.01, 0.5, 0.99):
+        assert stats.sketches['b'].quantile(q) == pytest.approx(np.quantile(df['b'], q), rel=0.011)
+
+
+def test_empty_chunks_are_skipped_quietly():
+    df = cohort(1000)
+    stats = CohortStats(label_col='label', by_class=True)
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        stats.update(df.iloc[:0])
+        stats.update(df)
+        stats.update(df.iloc[:0])
+    assert stats.summary()['rows'] == 1000
+    assert stats.moments('a')[0] == 1000
+
+
+def test_categorical_labels_match_strings():
+    df = cohort(50_000)
+    names = np.array(['Healthy', 'Type 1', 'Type 2'])
+    as_strings = df.assign(label=names[df['label']])
+    as_categorical = df.assign(label=pd.Categorical.from_codes(df['label'], ['Healthy', 'Type 1', 'Type 2', 'Unused']))
+    a = CohortStats(label_col='label').update(as_strings).summary()
+    b = CohortStats(label_col='label').update(as_categorical).summary()
+    assert a == b
+    assert list(b['classes']) == ['Healthy', 'Type 1', 'Type 2']  # Unused categories are not classes
+
+
+def test_mixed_sign_sketch():
+    values = np.random.default_rng(1).normal(0.2, 1.0, 100_000)
+    sketch = QuantileSketch().update(values)
+    for q in (0.05, 0.3, 0.5, 0.95):
+        expected = np.quantile(values, q)
+        assert sketch.quantile(q) == pytest.approx(expected, rel=0.011, abs=1e-3)
+
+
+def test_merge_equals_single_pass():
+    df = cohort(20_000)
+    whole = CohortStats(label_col='label').update(df)
+    left = CohortStats(label_col='label').update(df.iloc[:7_000])
+    right = CohortStats(label_col='label').update(df.iloc[7_000:])
+    merged = left.merge(right).summary()
+    expected = whole.summary()
+    assert merged['classes'] == expected['classes']
+    for col in ('a', 'b'):
+        assert merged['features'][col]['mean'] == pytest.approx(expected['features'][col]['mean'], rel=1e-12)
+        assert merged['features'][col]['quantiles'] == expected['features'][col]['quantiles']
+
+
+@pytest.mark.parametrize('outlier', [1e30, -1e30, 1.7e308, np.inf, -np.inf])
+def test_outlier_keeps_the_bulk(outlier):
+    values = np.random.default_rng(2).uniform(1.0, 3.0, 100_000)
+    sketch = QuantileSketch().update(values).update([outlier])
+    merged = QuantileSketch().update(values).merge(sketch)
+    for s in (sketch, merged, QuantileSketch.from_state(sketch.state())):
+        for q in (0.01, 0.5, 0.99):
+            assert s.quantile(q) == pytest.approx(np.quantile(values, q), rel=0.13)
+    assert sketch.infinite == (not np.isfinite(outlier))
+
+
+def test_infinities_are_counted_apart():
+    stats = CohortStats().update(pd.DataFrame({'a': [1.0, 2.0, np.inf, np.nan, -np.inf]}))
+    feature = stats.summary()['features']['a']
+    assert (feature['count'], feature['missing'], feature['infinite']) == (2, 1, 2)
+    assert feature['mean'] == 1.5
+    assert feature['max'] == 2.0
+    assert feature['quantiles']['0.5'] == pytest.approx(1.0, rel=0.011)
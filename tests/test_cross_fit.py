@@ -0,0 +1,63 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+import cross_fit
+from cohort import GWI_LIFELIKE, generate_cohort
+from cross_fit import cross_fit_prior, fold_ids
+from inference_kernel import symptom_prior_probability
+from prior_training import SYMPTOM_COLS, TARGET_COL, fit_arrays
+
+
+@pytest.fixture(scope='module')
+def data():
+    df = generate_cohort(GWI_LIFELIKE, 3000, seed=5)
+    return df[SYMPTOM_COLS].to_numpy(np.float64), df[TARGET_COL].to_numpy()
+
+
+def test_priors_are_out_of_fold(data, tmp_path):
+    X, y = data
+    priors, _ = cross_fit_prior(X, y, n_folds=3, workers=1, cache_dir=str(tmp_path))
+    held_out = fold_ids(len(y), 3) == 1
+    model = fit_arrays(X[~held_out], y[~held_out])
+    np.testing.assert_allclose(priors[held_out], symptom_prior_probability(model.predict_proba(X[held_out])),
+                               rtol=1e-12)
+
+
+def test_priors_do_not_depend_on_the_worker_count(data, tmp_path):
+    X, y = data
+    serial, _ = cross_fit_prior(X, y, n_folds=4, workers=1, cache_dir=str(tmp_path / 'serial'))
+    parallel, _ = cross_fit_prior(X, y, n_folds=4, workers=3, cache_dir=str(tmp_path / 'parallel'))
+    np.testing.assert_array_equal(parallel, serial)
+
+
+def test_rerun_hits_the_cache(data, tmp_path):
+    X, y = data
+    first, hits = cross_fit_prior(X, y, n_folds=3, workers=1, cache_dir=str(tmp_path))
+    assert hits == 0
+    again, hits = cross_fit_prior(X, y, n_folds=3, workers=2, cache_dir=str(tmp_path))
+    assert hits == 3
+    np.testing.assert_array_equal(again, first)
+    _, hits = cross_fit_prior(X, y, n_folds=3, C=0.5, workers=1, cache_dir=str(tmp_path))
+    assert hits == 0  # Other hyperparameters, other fold models
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_shared_memory_is_unlinked_on_errors(data, tmp_path, monkeypatch, workers):
+    X, y = data
+    names = []
+    share = cross_fit._share
+
+    def recording_share(array):
+        block, spec, view = share(array)
+        names.append(block.name)
+        return block, spec, view
+
+    monkeypatch.setattr(cross_fit, '_share', recording_share)
+    with pytest.raises(ValueError, match='outside the configured classes'):
+        cross_fit_prior(X, np.where(y == 3, 7, y), n_folds=2, workers=workers, cache_dir=str(tmp_path))
+    assert len(names) == 4
+    for name in names:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
@@ -0,0 +1,95 @@
+import os
+import sqlite3
+
+import pytest
+
+pydicom = pytest.importorskip('pydicom')
+from pydicom.dataset import Dataset, FileMetaDataset  # noqa: E402
+from pydicom.uid import ExplicitVRLittleEndian, generate_uid  # noqa: E402
+
+import dicom_index  # noqa: E402
+from dicom_index import index_directory, load_index  # noqa: E402
+
+
+def write_scan(path, patient_id, modality='MR'):
+    meta = FileMetaDataset()
+    meta.MediaStorageSOPClassUID = '1.2.840.10008.5.1.4.1.1.4'  # MR Image Storage
+    meta.MediaStorageSOPInstanceUID = generate_uid()
+    meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    ds = Dataset()
+    ds.file_meta = meta
+    ds.PatientID = patient_id
+    ds.Modality = modality
+    ds.StudyDate = '20240102'
+    ds.StudyInstanceUID = ds.SeriesInstanceUID = generate_uid()
+    ds.SOPInstanceUID = meta.MediaStorageSOPInstanceUID
+    ds.Rows = ds.Columns = 32
+    ds.BitsAllocated = 16
+    ds.PixelData = bytes(2 * 32 * 32)  # Never read by the indexer
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    ds.save_as(path, enforce_file_format=True)
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / 'dicom'
+    write_scan(str(root / 'VET_1' / 'a.dcm'), 'VET_1')
+    write_scan(str(root / 'VET_1' / 'b.DCM'), 'VET_1')
+    write_scan(str(root / 'VET_2' / 'series' / 'c.dicom'), 'VET_2', 'MRS')
+    (root / 'VET_2' / 'notes.txt').write_text('not a scan')
+    (root / 'VET_2' / 'corrupt.dcm').write_bytes(b'not a DICOM file')
+    return str(root), str(tmp_path / 'index.sqlite')
+
+
+def test_index_reads_headers_and_records_errors(tree):
+    root, db = tree
+    stats = index_directory(root, db, workers=1)
+    assert (stats['seen'], stats['indexed'], stats['failed']) == (4, 4, 1)
+    index = load_index(db).sort_values('path')
+    assert index['PatientID'].tolist() == ['VET_1', 'VET_1', 'VET_2']
+    assert set(index['Modality']) == {'MR', 'MRS'}
+    with sqlite3.connect(db) as conn:
+        (error,), = conn.execute("SELECT error FROM dicom_headers WHERE path LIKE '%corrupt.dcm'").fetchall()
+    assert error is not None
+
+
+def test_rerun_only_reads_changed_files_and_prunes(tree):
+    root, db = tree
+    index_directory(root, db, workers=2)
+    assert index_directory(root, db, workers=1)['indexed'] == 0
+
+    changed = os.path.join(root, 'VET_1', 'a.dcm')
+    write_scan(changed, 'VET_3')
+    os.utime(changed, ns=(1, 1))  # A different mtime even on coarse clocks
+    os.remove(os.path.join(root, 'VET_2', 'series', 'c.dicom'))
+    stats = index_directory(root, db, workers=1)
+    assert (stats['seen'], stats['indexed'], stats['unchanged'], stats['pruned']) == (3, 1, 2, 1)
+    assert sorted(load_index(db)['PatientID']) == ['VET_1', 'VET_3']
+
+
+def test_prune_keeps_other_roots(tree, tmp_path):
+    root, db = tree
+    other = tmp_path / 'other'
+    write_scan(str(other / 'd.dcm'), 'VET_9')
+    index_directory(root, db, workers=1)
+    index_directory(str(other), db, workers=1)
+    assert sorted(load_index(db)['PatientID']) == ['VET_1', 'VET_1', 'VET_2', 'VET_9']
+
+
+def test_connection_is_closed_on_errors(tree, monkeypatch):
+    root, db = tree
+    real_open, opened = dicom_index.open_index, []
+
+    def open_index(path):
+        opened.append(real_open(path))
+        return opened[-1]
+
+    def fail(_):
+        raise RuntimeError('disk went away')
+
+    monkeypatch.setattr(dicom_index, 'open_index', open_index)
+    monkeypatch.setattr(dicom_index, '_index_one', fail)
+    with pytest.raises(RuntimeError):
+        index_directory(root, db, workers=1)
+    with pytest.raises(sqlite3.ProgrammingError, match='closed'):
+        opened[0].execute('SELECT 1')
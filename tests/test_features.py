@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from cohort import HALEY_PREVALENCE, generate_chunks
+from cohort_io import read_cohort, stored_columns, write_cohort
+from features import ENGINEERED_COLS, add_engineered_features, materialize
+
+PATHS = {'parquet': 'cohort.parquet', 'npy': 'cohort.npy'}
+
+
+@pytest.fixture
+def stored(tmp_path):
+    def store(fmt):
+        path = str(tmp_path / PATHS[fmt])
+        write_cohort(generate_chunks(HALEY_PREVALENCE, 5_000, chunk_size=1_500), path)
+        return path
+    return store
+
+
+def test_materialize_matches_across_formats(stored):
+    results = {}
+    for fmt in PATHS:
+        path = stored(fmt)
+        assert materialize(path, batch_size=1_200) == ENGINEERED_COLS
+        assert materialize(path) == []  # Already stored
+        results[fmt] = read_cohort(path)
+    parquet, npy = results['parquet'], results['npy']
+    assert list(npy.columns) == list(parquet.columns)
+    for col in npy.columns:
+        assert npy[col].dtype == parquet[col].dtype
+        np.testing.assert_array_equal(np.asarray(npy[col]), parquet[col].to_numpy(), err_msg=col)
+    # Same values as computing in memory from the stored inputs
+    expected = add_engineered_features(parquet.drop(columns=ENGINEERED_COLS))
+    np.testing.assert_allclose(parquet[ENGINEERED_COLS], expected[ENGINEERED_COLS], rtol=1e-6)
+
+
+def test_materialize_computes_only_missing_columns(stored):
+    path = stored('npy')
+    assert materialize(path, ['Metabolic_Index']) == ['Metabolic_Index']
+    assert materialize(path) == ['Ox_Energy_Interaction']
+    assert materialize(path, ['Metabolic_Index'], overwrite=True) == ['Metabolic_Index']
+    assert set(ENGINEERED_COLS) <= set(stored_columns(path))
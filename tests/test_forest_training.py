@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from forest_training import (MAX_BINS, RANDOM_SEED, HistForest, bin_edges, bin_features, grow_tree,
+                             predict_binned, train_forest)
+from inference_kernel import ForestPredictor, load_predictor
+
+
+def data(n=4000, seed=0):
+    rng = np.random.default_rng(seed)
+    # Rounded like the CSV exports, so many rows sit exactly on a bin edge
+    X = np.round(rng.normal(size=(n, 5)), 2)
+    score = X[:, 0] + 0.5 * X[:, 1] * X[:, 2] + rng.normal(0.0, 0.7, n)
+    return X, np.digitize(score, [-0.5, 0.5])
+
+
+def quiet(*_):
+    pass
+
+
+def test_quantile_bins_hold_equal_rows():
+    rng = np.random.default_rng(0)
+    # Rounded like the CSV exports: the dense middle repeats values, the sparse tail does not.
+    # Quantiles over the distinct values would spend most cuts on the tail
+    X = np.round(np.c_[rng.lognormal(0.0, 1.0, 100_000), rng.normal(size=100_000)], 2)
+    edges = bin_edges(X)
+    codes = bin_features(X, edges)
+    for j in range(X.shape[1]):
+        counts = np.bincount(codes[:, j], minlength=MAX_BINS)
+        assert counts.max() <= 3 * len(X) / MAX_BINS
+
+
+def test_repeated_values_dedupe_cuts():
+    rng = np.random.default_rng(1)
+    column = np.r_[np.zeros(75_000), rng.uniform(size=25_000)]
+    edges = bin_edges(column[:, None])[0]
+    assert np.all(np.diff(edges) > 0)
+    codes = bin_features(column[:, None], [edges])[:, 0]
+    assert np.unique(codes[:75_000]).size == 1  # The tied rows share one bin
+    counts = np.bincount(codes)
+    assert counts[counts > 0][1:].max() <= 1.05 * len(column) / MAX_BINS
+
+
+def test_few_distinct_values_are_exact():
+    X = np.repeat(np.arange(10.0), 100)[:, None]
+    edges = bin_edges(X)[0]
+    np.testing.assert_array_equal(edges, np.arange(9.0))
+    np.testing.assert_array_equal(bin_features(X, [edges])[:, 0], X[:, 0].astype(np.uint8))
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_exported_forest_reproduces_binned_predictions(tmp_path, workers):
+    X, y = data()
+    forest = train_forest(X, np.array(['Healthy', 'Type 1', 'Type 2'])[y], feature_names=list('abcde'), n_trees=4,
+                          max_depth=8, validation_fraction=0, workers=workers, seed=RANDOM_SEED, log=quiet)
+    predictor = load_predictor(forest.export(str(tmp_path / 'forest.npz')))
+    assert isinstance(predictor, ForestPredictor)
+    # Regrow the same trees on the binned matrix: without a validation split they see every row
+    codes, n_bins = bin_features(X, forest.edges), [len(cuts) + 1 for cuts in forest.edges]
+    seeds = np.random.SeedSequence(RANDOM_SEED).generate_state(4).tolist()
+    trees = [grow_tree(codes, y, n_bins, 3, max_depth=8, seed=s) for s in seeds]
+
+    X_test = np.r_[X[:1000], data(1000, seed=1)[0]]  # Training rows sit exactly on bin edges
+    test_codes = bin_features(X_test, forest.edges)
+    expected = np.mean([predict_binned(tree, test_codes) for tree in trees], axis=0)
+    np.testing.assert_allclose(predictor.predict_proba(X_test), expected, atol=1e-6)
+    np.testing.assert_array_equal(predictor.classes_, ['Healthy', 'Type 1', 'Type 2'])
+
+
+def test_early_stopping_keeps_the_best_prefix(tmp_path):
+    X, y = data()
+    kwargs = {'n_trees': 40, 'max_depth': 3, 'workers': 1, 'log': quiet}
+    forest = train_forest(X, y, patience=2, tol=0.01, **kwargs)
+    n_trees, losses = zip(*forest.history)
+    assert n_trees[-1] < 40  # Stopped early
+    best = 0  # The round that last improved the running best by more than tol
+    for i in range(1, len(losses)):
+        if losses[i] < losses[best] * (1 - 0.01):
+            best = i
+    assert len(forest.estimators_) == n_trees[best] < n_trees[-1]
+    assert losses[best] == min(losses)
+    # The kept trees are the first ones grown, not the last
+    full = train_forest(X, y, patience=40, **kwargs)
+    prefix = HistForest([], full.edges, full.classes_, full.feature_names_in_, [])
+    prefix.estimators_ = full.estimators_[:n_trees[best]]
+    X_test = data(1000, seed=1)[0]
+    np.testing.assert_array_equal(load_predictor(forest.export(str(tmp_path / 'stopped.npz'))).predict_proba(X_test),
+                                  load_predictor(prefix.export(str(tmp_path / 'prefix.npz'))).predict_proba(X_test))
@@ -0,0 +1,61 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import gws_profiles as gws
+
+
+@pytest.mark.parametrize('fmt', ['parquet', 'csv'])
+def test_round_trip_keeps_rounded_values(tmp_path, fmt):
+    manifest = gws.generate_cohort(2000, str(tmp_path), n_shards=4, fmt=fmt, chunk_size=500)
+    df = gws.read_shards(str(tmp_path))
+    assert len(df) == manifest['n_rows'] == 2000
+    assert df['PatientID'].is_unique
+    # Stored as float64: 50.9 reads back as 50.9, not 50.900002
+    np.testing.assert_array_equal(df['NAA_tCr_Ratio'], df['NAA_tCr_Ratio'].round(gws.NAA_DECIMALS))
+    np.testing.assert_array_equal(df['PCr_Recovery_Sec'], df['PCr_Recovery_Sec'].round(gws.PCR_DECIMALS))
+    assert [entry['rows'] for entry in manifest['shards']] == [
+        int((gws.shard_of(df['PatientID'].to_numpy(), 4) == s).sum()) for s in range(4)]
+
+
+def test_shards_hold_their_hash_partition(tmp_path):
+    gws.generate_cohort(500, str(tmp_path), n_shards=3)
+    for s in range(3):
+        part = gws.read_shards(str(tmp_path), [s])
+        assert (gws.shard_of(part['PatientID'].to_numpy(), 3) == s).all()
+    patient = gws.read_shards(str(tmp_path))['PatientID'].iloc[123]
+    assert len(gws.find_patient(str(tmp_path), patient)) == 1
+
+
+@pytest.mark.parametrize('fmt', ['parquet', 'csv'])
+def test_empty_cohort_is_readable(tmp_path, fmt):
+    manifest = gws.generate_cohort(0, str(tmp_path), n_shards=3, fmt=fmt)
+    assert manifest['n_rows'] == 0
+    for path in gws.shard_paths(str(tmp_path)):
+        assert os.path.exists(path)
+    df = gws.read_shards(str(tmp_path))
+    assert len(df) == 0 and list(df.columns) == gws.COLUMNS
+
+
+def test_no_chunks_without_schema_lists_no_shards(tmp_path):
+    manifest = gws.write_shards(iter([]), str(tmp_path), n_shards=3, fmt='csv')
+    assert manifest['shards'] == []
+    assert os.listdir(tmp_path) == [gws.MANIFEST_FILE]
+    assert len(gws.read_shards(str(tmp_path))) == 0
+
+
+def test_id_hash_is_fnv1a():
+    # Reference FNV-1a 64 of b'a'
+    assert int(gws.id_hash(np.array(['a']))[0]) == 0xaf63dc4c8601ec8c
+
+
+@pytest.mark.parametrize('fmt', ['parquet', 'csv'])
+def test_rewrite_drops_stale_shards(tmp_path, fmt):
+    gws.generate_cohort(1000, str(tmp_path), n_shards=8, fmt='csv' if fmt == 'parquet' else 'parquet')
+    gws.generate_cohort(500, str(tmp_path), n_shards=4, fmt=fmt)
+    assert sorted(os.listdir(tmp_path)) == [gws.MANIFEST_FILE] + [gws.shard_name(s, fmt) for s in range(4)]
+    assert len(gws.read_shards(str(tmp_path))) == 500
+    if fmt == 'parquet':
+        assert len(pd.read_parquet(tmp_path)) == 500  # As Spark or pandas read the directory
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import ExtraTreesClassifier, GradientBoostingClassifier, RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+
+from inference_kernel import COMPLETE_DEPTH, ForestPredictor, LogRegPredictor, export_model, load_predictor
+
+
+def data(n=3000, n_classes=3, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, 5))
+    score = X[:, 0] + 0.5 * X[:, 1] * X[:, 2] + rng.normal(0.0, 0.7, n)
+    y = np.digitize(score, np.quantile(score, np.arange(1, n_classes) / n_classes))
+    return X, y
+
+
+def exported(model, tmp_path):
+    return load_predictor(export_model(model, str(tmp_path / 'model.npz')))
+
+
+def assert_same_predictions(model, predictor, X):
+    expected = model.predict_proba(X)
+    np.testing.assert_allclose(predictor.predict_proba(X), expected, atol=1e-6)
+    top2 = np.sort(expected, axis=1)[:, -2:]
+    clear = top2[:, 1] - top2[:, 0] > 1e-5  # Float32 leaf values may break exact ties the other way
+    np.testing.assert_array_equal(predictor.predict(X)[clear], model.predict(X)[clear])
+
+
+@pytest.mark.parametrize('n_classes', [2, 4])
+def test_logreg_matches_sklearn(tmp_path, n_classes):
+    X, y = data(n_classes=n_classes)
+    labels = np.array(['Healthy', 'Type 1', 'Type 2', 'Type 3'])[y]
+    model = LogisticRegression(max_iter=1000).fit(X, labels)
+    predictor = exported(model, tmp_path)
+    assert isinstance(predictor, LogRegPredictor)
+    X_test, _ = data(1000, seed=1)
+    np.testing.assert_allclose(predictor.predict_proba(X_test), model.predict_proba(X_test), rtol=1e-10, atol=1e-12)
+    np.testing.assert_array_equal(predictor.predict(X_test), model.predict(X_test))
+
+
+@pytest.mark.parametrize('model', [
+    RandomForestClassifier(n_estimators=20, max_depth=6, random_state=0),
+    RandomForestClassifier(n_estimators=5, random_state=0),  # Unpruned: deeper than the complete top
+    ExtraTreesClassifier(n_estimators=10, max_depth=8, random_state=0),
+    RandomForestClassifier(n_estimators=1, max_depth=4, random_state=0),
+    RandomForestClassifier(n_estimators=10, max_depth=1, random_state=0),
+], ids=['forest', 'unpruned', 'extra-trees', 'single-tree', 'stumps'])
+def test_forest_matches_sklearn(tmp_path, model):
+    X, y = data(n_classes=4)
+    model.fit(X, y)
+    predictor = exported(model, tmp_path)
+    assert isinstance(predictor, ForestPredictor)
+    if model.max_depth is None:
+        assert predictor.max_depth > COMPLETE_DEPTH
+    X_test, _ = data(2000, seed=1)
+    assert_same_predictions(model, predictor, X_test)
+    assert_same_predictions(model, predictor, X[:500])  # Training rows sit exactly on split neighbourhoods
+
+
+def test_export_checks_and_rejects(tmp_path):
+    X, y = data(500)
+    model = RandomForestClassifier(n_estimators=3, random_state=0).fit(X, y)
+    export_model(model, str(tmp_path / 'checked.npz'), X_check=X)
+    with pytest.raises(TypeError, match='GradientBoostingClassifier'):
+        export_model(GradientBoostingClassifier(n_estimators=2).fit(X, y), str(tmp_path / 'boosted.npz'))
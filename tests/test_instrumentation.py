@@ -0,0 +1,66 @@
+import json
+import re
+
+import pytest
+
+from instrumentation import LATENCY_BUCKETS, Recorder
+
+PRICES = {'compute_usd_per_sec': 1.0, 'io_usd_per_gb': 2.0, 'usd_per_call': 0.5,
+          'stages': {'classification': {'usd_per_call': 0.0}}}
+
+
+@pytest.fixture
+def recorder():
+    rec = Recorder(prices=PRICES)
+    rec.observe('ingestion', 0.003, patients=10, nbytes=2_000_000_000)
+    with rec.stage('ingestion') as timer:
+        timer.add(patients=5)
+
+    @rec.timed('classification', patients=len)
+    def classify(rows):
+        if not rows:
+            raise ValueError('nothing to classify')
+        return rows
+
+    classify([1, 2, 3])
+    with pytest.raises(ValueError):
+        classify([])
+    rec.observe_patient_latency(0.2, patients=3)
+    return rec
+
+
+def test_stage_timers_and_costs(recorder):
+    summary = recorder.summary()
+    ingestion, classification = summary['stages']['ingestion'], summary['stages']['classification']
+    assert (ingestion['calls'], ingestion['patients'], ingestion['bytes'], ingestion['errors']) == (
+        2, 15, 2_000_000_000, 0)
+    assert (classification['calls'], classification['patients'], classification['errors']) == (2, 3, 1)
+    assert ingestion['cost_usd'] == pytest.approx(ingestion['seconds'] + 4.0 + 2 * 0.5)
+    assert classification['cost_usd'] == pytest.approx(classification['seconds'])  # No per-call price here
+    assert summary['patients'] == 3  # Patients classified
+    assert summary['cost_per_patient_usd'] == pytest.approx(summary['total_cost_usd'] / 3)
+    assert summary['patient_latency']['patients'] == 3
+    assert summary['patient_latency']['p50_s'] == 0.25  # Upper bound of its histogram bucket
+    json.dumps(summary)
+
+
+def test_openmetrics_exposition(recorder):
+    text = recorder.openmetrics()
+    lines = text.splitlines()
+    assert lines[-1] == '# EOF' and text.endswith('\n')
+    for line in lines:
+        assert line.startswith('# ') or re.fullmatch(r'mito_[a-z_]+(\{[^}]*\})? [0-9.e+-]+', line), line
+    buckets = [int(line.split()[-1]) for line in lines
+               if line.startswith('mito_stage_latency_seconds_bucket{stage="ingestion"')]
+    assert len(buckets) == len(LATENCY_BUCKETS) + 1
+    assert buckets == sorted(buckets) and buckets[-1] == 2  # Cumulative, +Inf holds every call
+    assert 'mito_stage_errors_total{stage="classification"} 1' in lines
+    assert 'mito_patient_latency_seconds_count 3' in lines
+    assert '# TYPE mito_stage_patients counter' in lines
+
+
+def test_disabled_recorder_records_nothing():
+    rec = Recorder(prices=PRICES, enabled=False)
+    with rec.stage('ingestion', patients=1):
+        pass
+    assert rec.summary()['stages'] == {}
@@ -0,0 +1,73 @@
+import io
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from lake_upload import LocalBlockBackend, iter_csv_blocks, upload_blocks, upload_csv_chunks
+
+
+def blocks_of(data, size):
+    return (data[i:i + size] for i in range(0, len(data), size))
+
+
+def test_committed_bytes_match(tmp_path):
+    backend = LocalBlockBackend(str(tmp_path), 'lake')
+    data = os.urandom(100_003)
+    n_blocks, n_bytes = upload_blocks(blocks_of(data, 4096), backend, 'raw/x.bin', max_workers=4, max_in_flight=3)
+    assert (n_blocks, n_bytes) == (25, len(data))
+    with open(backend.describe('raw/x.bin'), 'rb') as fh:
+        assert fh.read() == data
+    assert not os.path.exists(backend._staging_dir('raw/x.bin'))
+
+
+def test_empty_upload_commits_empty_blob(tmp_path):
+    backend = LocalBlockBackend(str(tmp_path), 'lake')
+    assert upload_blocks(iter([]), backend, 'x.csv') == (0, 0)
+    with open(backend.describe('x.csv'), 'rb') as fh:
+        assert fh.read() == b''
+
+
+def test_failed_upload_aborts(tmp_path):
+    backend = LocalBlockBackend(str(tmp_path), 'lake')
+
+    def failing():
+        yield b'a' * 1000
+        yield b'b' * 1000
+        raise RuntimeError('source went away')
+
+    with pytest.raises(RuntimeError, match='source went away'):
+        upload_blocks(failing(), backend, 'x.csv', max_workers=2)
+    assert not os.path.exists(backend.describe('x.csv'))
+    assert not os.path.exists(backend._staging_dir('x.csv'))
+
+
+def test_failed_upload_keeps_previous_blob(tmp_path):
+    backend = LocalBlockBackend(str(tmp_path), 'lake')
+    upload_blocks(iter([b'old']), backend, 'x.csv')
+
+    def failing():
+        yield b'new'
+        raise OSError('disk full')
+
+    with pytest.raises(OSError):
+        upload_blocks(failing(), backend, 'x.csv')
+    with open(backend.describe('x.csv'), 'rb') as fh:
+        assert fh.read() == b'old'
+
+
+def test_csv_chunks_round_trip(tmp_path):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({'NAA_tCr_Ratio': rng.uniform(1, 2.5, 5000), 'Haley_Syndrome': rng.integers(0, 4, 5000)})
+    chunks = [df.iloc[i:i + 1000] for i in range(0, len(df), 1000)]
+    expected = b''.join(iter_csv_blocks(chunks, block_size=1 << 20))
+
+    backend = LocalBlockBackend(str(tmp_path), 'lake')
+    n_blocks, n_bytes = upload_csv_chunks(chunks, backend, 'cohort.csv', block_size=8192, max_workers=3)
+    with open(backend.describe('cohort.csv'), 'rb') as fh:
+        committed = fh.read()
+    assert committed == expected
+    assert n_bytes == len(committed) and n_blocks == -(-n_bytes // 8192)
+    back = pd.read_csv(io.BytesIO(committed))
+    pd.testing.assert_frame_equal(back, df.round(4).reset_index(drop=True))
@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from load_test import report, run_load
+from score_client import ScoreError
+
+
+class FakeClient:
+    """Answers after `delay` seconds; fails every `fail_every`-th request. Tracks the tasks alive."""
+
+    def __init__(self, delay=0.002, fail_every=None):
+        self.delay = delay
+        self.fail_every = fail_every
+        self.calls = 0
+        self.in_flight = self.max_in_flight = self.max_tasks = 0
+        self.stats = {'retries': 0, 'failures': 0, 'connections_opened': 1, 'reconnects': 0}
+
+    async def post(self, body):
+        self.calls += 1
+        call = self.calls
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        self.max_tasks = max(self.max_tasks, len(asyncio.all_tasks()))
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        if self.fail_every and call % self.fail_every == 0:
+            raise ScoreError('HTTP 503: busy', 503)
+        return {'Results': [0]}
+
+
+@pytest.mark.parametrize('rate', [None, 2000.0])
+def test_sends_every_request_within_the_concurrency_cap(rate):
+    client = FakeClient(fail_every=10)
+    result = asyncio.run(run_load(client, [b'{}'], batch_size=4, requests=100, concurrency=5, rate=rate))
+    assert (result['requests'], result['succeeded'], result['failed']) == (100, 90, 10)
+    assert result['patients'] == 360
+    assert sum(result['histogram'].values()) == 90
+    assert client.max_in_flight <= 5
+
+
+def test_open_loop_holds_no_backlog_of_tasks():
+    # The server is 20x slower than the schedule: requests queue, but not as pending tasks
+    client = FakeClient(delay=0.01)
+    result = asyncio.run(run_load(client, [b'{}'], batch_size=1, requests=200, concurrency=4, rate=8000.0))
+    assert result['succeeded'] == 200
+    assert client.max_tasks <= 4 + 1  # The in-flight requests and the scheduling loop
+    # Latency counts from each request's scheduled start, so the queueing shows (service time is 10 ms)
+    assert result['p50_ms'] > 100
+
+
+def test_report_without_successes():
+    result = report([], ['HTTP 503'], 1.0, 16, {})
+    assert (result['succeeded'], result['failed'], result['p50_ms']) == (0, 1, None)
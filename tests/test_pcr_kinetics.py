@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from pcr_kinetics import DEFAULT_TIMES, fit_recovery, simulate_recovery
+
+
+def test_noiseless_fit_recovers_parameters():
+    Y, truth = simulate_recovery(500, noise_sd=0.0, seed=1)
+    fit = fit_recovery(Y)
+    for col in ['PCr_Recovery_Sec', 'PCr_Baseline', 'PCr_Depletion']:
+        np.testing.assert_allclose(fit[col], truth[col], rtol=1e-4)
+    assert (fit['Fit_R2'] > 0.9999).all()
+
+
+def test_noisy_fit_within_tolerance():
+    noise_sd = 0.03
+    Y, truth = simulate_recovery(2000, noise_sd=noise_sd, seed=2)
+    fit = fit_recovery(Y)
+    tau_err = np.abs(fit['PCr_Recovery_Sec'] / truth['PCr_Recovery_Sec'] - 1)
+    assert np.median(tau_err) < 0.05
+    assert np.percentile(tau_err, 95) < 0.25
+    np.testing.assert_allclose(fit['PCr_Baseline'], truth['PCr_Baseline'], atol=0.05)
+    np.testing.assert_allclose(fit['PCr_Depletion'], truth['PCr_Depletion'], atol=0.1)
+    # The residual is the noise the series were drawn with
+    assert np.median(fit['Fit_RMSE']) == pytest.approx(noise_sd, rel=0.1)
+
+
+def test_grid_only_fit_is_close():
+    Y, truth = simulate_recovery(200, noise_sd=0.0, seed=3)
+    fit = fit_recovery(Y, refine=False)
+    # Grid points are 2.3 % apart, so the nearest one is within half a step
+    np.testing.assert_allclose(fit['PCr_Recovery_Sec'], truth['PCr_Recovery_Sec'], rtol=0.015)
+
+
+def test_flat_curve():
+    Y = np.full((4, len(DEFAULT_TIMES)), 4.2)
+    fit = fit_recovery(Y)
+    np.testing.assert_allclose(fit['PCr_Baseline'], 4.2)
+    np.testing.assert_allclose(fit['PCr_Depletion'], 0.0, atol=1e-9)
+    assert fit['Fit_R2'].isna().all()  # No variance to explain
+    np.testing.assert_allclose(fit['Fit_RMSE'], 0.0, atol=1e-9)
+
+
+def test_flat_curve_does_not_spoil_its_batch():
+    Y, truth = simulate_recovery(10, noise_sd=0.0, seed=4)
+    Y[3] = 5.0
+    fit = fit_recovery(Y)
+    keep = np.arange(10) != 3
+    np.testing.assert_allclose(fit['PCr_Recovery_Sec'][keep], truth['PCr_Recovery_Sec'][keep], rtol=1e-4)
+    assert fit['PCr_Baseline'][3] == pytest.approx(5.0)
+
+
+def test_single_time_point_is_rejected():
+    with pytest.raises(ValueError, match='at least 3 time points'):
+        fit_recovery(np.array([[3.0], [4.0]]), t=[10.0])
+
+
+def test_shape_mismatch_is_rejected():
+    with pytest.raises(ValueError, match='time points'):
+        fit_recovery(np.zeros((2, 10)), t=DEFAULT_TIMES)
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from pipeline import GWI_PIPELINE
+
+
+@pytest.fixture
+def run(tmp_path):
+    params = {'n': 2_000, 'output_file': str(tmp_path / 'training.parquet'),
+              'prior_artifact': str(tmp_path / 'prior.npz')}
+
+    def run(targets=('n_rows',), cache=True, **overrides):
+        log = []
+        result = GWI_PIPELINE.run(list(targets), {**params, **overrides},
+                                  cache_dir=str(tmp_path / 'cache') if cache else None, log=log.append)
+        ran = [line.split()[0] for line in log if ' ran in ' in line]
+        return result, ran
+    return run
+
+
+def test_changing_C_reruns_only_the_prior_and_downstream(run):
+    _, ran = run()
+    assert ran == ['cohort', 'prior', 'training_set', 'export']
+    _, ran = run()
+    assert ran == ['export']  # File sinks always run
+    _, ran = run(C=0.5)
+    assert ran == ['prior', 'training_set', 'export']
+
+
+def test_cached_run_equals_a_fresh_one(run):
+    run()
+    cached, ran = run(['training_set', 'prior'])
+    assert ran == []
+    fresh, _ = run(['training_set', 'prior'], cache=False)
+    assert list(cached['training_set'].columns) == list(fresh['training_set'].columns)
+    for col in fresh['training_set'].columns:
+        assert cached['training_set'][col].dtype == fresh['training_set'][col].dtype
+        np.testing.assert_array_equal(np.asarray(cached['training_set'][col]), fresh['training_set'][col], err_msg=col)
+    np.testing.assert_array_equal(cached['prior'].weights, fresh['prior'].weights)
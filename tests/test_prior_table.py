@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cohort import GWI_LIFELIKE, generate_cohort
+from inference_kernel import PriorTablePredictor, UINT16_SCALE, softmax_table_bounds, symptom_prior_probability
+from prior_training import SYMPTOM_COLS, TARGET_COL, fit_arrays
+from symptom_prior import PRIOR_COL, add_prior_feature, compile_prior
+
+STEP = 0.5  # Coarser than the default grid keeps the table small and the errors visible
+
+
+@pytest.fixture(scope='module')
+def prior():
+    df = generate_cohort(GWI_LIFELIKE, 5_000, seed=8)
+    return fit_arrays(df[SYMPTOM_COLS].to_numpy(np.float64), df[TARGET_COL].to_numpy())
+
+
+@pytest.fixture(scope='module', params=['uint16', 'float16'])
+def table(prior, tmp_path_factory, request):
+    path = str(tmp_path_factory.mktemp('tables') / f'prior_{request.param}.npz')
+    return compile_prior(prior, path, step=STEP, dtype=request.param, n_check=20_000)
+
+
+def survey_points(n, seed=1):
+    return np.random.default_rng(seed).uniform(0.0, 10.0, size=(n, len(SYMPTOM_COLS)))
+
+
+def test_table_error_stays_within_its_bound(prior, table):
+    assert isinstance(table, PriorTablePredictor)
+    X = survey_points(50_000)
+    exact = symptom_prior_probability(prior.predict_proba(X))
+    for mode, interpolate in (('linear', True), ('nearest', False)):
+        error = np.abs(table.symptom_prior(X, interpolate=interpolate) - exact).max()
+        assert 0 < error <= table.error_bound[mode], mode
+        assert table.sampled_max_error[mode] <= table.error_bound[mode]
+    # Grid points are stored exactly, up to quantization
+    grid = np.random.default_rng(2).integers(0, 21, size=(1_000, len(SYMPTOM_COLS))) * STEP
+    quantization = UINT16_SCALE / 2 if table.table.dtype == np.uint16 else 2.0 ** -12
+    exact = symptom_prior_probability(prior.predict_proba(grid))
+    assert np.abs(table.symptom_prior(grid, interpolate=False) - exact).max() <= quantization + 1e-6
+
+
+def test_add_prior_feature_table_path_matches_exact_path(prior, table):
+    X = survey_points(10_000, seed=3)
+    chunk = pd.DataFrame(X, columns=SYMPTOM_COLS)
+    from_table = add_prior_feature(chunk.copy(), table)[PRIOR_COL]
+    exact = add_prior_feature(chunk.copy(), prior)[PRIOR_COL]
+    assert from_table.dtype == np.float32
+    assert np.abs(from_table - exact).max() <= table.error_bound['linear']
+
+
+def test_softmax_table_bounds():
+    coef = np.array([[0.0, 1.0], [0.5, -1.0], [1.0, 0.0]])  # Spreads 1 and 2
+    nearest, linear = softmax_table_bounds(coef, step=0.1)
+    quantization = UINT16_SCALE / 2
+    assert nearest == pytest.approx(0.1 * 3 / 8 + quantization)
+    assert linear == pytest.approx(0.01 * 5 / 32 + quantization)
+    # A binary model's single row is softmax([0, z])
+    assert softmax_table_bounds([[2.0, -1.0]], 0.1) == softmax_table_bounds([[0.0, 0.0], [2.0, -1.0]], 0.1)
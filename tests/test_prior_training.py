@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+from sklearn.linear_model import LogisticRegression
+
+from cohort import GWI_LIFELIKE, generate_cohort
+from cohort_io import read_cohort, write_cohort
+from prior_training import SYMPTOM_COLS, TARGET_COL, PriorState, fit_arrays, fit_streaming, update_streaming
+
+CHUNK_ROWS = 2_500
+
+
+@pytest.fixture(scope='module')
+def cohort():
+    return generate_cohort(GWI_LIFELIKE, 20_000, seed=3)
+
+
+@pytest.fixture
+def stored(cohort, tmp_path):
+    def store(df, name='cohort.parquet'):
+        path = str(tmp_path / name)
+        write_cohort([df], path)
+        return path
+    return store
+
+
+def assert_same_model(a, b, atol, rtol=0.0):
+    # Intercepts are only defined up to a common shift: compare them centred
+    np.testing.assert_allclose(a.coef_, b.coef_, rtol=rtol, atol=atol)
+    np.testing.assert_allclose(a.intercept_ - a.intercept_.mean(), b.intercept_ - b.intercept_.mean(),
+                               rtol=rtol, atol=atol)
+
+
+def test_streaming_fit_matches_sklearn(cohort, stored):
+    path = stored(cohort)
+    state = fit_streaming(path, chunk_rows=CHUNK_ROWS)
+    df = read_cohort(path)  # The stored (float32) values
+    X = df[SYMPTOM_COLS].to_numpy(np.float64)
+    y = df[TARGET_COL].to_numpy()
+    model = LogisticRegression(C=1.0, tol=1e-10, max_iter=10_000).fit(X, y)
+    assert state.n_rows == len(cohort)
+    # lbfgs stops with a gradient of ~2e-3 even at tol=1e-10; the Newton fit's is ~1e-11
+    assert_same_model(state, model, atol=5e-5)
+    np.testing.assert_allclose(state.predict_proba(X), model.predict_proba(X), atol=5e-5)
+    assert_same_model(fit_arrays(X, y, chunk_rows=CHUNK_ROWS), state, atol=1e-9)
+
+
+def test_resuming_from_a_checkpoint_reaches_the_same_state(cohort, stored, tmp_path):
+    path = stored(cohort)
+    fresh = fit_streaming(path, chunk_rows=CHUNK_ROWS)
+
+    # A checkpoint of an earlier fit on the first half, warm-started on the whole cohort
+    checkpoint = fit_streaming(stored(cohort.iloc[:10_000], 'first_half.parquet'), chunk_rows=CHUNK_ROWS)
+    resumed = fit_streaming(path, state=PriorState.load(checkpoint.save(str(tmp_path / 'state.npz'))),
+                            chunk_rows=CHUNK_ROWS)
+    assert resumed.n_rows == fresh.n_rows
+    assert_same_model(resumed, fresh, atol=1e-9)
+    np.testing.assert_allclose(resumed.data_grad, fresh.data_grad, atol=1e-6)
+    np.testing.assert_allclose(resumed.data_hess, fresh.data_hess, rtol=1e-9)
+
+
+def test_update_folds_in_new_records(cohort, stored, tmp_path):
+    fresh = fit_streaming(stored(cohort), chunk_rows=CHUNK_ROWS)
+    first = fit_streaming(stored(cohort.iloc[:15_000], 'first.parquet'), chunk_rows=CHUNK_ROWS)
+    before = np.abs(first.coef_ - fresh.coef_).max()
+    first = PriorState.load(first.save(str(tmp_path / 'state.npz')))
+    updated = update_streaming(first, stored(cohort.iloc[15_000:], 'new.parquet'), chunk_rows=CHUNK_ROWS)
+    assert updated.n_rows == len(cohort)
+    # Earlier records enter through their quadratic summary: close to, not exactly, the full refit
+    assert_same_model(updated, fresh, atol=1e-2, rtol=5e-3)
+    assert np.abs(updated.coef_ - fresh.coef_).max() < before / 5
+
+
+def test_rejects_unknown_labels(cohort):
+    X = cohort[SYMPTOM_COLS].to_numpy(np.float64)[:100]
+    with pytest.raises(ValueError, match='outside the configured classes'):
+        fit_arrays(X, np.full(100, 7))
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from score_cache import DiagnosisCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class CountingModel:
+    def __init__(self):
+        self.rows = 0
+
+    def predict(self, X):
+        self.rows += len(X)
+        return (X.sum(axis=1) > 0).astype(np.int64)
+
+
+def test_predict_scores_only_distinct_misses():
+    model = CountingModel()
+    cache = DiagnosisCache('v1', max_entries=100)
+    X = np.array([[1.0] * 5, [-1.0] * 5, [1.0] * 5, [1.00001] * 5])  # Row 4 rounds onto row 1
+    np.testing.assert_array_equal(cache.predict(model.predict, X), [1, 0, 1, 1])
+    assert model.rows == 2
+    np.testing.assert_array_equal(cache.predict(model.predict, X), [1, 0, 1, 1])
+    assert model.rows == 2
+    snap = cache.snapshot()
+    assert snap['hits'] == 4 and snap['misses'] == 4  # Per row looked up
+
+
+def test_ttl_expiry_in_memory():
+    clock = Clock()
+    cache = DiagnosisCache('v1', ttl=10.0, clock=clock)
+    keys = cache.keys(cache.canonical(np.ones((1, 5))))
+    cache.put_many(keys, [3])
+    assert cache.get_many(keys) == [3]
+    clock.now += 11.0
+    assert cache.get_many(keys) == [None]
+    assert cache.counters['expired'] == 1
+
+
+def test_spilled_entries_come_back_and_expire(tmp_path):
+    clock = Clock()
+    cache = DiagnosisCache('v1', max_entries=2, ttl=10.0, spill_path=str(tmp_path / 'spill.sqlite'), clock=clock)
+    keys = cache.keys(cache.canonical(np.arange(20.0).reshape(4, 5)))
+    cache.put_many(keys, [0, 1, 2, 3])
+    assert cache.counters['spilled'] == 2
+    assert cache.get_many(keys[:1]) == [0]  # Promoted back from disk
+    assert cache.counters['disk_hits'] == 1
+
+    clock.now += 11.0
+    assert cache.get_many(keys[1:2]) == [None]
+    assert cache.counters['expired'] == 1  # Expired spilled rows count too
+    assert cache.get_many(keys[1:2]) == [None]
+    assert cache.counters['expired'] == 1  # ... once: the row was deleted
+    cache.close()
+
+
+def test_new_version_drops_old_answers(tmp_path):
+    model = CountingModel()
+    cache = DiagnosisCache('v1', max_entries=1, spill_path=str(tmp_path / 'spill.sqlite'))
+    X = np.arange(10.0).reshape(2, 5)
+    cache.predict(model.predict, X)
+    cache.set_version('v2')
+    cache.predict(model.predict, X)
+    assert model.rows == 4
+    assert cache.counters['invalidations'] == 1 and cache.counters['disk_hits'] == 0
+    cache.close()
+
+
+def test_rejects_empty_memory():
+    with pytest.raises(ValueError):
+        DiagnosisCache('v1', max_entries=0)
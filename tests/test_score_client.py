@@ -0,0 +1,85 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from score_client import ScoreClient, ScoreError
+
+
+class ScriptedHandler(BaseHTTPRequestHandler):
+    """Answers POSTs with the next (status, body) of the server's script, then repeats the last one."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        script = self.server.script
+        status, body = script.pop(0) if len(script) > 1 else script[0]
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(*script):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), ScriptedHandler)
+        server.daemon_threads = True
+        server.script = list(script)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f'http://127.0.0.1:{server.server_address[1]}/score'
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def post(url, n=1, **kwargs):
+    async def run():
+        async with ScoreClient(url, backoff=0.001, **kwargs) as client:
+            answers = [await client.post(b'{}') for _ in range(n)]
+            return answers, client.stats
+    return asyncio.run(run())
+
+
+def test_keeps_one_connection_alive(serve):
+    answers, stats = post(serve((200, json.dumps({'Results': [1]}).encode())), n=5)
+    assert answers == [{'Results': [1]}] * 5
+    assert stats['connections_opened'] == 1
+
+
+def test_retries_server_errors(serve):
+    answers, stats = post(serve((503, b'busy'), (200, b'[0, 2]')))
+    assert answers == [[0, 2]]
+    assert (stats['attempts'], stats['retries'], stats['failures']) == (2, 1, 0)
+
+
+def test_client_errors_are_not_retried(serve):
+    with pytest.raises(ScoreError, match='HTTP 400') as info:
+        post(serve((400, b'{"error": "bad"}')))
+    assert info.value.status == 400
+
+
+@pytest.mark.parametrize('body', [b'<html>Gateway login</html>', b'\xff\xfe'])
+def test_non_json_answer_raises_score_error(serve, body):
+    url = serve((200, body))
+
+    async def run():
+        async with ScoreClient(url) as client:
+            with pytest.raises(ScoreError, match='not JSON') as info:
+                await client.post(b'{}')
+            return info.value, client.stats
+
+    error, stats = asyncio.run(run())
+    assert (error.status, error.body) == (200, body)
+    assert (stats['attempts'], stats['failures']) == (1, 1)
@@ -0,0 +1,125 @@
+import json
+import pickle
+import threading
+import urllib.error
+import urllib.request
+
+import numpy as np
+import pytest
+
+from scoring_server import FEATURE_COLS, MicroBatcher, load_model, make_server, rows_to_matrix
+
+
+class SignModel:
+    """Class 1 for a positive first feature; refuses NaN rows like an sklearn estimator."""
+
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, X):
+        self.calls.append(len(X))
+        if np.isnan(X).any():
+            raise ValueError('Input contains NaN')
+        return (X[:, 0] > 0).astype(np.int64)
+
+
+def record(value):
+    return {col: value for col in FEATURE_COLS}
+
+
+def test_bad_request_does_not_fail_its_batch():
+    model = SignModel()
+    batcher = MicroBatcher(model, max_latency_ms=200.0)
+    try:
+        good = [np.full((2, 5), 1.0), np.full((3, 5), -1.0)]
+        bad = np.full((1, 5), np.nan)
+        futures = [batcher.submit(good[0]), batcher.submit(bad), batcher.submit(good[1])]
+        np.testing.assert_array_equal(futures[0].result(5), [1, 1])
+        with pytest.raises(ValueError, match='NaN'):
+            futures[1].result(5)
+        np.testing.assert_array_equal(futures[2].result(5), [0, 0, 0])
+        assert model.calls[0] == 6  # Scored together first, then one request at a time
+        metrics = batcher.metrics.snapshot(0)
+        assert metrics['errors'] == 1
+        assert metrics['rows_scored'] == 5
+    finally:
+        batcher.close()
+
+
+def test_single_bad_request_fails_alone():
+    batcher = MicroBatcher(SignModel(), max_latency_ms=0.0)
+    try:
+        with pytest.raises(ValueError):
+            batcher.predict(np.full((1, 5), np.nan), timeout=5)
+        np.testing.assert_array_equal(batcher.predict(np.ones((1, 5)), timeout=5), [1])
+    finally:
+        batcher.close()
+
+
+@pytest.mark.parametrize('data', [[], {}, None, 'x', [[1, 2, 3, 4, 5]], [{'NAD_NADH': 1.0}],
+                                  [{**record(1.0), 'PCr_ATP': [1.0, 2.0]}]])
+def test_rows_to_matrix_rejects_bad_shapes(data):
+    with pytest.raises((ValueError, TypeError)):
+        rows_to_matrix(data)
+
+
+def test_rows_to_matrix():
+    X = rows_to_matrix([record(1.5), record(-2.0)])
+    assert X.shape == (2, len(FEATURE_COLS)) and X.dtype == np.float64
+
+
+@pytest.fixture
+def server():
+    server = make_server(SignModel(), port=0, max_latency_ms=1.0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+    server.batcher.close()
+
+
+def post(url, payload):
+    request = urllib.request.Request(url + '/score', data=json.dumps(payload).encode(), method='POST',
+                                     headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_http_scores(server):
+    assert post(server, {'Inputs': {'data': [record(1.0), record(-1.0)]}}) == (200, {'Results': [1, 0]})
+
+
+@pytest.mark.parametrize('data', [[], {}, [[1.0] * 5], [{'NAD_NADH': 1.0}]])
+def test_http_rejects_empty_and_malformed_data(server, data):
+    status, body = post(server, {'Inputs': {'data': data}})
+    assert status == 400 and 'Bad request' in body['error']
+
+
+class BrokenStats:
+    def update(self, chunk, labels=None):
+        raise ValueError('labels of the wrong length')
+
+
+def test_failed_stats_update_keeps_the_batcher_alive():
+    batcher = MicroBatcher(SignModel(), max_latency_ms=0.0, stats=BrokenStats())
+    try:
+        for _ in range(3):
+            np.testing.assert_array_equal(batcher.predict(np.ones((2, 5)), timeout=5), [1, 1])
+    finally:
+        batcher.close()  # Joins the thread, so the last batch's statistics are settled
+    metrics = batcher.metrics.snapshot(0)
+    assert metrics['stats_errors'] == 3
+    assert metrics['errors'] == 0
+
+
+def test_pickled_models_need_allow_pickle(tmp_path):
+    path = tmp_path / 'model.pkl'
+    with open(path, 'wb') as fh:
+        pickle.dump(SignModel(), fh)
+    with pytest.raises(ValueError, match='--allow-pickle'):
+        load_model(str(path))
+    assert isinstance(load_model(str(path), allow_pickle=True), SignModel)
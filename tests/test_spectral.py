@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from spectral import H1_CONFIG, P31_CONFIG, quantify_fids, simulate_fids
+
+# Ratio -> (median, worst-case) relative error. The small Pi peak sits on the tails of PCr
+# and gamma-ATP, so its window picks up a larger share of their area than the other peaks.
+RATIO_RTOL = {'PCr_ATP': (0.015, 0.04), 'Pi_PCr': (0.04, 0.25),
+              'NAA_tCr_Ratio': (0.01, 0.02), 'Cho_tCr_Ratio': (0.015, 0.025)}
+
+
+def wrapped(angle):
+    return np.angle(np.exp(1j * angle))
+
+
+def assert_ratios(q, truth, config):
+    for col in config['ratios']:
+        err = np.abs(q[col] / truth[col] - 1)
+        median_tol, max_tol = RATIO_RTOL[col]
+        assert np.median(err) < median_tol, col
+        assert err.max() < max_tol, col
+
+
+@pytest.mark.parametrize('config', [P31_CONFIG, H1_CONFIG], ids=['31P', '1H'])
+@pytest.mark.parametrize('noise_sd', [0.0, 0.002])
+def test_ratios_recovered(config, noise_sd):
+    fids, truth = simulate_fids(300, config, noise_sd=noise_sd, seed=3)
+    q = quantify_fids(fids, config)
+    assert len(q) == len(truth)
+    assert_ratios(q, truth, config)
+
+
+@pytest.mark.parametrize('config', [P31_CONFIG, H1_CONFIG], ids=['31P', '1H'])
+def test_phase_correction_recovered(config):
+    fids, truth = simulate_fids(300, config, seed=4)
+    q = quantify_fids(fids, config)
+    # Zero-order phase at the reference peak (the 1H reference is off-carrier, so bin position adds a little)
+    assert np.abs(wrapped(q['Phase0_Rad'] - truth['Phase0_True'])).max() < 0.08
+    # First-order phase is the acquisition delay: 2 pi delay rad per Hz (zero for 1H)
+    np.testing.assert_allclose(q['Phase1_Rad_per_Hz'], 2 * np.pi * truth['Acq_Delay_True'], atol=5e-5)
+
+
+def test_first_order_phase_matters():
+    fids, truth = simulate_fids(200, P31_CONFIG, seed=5)
+    zero_order_only = {**P31_CONFIG, 'first_order_phase': False}
+    q = quantify_fids(fids, zero_order_only)
+    err = np.abs(q['PCr_ATP'] / truth['PCr_ATP'] - 1)
+    assert err.max() > RATIO_RTOL['PCr_ATP'][1]
+
+
+@pytest.mark.parametrize('config', [P31_CONFIG, H1_CONFIG], ids=['31P', '1H'])
+def test_memmap_path_matches_in_memory(config, tmp_path):
+    path, truth = simulate_fids(700, config, path=str(tmp_path / 'fids.npy'), block_size=256, seed=6)
+    fids = np.load(path)
+    expected = quantify_fids(fids, config, block_size=256)
+    for workers in (1, 2):
+        q = quantify_fids(path, config, block_size=256, workers=workers)
+        np.testing.assert_allclose(q.to_numpy(), expected.to_numpy(), rtol=1e-6, atol=1e-6)
+    assert_ratios(expected, truth, config)
+
+
+def test_workers_need_a_path():
+    fids, _ = simulate_fids(10, P31_CONFIG, seed=7)
+    with pytest.raises(ValueError, match='npy path'):
+        quantify_fids(fids, P31_CONFIG, block_size=4, workers=2)
+
+
+def test_empty_stack():
+    q = quantify_fids(np.zeros((0, 1024), np.complex64), P31_CONFIG)
+    assert len(q) == 0
+    assert 'PCr_ATP' in q.columns
@@ -0,0 +1,34 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cohort import generate_cohort, load_spec
+from cohort_io import downcast, read_cohort
+from sweep import run_sweep, sweep_chunks, vary
+
+N, CHUNK_SIZE, SEED = 5_000, 1_203, 11  # Uneven chunks also exercise the balanced spare rows
+
+
+@pytest.mark.parametrize('spec', ['haley_prevalence', 'gwi_lifelike', 'haley_balanced_sep', 'mito_3class'])
+def test_base_variant_is_bit_identical_to_generate_cohort(spec):
+    variants = {'base': spec, 'noisy': vary(spec, noise=2.0)}
+    chunks = list(sweep_chunks(variants, N, chunk_size=CHUNK_SIZE, seed=SEED))
+    base = pd.concat([chunk['base'] for chunk in chunks], ignore_index=True)
+    pd.testing.assert_frame_equal(base, generate_cohort(load_spec(spec), N, chunk_size=CHUNK_SIZE, seed=SEED))
+    noisy = pd.concat([chunk['noisy'] for chunk in chunks], ignore_index=True)
+    label = [col for col in base.columns if base[col].dtype.kind in 'iu']
+    pd.testing.assert_frame_equal(noisy[label], base[label])  # Common random numbers: same patients
+
+
+def test_run_sweep_writes_every_variant(tmp_path):
+    variants = {'sep1': vary('haley_prevalence'), 'sep0.5': vary('haley_prevalence', separation=0.5)}
+    manifest = run_sweep(variants, N, str(tmp_path), chunk_size=CHUNK_SIZE, seed=SEED, workers=2)
+    with open(tmp_path / 'sweep.json') as fh:
+        assert json.load(fh)['variants'].keys() == variants.keys()
+    stored = read_cohort(str(tmp_path / manifest['variants']['sep1']['path']))
+    expected = downcast(generate_cohort(load_spec('haley_prevalence'), N, chunk_size=CHUNK_SIZE, seed=SEED))
+    pd.testing.assert_frame_equal(stored, expected)
+    assert all(v['rows'] == N for v in manifest['variants'].values())
+    assert not np.array_equal(read_cohort(str(tmp_path / 'sep0.5.parquet'))['NAD_NADH'], stored['NAD_NADH'])